@@ -1,11 +1,14 @@
 import streamlit as st
 import uuid
-import threading
 import time
 from datetime import datetime
-from main import build_agent
+from main import get_agent
+from utils.resources import start_warm_up
 from config import Config
+from state import apply_update
 from utils.streaming import get_streaming_buffer, clear_streaming_buffer
+from utils.event_loop import submit
+from utils.tracing import node_duration, clear_trace
 import ui
 
 # --- State Management ---
@@ -16,7 +19,8 @@ def init_state():
         create_new_thread()
     
     if 'agent' not in st.session_state:
-        st.session_state.agent = build_agent()
+        st.session_state.agent = get_agent(use_async=True)
+        start_warm_up()  # Once per process; loads the node models in the background
         
     if 'current_thread_id' not in st.session_state:
          if st.session_state.threads:
@@ -59,86 +63,91 @@ def delete_thread(thread_id):
         st.rerun()
 
 # --- Agent Interaction ---
-def run_agent_in_thread(agent, query, status_container, nodes_container, report_container, conversation_history):
-    """Runs the agent in a separate thread to allow UI updates."""
+def run_agent_in_thread(agent, query, status_container, nodes_container, report_container, conversation_history, thread_id=None):
+    """Runs the agent on the shared background event loop to allow UI updates."""
     
-    initial_state = {"query": query, "history": conversation_history}
+    # The query_id is chosen here so the stream reader exists before the first token
+    query_id = str(uuid.uuid4())
+    initial_state = {"query": query, "history": conversation_history, "query_id": query_id, "thread_id": thread_id}
     
     # Shared state for communication between agent thread and UI
     shared_state = {
         'nodes_executed': [],
+        'node_durations': [],
         'final_report': '',
         'final_state': {},
-        'query_id': None,
+        'query_id': query_id,
         'streaming_content': '',
-        'agent_complete': False,
         'error': None
     }
     
-    def target():
+    buffer = get_streaming_buffer(query_id)
+    reader = buffer.reader()
+    
+    async def target():
         try:
-            # Use the passed agent object directly, avoiding st.session_state in thread
-            for output in agent.stream(initial_state):
+            # Use the passed agent object directly, avoiding st.session_state off the script thread
+            async for output in agent.astream(initial_state):
                 for key, value in output.items():
+                    # Duration first: the UI thread re-renders when nodes_executed grows
+                    shared_state["node_durations"].append(node_duration(query_id, key))
                     shared_state["nodes_executed"].append(key)
-                     # Capture query_id from guard for streaming
-                    if key == "guard" and "query_id" in value:
-                        shared_state["query_id"] = value["query_id"]
                     
-                    # Capture final state
+                    # Accumulate node updates (mode, confidence, token_usage, ...)
+                    apply_update(shared_state["final_state"], value)
                     if key == "formatter":
                         shared_state["final_report"] = value.get("final_report", "")
-                        shared_state["final_state"] = value
-            
-            shared_state["agent_complete"] = True
         except Exception as e:
             shared_state["error"] = str(e)
-            shared_state["agent_complete"] = True
 
-    # Start the agent thread
-    agent_thread = threading.Thread(target=target)
-    agent_thread.start()
-    
-    # Wait for query_id to setup streaming
-    time.sleep(0.3)
+    # Schedule the agent on the shared event loop (no thread per query)
+    agent_future = submit(target())
+    # Wake the UI loop immediately when the agent finishes, even if no node streamed
+    agent_future.add_done_callback(lambda _: buffer.mark_complete())
     
-    # UI Loop: Update while agent runs
-    while not shared_state["agent_complete"]:
-        # Update Execution Path
-        if shared_state["nodes_executed"]:
-             with nodes_container.container():
-                ui.render_execution_path(shared_state["nodes_executed"])
-
-        # Update Status
-        if shared_state["nodes_executed"]:
-             status_container.info(f"⚡ Processing: **{shared_state['nodes_executed'][-1]}**")
+    # UI Loop: drain every available chunk once per frame, capped at UI_MAX_FPS
+    frame_interval = 1.0 / Config.UI_MAX_FPS
+    renderer = ui.IncrementalMarkdown(report_container)
+    rendered_nodes = 0
+    while True:
+        frame_start = time.monotonic()
+        
+        # Blocks until a token arrives, the agent completes, or the frame elapses
+        chunks = reader.drain(timeout=frame_interval)
+        if chunks:
+            renderer.append("".join(chunks))
+        
+        # Update Execution Path and Status only when a node finished
+        nodes = shared_state["nodes_executed"]
+        if len(nodes) != rendered_nodes:
+            rendered_nodes = len(nodes)
+            with nodes_container.container():
+                ui.render_execution_path(nodes, shared_state["node_durations"])
+            status_container.info(f"⚡ Processing: **{nodes[-1]}**")
 
-        # Handle Streaming
-        if shared_state["query_id"]:
-            buffer = get_streaming_buffer(shared_state["query_id"])
-            try:
-                # Non-blocking get
-                chunk = buffer.queue.get(timeout=0.05)
-                if chunk is not None:
-                    shared_state["streaming_content"] += chunk
-                    report_container.markdown(shared_state["streaming_content"] + " ▌")
-            except:
-                pass
+        renderer.render()
         
-        time.sleep(0.05)
+        if agent_future.done() and not chunks and reader.finished:
+            break
         
-    agent_thread.join(timeout=1)
+        # Let tokens accumulate for the rest of the frame
+        elapsed = time.monotonic() - frame_start
+        if elapsed < frame_interval:
+            time.sleep(frame_interval - elapsed)
+    
+    shared_state["streaming_content"] = renderer.text
     
+    # Cleanup Streaming (durations are copied out, so the trace can go too)
+    clear_streaming_buffer(query_id)
+    clear_trace(query_id)
+        
     # Post-processing
     if shared_state["error"]:
         st.error(f"❌ Error: {shared_state['error']}")
-        return None, None, []
-
-    # Cleanup Streaming
-    if shared_state["query_id"]:
-        clear_streaming_buffer(shared_state["query_id"])
+        return None, None, [], []
         
-    return shared_state["final_report"] or shared_state["streaming_content"], shared_state["final_state"], shared_state["nodes_executed"]
+    return (shared_state["final_report"] or shared_state["streaming_content"], shared_state["final_state"],
+            shared_state["nodes_executed"], shared_state["node_durations"])
 
 
 # --- Main Application ---
@@ -218,13 +227,14 @@ def main():
                 for msg in current_thread['messages']
             ]
             
-            final_report, final_state, executed_nodes = run_agent_in_thread(
+            final_report, final_state, executed_nodes, node_durations = run_agent_in_thread(
                 st.session_state.agent, 
                 query, 
                 status_container, 
                 nodes_container, 
                 report_container,
-                conversation_history
+                conversation_history,
+                thread_id=st.session_state.current_thread_id
             )
             
             if final_report:
@@ -248,6 +258,7 @@ def main():
                     'timestamp': timestamp,
                     'content': final_report,
                     'nodes': executed_nodes,
+                    'durations': node_durations,
                     'mode': final_state.get('mode', 'N/A'),
                     'confidence': final_state.get('confidence_score', 0),
                     'tokens': tokens
@@ -0,0 +1,178 @@
+# batch.py
+"""
+Batch runner: research every query in a JSONL file with bounded concurrency.
+
+    python batch.py queries.jsonl -o results.jsonl --concurrency 4
+
+Input lines are {"id": ..., "query": ...} ("id" optional, "thread_id" and
+"history" passed through). Each finished query is appended to the output as
+one JSON line with its report and metrics. Re-running with the same output
+skips ids that already succeeded, so an interrupted sweep resumes where it
+stopped.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+import uuid
+
+from config import Config
+from state import apply_update
+from utils.persistence import flush_persistence
+from utils.streaming import clear_streaming_buffer
+
+
+def query_id_for(item: dict) -> str:
+    """The item's id, or a stable hash of its query."""
+    return str(item.get("id") or hashlib.sha1(item["query"].encode("utf-8")).hexdigest()[:12])
+
+
+def load_queries(path: str) -> list:
+    items = []
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if not item.get("query"):
+                raise ValueError(f"{path}:{line_no}: missing 'query'")
+            item["id"] = query_id_for(item)
+            items.append(item)
+    return items
+
+
+def completed_ids(output_path: str) -> set:
+    """Ids with a successful result in an existing output file."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Torn last line from a crash
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def _terminate_torn_line(path: str):
+    """A crash can leave a partial last line; end it so appended records stay parseable."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+async def run_one(agent, item: dict, timeout: float = None) -> dict:
+    """Run one query through the graph; returns its output record."""
+    stream_id = str(uuid.uuid4())
+    initial_state = {
+        "query": item["query"],
+        "history": item.get("history", []),
+        "thread_id": item.get("thread_id"),
+        "query_id": stream_id,
+    }
+    final_state = {}
+    start = time.perf_counter()
+    record = {"id": item["id"], "query": item["query"]}
+
+    async def consume():
+        async for output in agent.astream(initial_state):
+            for value in output.values():
+                apply_update(final_state, value)
+
+    try:
+        await asyncio.wait_for(consume(), timeout)
+        record["status"] = "ok" if final_state.get("final_report") else "error"
+        if record["status"] == "error":
+            record["error"] = "no report (query unclear or graph ended early)"
+    except asyncio.TimeoutError:
+        record.update(status="error", error=f"timed out after {timeout}s")
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    finally:
+        clear_streaming_buffer(stream_id)
+
+    record.update({
+        "latency_s": round(time.perf_counter() - start, 3),
+        "tokens": final_state.get("token_usage", 0),
+        "iterations": final_state.get("iterations", 0),
+        "mode": final_state.get("mode"),
+        "intent": final_state.get("intent"),
+        "confidence": final_state.get("confidence_score"),
+        "report_path": final_state.get("report_path"),
+        "report": final_state.get("final_report", ""),
+    })
+    return record
+
+
+async def run_batch(items: list, output_path: str, agent=None, concurrency: int = None, timeout: float = None) -> list:
+    """
+    Run items with at most `concurrency` in flight, appending each record to
+    output_path as it finishes. Items already completed there are skipped.
+    """
+    if agent is None:
+        from main import get_agent
+        agent = get_agent(use_async=True)
+    concurrency = concurrency or Config.BATCH_CONCURRENCY
+    done = completed_ids(output_path)
+    pending = [item for item in items if item["id"] not in done]
+    if done:
+        print(f"Resuming: {len(items) - len(pending)} of {len(items)} already done")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    records = []
+
+    _terminate_torn_line(output_path)
+    with open(output_path, "a") as out:
+        async def worker(item):
+            async with semaphore:
+                record = await run_one(agent, item, timeout)
+            # Appended and synced per query so a crash loses at most in-flight work
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            records.append(record)
+            print(f"[{len(records)}/{len(pending)}] {record['id']} {record['status']} "
+                  f"{record['latency_s']}s {record['tokens']} tokens")
+
+        await asyncio.gather(*(worker(item) for item in pending))
+    return records
+
+
+def summarize(records: list) -> str:
+    ok = [r for r in records if r["status"] == "ok"]
+    latencies = sorted(r["latency_s"] for r in ok)
+    p50 = latencies[len(latencies) // 2] if latencies else 0.0
+    tokens = sum(r["tokens"] for r in records)
+    return f"{len(ok)} ok, {len(records) - len(ok)} failed, p50 latency {p50}s, {tokens} tokens"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run research queries from a JSONL file.")
+    parser.add_argument("input", help="JSONL file of {\"id\", \"query\"} lines")
+    parser.add_argument("-o", "--output", help="Results JSONL (default: <input>.results.jsonl)")
+    parser.add_argument("-c", "--concurrency", type=int, default=Config.BATCH_CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=Config.BATCH_QUERY_TIMEOUT_SECONDS,
+                        help="Per-query timeout in seconds")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    items = load_queries(args.input)
+    records = asyncio.run(run_batch(items, output, concurrency=args.concurrency, timeout=args.timeout))
+    # Memory upserts and report files are written behind; finish them before exiting
+    flush_persistence()
+    print(f"\n{summarize(records)} -> {output}")
+    return 0 if all(r["status"] == "ok" for r in records) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+End-to-end agent benchmark, fully offline.
+
+Runs the async graph with a scripted streaming fake LLM, fake search and an
+in-memory Qdrant store, then reports per-node p50/p95/p99 latency,
+end-to-end latency, time-to-first-token, throughput and peak Python memory
+(tracemalloc) for quick and deep mode.
+
+    python benchmarks/agent_benchmark.py --runs 20 --concurrency 4
+    python benchmarks/agent_benchmark.py --mode deep --tokens-per-second 50 --json deep.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeSearch, FakeStreamingChatModel, HashingEmbedder
+from config import Config
+from utils import metrics
+from state import apply_update
+from utils.streaming import clear_streaming_buffer, get_streaming_buffer
+
+QUERIES = {
+    "quick": "How do I reverse a list in Python?",
+    "deep": "Compare Kafka vs RabbitMQ for event sourcing",
+}
+
+
+def install_fakes(model, search, output_dir: str, speculative: bool = False):
+    """
+    Point the graph at the fakes and an in-memory memory engine.
+    Returns a function that undoes every patch.
+    """
+    from qdrant_client import QdrantClient
+    import memory as memory_module
+    from graph import nodes_exec, nodes_pre
+    from memory import MemoryManager
+    from utils import tracing
+
+    engine = MemoryManager(client=QdrantClient(location=":memory:"), embedder=HashingEmbedder(), local=True)
+    patches = [
+        (nodes_pre, "get_llm", lambda node=None: model),
+        (nodes_exec, "get_llm", lambda node=None: model),
+        (nodes_exec, "fan_out_search", search.search),
+        (nodes_exec, "afan_out_search", search.asearch),
+        (nodes_pre, "memory", engine),
+        (memory_module, "memory", engine),  # write-behind persistence imports it at call time
+        (Config, "OUTPUT_DIR", output_dir),
+        (Config, "ANSWER_CACHE_ENABLED", False),  # every run must do the work
+        (tracing, "get_exporter", lambda: None),  # keep spans in memory, not in logs/
+        (Config, "SPECULATIVE_SEARCH", speculative),
+    ]
+    saved = [(target, name, getattr(target, name)) for target, name, _ in patches]
+    for target, name, value in patches:
+        setattr(target, name, value)
+
+    def restore():
+        for target, name, value in saved:
+            setattr(target, name, value)
+    return restore
+
+
+def build_timed_agent(node_times: dict):
+    """Async graph whose nodes record (node, seconds) into node_times[query_id]."""
+    import main
+
+    def timed(name, node):
+        async def wrapper(state):
+            start = time.perf_counter()
+            try:
+                return await node(state)
+            finally:
+                node_times[state.get("query_id")].append((name, time.perf_counter() - start))
+        return wrapper
+
+    original = main.NODES
+    main.NODES = {name: (sync, timed(name, fn)) for name, (sync, fn) in original.items()}
+    try:
+        return main._build_workflow(use_async=True)
+    finally:
+        main.NODES = original
+
+
+async def _first_token(query_id: str, start: float):
+    async for _ in get_streaming_buffer(query_id).reader():
+        return time.perf_counter() - start
+
+
+async def run_query(agent, query: str, node_times: dict) -> dict:
+    query_id = str(uuid.uuid4())
+    node_times[query_id] = []
+    start = time.perf_counter()
+    ttft = asyncio.ensure_future(_first_token(query_id, start))
+    final_state = {}
+    async for output in agent.astream({"query": query, "history": [], "query_id": query_id}):
+        for value in output.values():
+            apply_update(final_state, value)
+    latency = time.perf_counter() - start
+    if not ttft.done():
+        ttft.cancel()
+    first_token = ttft.result() if ttft.done() and not ttft.cancelled() else None
+    clear_streaming_buffer(query_id)
+    return {
+        "query_id": query_id,
+        "latency": latency,
+        "ttft": first_token,
+        "mode": final_state.get("mode"),
+        "iterations": final_state.get("iterations", 0),
+        "tokens": final_state.get("token_usage", 0),
+    }
+
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None}
+    ms = np.asarray(samples) * 1000
+    return {f"p{p}": round(float(np.percentile(ms, p)), 2) for p in (50, 95, 99)}
+
+
+async def run_scenario(mode: str, runs: int, concurrency: int, model, search, trace_memory: bool = True) -> dict:
+    from utils.persistence import flush_persistence
+
+    node_times = defaultdict(list)
+    agent = build_timed_agent(node_times)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            return await run_query(agent, f"{QUERIES[mode]} (run {i})", node_times)
+
+    await run_query(agent, QUERIES[mode] + " (warm-up)", defaultdict(list))  # imports, first collection
+    flush_persistence()
+    node_times.clear()
+    metrics.reset("speculative.")
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(runs)))
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    if trace_memory:
+        tracemalloc.stop()
+    flush_persistence()
+
+    per_node = defaultdict(list)
+    for times in node_times.values():
+        for name, seconds in times:
+            per_node[name].append(seconds)
+
+    return {
+        "mode": mode,
+        "runs": runs,
+        "concurrency": concurrency,
+        "observed_modes": sorted({r["mode"] for r in results}),
+        "mean_iterations": round(sum(r["iterations"] for r in results) / runs, 2),
+        "nodes": {name: {"calls": len(s), **_percentiles(s)} for name, s in per_node.items()},
+        "end_to_end": _percentiles([r["latency"] for r in results]),
+        "ttft": _percentiles([r["ttft"] for r in results if r["ttft"] is not None]),
+        "throughput_qps": round(runs / wall, 3),
+        "peak_memory_mb": round(peak / 2**20, 2) if peak is not None else None,
+        "speculative": metrics.snapshot("speculative."),
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"\n== {report['mode']} mode: {report['runs']} runs, concurrency {report['concurrency']} "
+        f"(graph took {'/'.join(report['observed_modes'])}, {report['mean_iterations']} research rounds) ==",
+        f"{'node':<16}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}",
+    ]
+    for name, s in report["nodes"].items():
+        lines.append(f"{name:<16}{s['calls']:>7}{s['p50']:>10}{s['p95']:>10}{s['p99']:>10}")
+    for label, key in (("end-to-end", "end_to_end"), ("first token", "ttft")):
+        s = report[key]
+        lines.append(f"{label:<16}{'':>7}{str(s['p50']):>10}{str(s['p95']):>10}{str(s['p99']):>10}")
+    lines.append(f"throughput {report['throughput_qps']} queries/s, peak Python memory {report['peak_memory_mb']} MB")
+    if report["speculative"]:
+        spec = report["speculative"]
+        lines.append(f"speculative search: {spec.get('speculative.hit', 0)} used, {spec.get('speculative.wasted', 0)} wasted")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline agent benchmark (fake LLM and search).")
+    parser.add_argument("--mode", choices=["quick", "deep", "both"], default="both")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=200)
+    parser.add_argument("--search-ms", type=float, default=200.0)
+    parser.add_argument("--speculative", action="store_true", help="Start deep mode's first search with the planner")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Skip memory tracing (it slows Python down)")
+    parser.add_argument("--json", help="Also write the reports to this file")
+    args = parser.parse_args(argv)
+
+    model = FakeStreamingChatModel(
+        tokens_per_second=args.tokens_per_second,
+        first_token_latency=args.first_token_ms / 1000,
+        answer_tokens=args.answer_tokens,
+    )
+    search = FakeSearch(latency=args.search_ms / 1000)
+    modes = ["quick", "deep"] if args.mode == "both" else [args.mode]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        restore = install_fakes(model, search, output_dir, speculative=args.speculative)
+        try:
+            reports = [
+                asyncio.run(run_scenario(mode, args.runs, args.concurrency, model, search, not args.no_tracemalloc))
+                for mode in modes
+            ]
+        finally:
+            restore()
+
+    for report in reports:
+        print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    return reports
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Offline stand-ins for the LLM, web search and the embedding model.
+
+FakeStreamingChatModel answers from a script keyed on prompt markers
+(classify, plan, gap analysis) and generates filler text for everything
+else, streaming word tokens at a configurable rate after a configurable
+first-token latency. Everything is deterministic and needs no network.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from typing import Any, Callable, Dict, Iterator, AsyncIterator, List, Optional, Union
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_FILLER = (
+    "Kafka stores records in partitioned append-only logs replicated across brokers while RabbitMQ "
+    "routes messages through exchanges into queues and deletes them once acknowledged so replay "
+    "ordering throughput and latency trade-offs differ under consumer lag and broker failure"
+).split()
+
+
+def plan_from_query(prompt: str) -> str:
+    """'deep' for comparison/design questions, 'quick' otherwise (mirrors the planner prompt)."""
+    query = prompt.rsplit("Current Query:", 1)[-1].lower()
+    return "deep" if any(w in query for w in ("compare", " vs ", "architecture", "design")) else "quick"
+
+
+def gap_verdict(prompt: str) -> str:
+    """Low confidence with gaps on the first round, high once something is covered."""
+    first_round = "Aspects already covered: None yet." in prompt
+    return json.dumps({
+        "summary": "Kafka keeps a replicated log; RabbitMQ deletes acknowledged messages.",
+        "covered": ["storage model"] if first_round else ["storage model", "replay"],
+        "gaps": ["throughput benchmarks"] if first_round else [],
+        "contradictions": [],
+        "confidence_score": 0.5 if first_round else 0.9,
+    })
+
+
+DEFAULT_SCRIPT: Dict[str, Union[str, Callable[[str], str]]] = {
+    "Classify the following query": "Category: Research, Clear: True",
+    "Analyze the query complexity": plan_from_query,
+    "evaluating research progress": gap_verdict,
+}
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """Scripted chat model that streams at `tokens_per_second` after `first_token_latency` seconds."""
+
+    tokens_per_second: float = 500.0
+    first_token_latency: float = 0.05
+    answer_tokens: int = 200
+    script: Dict[str, Any] = DEFAULT_SCRIPT
+    # Set per call by utils.generation.for_prompt; num_predict and stop are honoured like Ollama's
+    num_predict: Optional[int] = None
+    num_ctx: Optional[int] = None
+    stop: Optional[List[str]] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        for marker, answer in self.script.items():
+            if marker in prompt:
+                return answer(prompt) if callable(answer) else answer
+        return " ".join(_FILLER[i % len(_FILLER)] for i in range(self.answer_tokens))
+
+    def _tokens(self, messages):
+        answer = self._answer(messages)
+        for stop in self.stop or ():
+            answer = answer.split(stop, 1)[0]
+        tokens = re.findall(r"\S+\s*", answer)
+        return tokens if self.num_predict is None else tokens[:self.num_predict]
+
+    @staticmethod
+    def _usage(messages, n_tokens: int) -> dict:
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        return {"input_tokens": prompt_tokens, "output_tokens": n_tokens, "total_tokens": prompt_tokens + n_tokens}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self.first_token_latency + len(tokens) / self.tokens_per_second)
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(messages, len(tokens)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.first_token_latency + len(tokens) / self.tokens_per_second)
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(messages, len(tokens)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        tokens = self._tokens(messages)
+        time.sleep(self.first_token_latency)
+        for token in tokens:
+            time.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, len(tokens))))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.first_token_latency)
+        for token in tokens:
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, len(tokens))))
+
+
+class FakeSearch:
+    """fan_out_search / afan_out_search replacement with fixed latency and deterministic hits."""
+
+    def __init__(self, latency: float = 0.2, hits_per_query: int = 3, snippet_words: int = None):
+        self.latency = latency
+        self.hits_per_query = hits_per_query
+        self.snippet_words = snippet_words
+
+    def _results(self, queries):
+        results = []
+        for query in queries:
+            digest = hashlib.sha1(query.encode("utf-8")).hexdigest()
+            hits = [{
+                "title": f"{query} ({i + 1})",
+                "url": f"https://example.com/{digest[:8]}/{i}",
+                "content": f"{query}: finding {digest[i:i + 6]}. " + self._snippet(digest, i),
+            } for i in range(self.hits_per_query)]
+            results.append({"query": query, "provider": "fake", "hits": hits, "error": None})
+        return results
+
+    def _snippet(self, digest: str, i: int) -> str:
+        if self.snippet_words is None:
+            return " ".join(_FILLER[i:] + _FILLER[:i])
+        # Page-sized text that differs per hit, so near-duplicate filtering keeps it
+        rng = random.Random(f"{digest}{i}")
+        return " ".join(rng.choice(_FILLER) for _ in range(self.snippet_words))
+
+    def search(self, queries, providers=None, max_results=None):
+        time.sleep(self.latency)
+        return self._results(queries)
+
+    async def asearch(self, queries, providers=None, max_results=None):
+        await asyncio.sleep(self.latency)
+        return self._results(queries)
+
+
+class HashingEmbedder:
+    """Bag-of-words hashing embedder with FastEmbed's embed/query_embed interface."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _vector(self, text):
+        v = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):  # Punctuation-insensitive, like a real tokenizer
+            v[int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % self.dim] += 1.0
+        return v / (np.linalg.norm(v) or 1.0)
+
+    def embed(self, texts):
+        return (self._vector(t) for t in texts)
+
+    def query_embed(self, texts):
+        texts = [texts] if isinstance(texts, str) else texts
+        return (self._vector(t) for t in texts)
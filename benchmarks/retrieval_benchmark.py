@@ -0,0 +1,91 @@
+"""
+Retrieval latency benchmark for the memory engine.
+
+Fills a scratch collection with N synthetic memories spread over many chat
+threads, then times thread-filtered hybrid get_context() calls against
+Config.MEMORY_SEARCH_TARGET_MS. Run against the same Qdrant server the
+workers use (QDRANT_URL); embedded mode searches exactly and is only useful
+for small N.
+
+    QDRANT_URL=http://localhost:6333 python benchmarks/retrieval_benchmark.py --points 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import HashingEmbedder
+from config import Config
+from memory import MemoryManager
+
+VOCABULARY = [
+    "kafka", "rabbitmq", "postgres", "redis", "partition", "replica", "consumer", "producer", "latency",
+    "throughput", "index", "vacuum", "shard", "cache", "eviction", "snapshot", "raft", "leader", "quorum",
+    "transformer", "attention", "mamba", "tokenizer", "embedding", "gradient", "kernel", "scheduler",
+    "memory", "thread", "lock", "mutex", "async", "coroutine", "socket", "tls", "http2", "grpc", "protobuf",
+    "schema", "migration", "rollback", "deploy", "container", "kubernetes", "ingress", "autoscaler",
+]
+
+
+def synthetic_memory(rng: random.Random) -> str:
+    words = rng.choices(VOCABULARY, k=rng.randint(40, 120))
+    return f"Query: {' '.join(words[:6])}\nResponse: {' '.join(words)}"
+
+
+def percentile(samples, p):
+    return float(np.percentile(samples, p)) if samples else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--threads", type=int, default=200, help="Distinct thread_ids (filter selectivity)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=512)
+    parser.add_argument("--collection", default="bench_research_memory")
+    parser.add_argument("--keep", action="store_true", help="Keep the collection for another run")
+    args = parser.parse_args()
+
+    Config.MEMORY_MAINTENANCE_EVERY = 0
+    engine = MemoryManager(embedder=HashingEmbedder())
+    engine.collection_name = args.collection
+    rng = random.Random(7)
+    mode = f"server {Config.QDRANT_URL}" if Config.QDRANT_URL else f"embedded {Config.QDRANT_PATH}"
+    print(f"Mode: {mode}, quantization: {Config.MEMORY_QUANTIZATION}, HNSW: {Config.MEMORY_HNSW}")
+
+    existing = engine.client.count(args.collection).count if engine.client.collection_exists(args.collection) else 0
+    start = time.perf_counter()
+    for offset in range(existing, args.points, args.batch):
+        n = min(args.batch, args.points - offset)
+        texts = [synthetic_memory(rng) for _ in range(n)]
+        metadatas = [{"thread_id": f"thread-{rng.randrange(args.threads)}", "intent": "Research"} for _ in range(n)]
+        engine.add_memories(texts, metadatas, merge=False)
+    inserted = args.points - existing
+    if inserted > 0:
+        elapsed = time.perf_counter() - start
+        print(f"Inserted {inserted} points in {elapsed:.1f}s ({inserted / elapsed:.0f}/s)")
+
+    latencies = []
+    for _ in range(args.queries):
+        query = " ".join(rng.choices(VOCABULARY, k=6))
+        thread_id = f"thread-{rng.randrange(args.threads)}"
+        t = time.perf_counter()
+        engine.get_context(query, n_results=2, thread_id=thread_id)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    p50, p95, p99 = (percentile(latencies, p) for p in (50, 95, 99))
+    print(f"get_context over {args.points} points: p50 {p50:.1f}ms  p95 {p95:.1f}ms  p99 {p99:.1f}ms "
+          f"(target p95 <= {Config.MEMORY_SEARCH_TARGET_MS}ms)")
+
+    if not args.keep:
+        engine.client.delete_collection(args.collection)
+    return 0 if p95 <= Config.MEMORY_SEARCH_TARGET_MS else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,7 +11,30 @@ class Config:
     # --- Model Configuration ---
     MODEL_NAME = "ministral-3:3b-cloud"  # Local Ollama model
     TEMPERATURE = 0
-    OLLAMA_BASE_URL = "http://172.22.124.89:11434/api/generate"
+    OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://172.22.124.89:11434")
+    # More Ollama hosts, comma-separated (OLLAMA_BACKENDS=http://a:11434,http://b:11434): calls are
+    # balanced between them, see utils/backends.py. Empty: OLLAMA_BASE_URL alone.
+    OLLAMA_BACKENDS = [url.strip() for url in os.getenv("OLLAMA_BACKENDS", "").split(",") if url.strip()]
+    BACKEND_PROBE_INTERVAL = 15         # Seconds between health probes (/api/tags, /api/ps)
+    BACKEND_PROBE_TIMEOUT = 2
+    BACKEND_COOLDOWN_SECONDS = 30       # A backend that refused a connection is skipped this long
+    BACKEND_BUSY_IN_FLIGHT = 4          # Ollama's default OLLAMA_NUM_PARALLEL; more calls queue there
+    BACKEND_MAX_SESSIONS = 10_000       # Sticky thread/query -> backend entries (LRU)
+    OLLAMA_MAX_CONNECTIONS = 16         # Pooled HTTP connections per backend, shared by all nodes
+    OLLAMA_TIMEOUT = 300                # Seconds per request (long syntheses on CPU)
+    LLM_KEEP_ALIVE = "30m"              # How long Ollama keeps a model loaded after a call
+    LLM_WARMUP = True                   # Load the node models at startup, before the first query
+    # Per-node model registry: "model", "num_ctx", "keep_alive", "base_url" override the
+    # defaults above (num_ctx defaults to the model's context window). Routing nodes only
+    # emit a word or two, so a small model there, e.g. {"model": "qwen2.5:0.5b", "num_ctx": 2048},
+    # cuts latency while synthesis keeps the large one.
+    NODE_MODELS = {
+        "classify": {"model": MODEL_NAME},
+        "plan": {"model": MODEL_NAME},
+        "quick": {"model": MODEL_NAME},
+        "gap": {"model": MODEL_NAME},
+        "synthesize": {"model": MODEL_NAME},
+    }
     
     # --- API Keys ---
     # Ensure these are set in your .env file
@@ -21,12 +44,125 @@ class Config:
     # These values define the 'Guard Layer' limits
     MAX_TOKENS_PER_QUERY = 5000 
     MAX_ITERATIONS_DEEP_MODE = 3  # Max loops for research
+    QUICK_MAX_OUTPUT_TOKENS = 1024
+    SYNTHESIS_MAX_OUTPUT_TOKENS = 1500
+    BUDGET_MIN_OUTPUT_TOKENS = 128
+    DEEP_ROUND_TOKEN_ESTIMATE = 1500  # One gap analysis call (prompt + output)
+    BUDGET_SHRINK_HISTORY_AT = 0.5    # Fraction of budget used before history is halved
+    BUDGET_DROP_HISTORY_AT = 0.8      # ... and dropped entirely
     CONFIDENCE_THRESHOLD = 0.8    # Minimum confidence to stop deep research
     
+    # --- Search Fan-out ---
+    SEARCH_MAX_RESULTS = 3        # Results per provider per sub-query
+    MAX_SEARCH_SUBQUERIES = 4     # Base query + gaps searched per iteration
+    # Max in-flight requests per provider (process-wide)
+    SEARCH_CONCURRENCY = {"tavily": 4, "duckduckgo": 2}
+    
+    # --- Evidence Packing ---
+    # Evidence tokens per prompt, further bounded by the model's context window
+    EVIDENCE_TOKEN_BUDGET = {"gap_analysis": 1200, "synthesis": 2000}
+    EVIDENCE_CHUNK_TOKENS = 200
+    GAP_SUMMARY_MAX_TOKENS = 300        # Running summary carried between gap analyses
+    PROMPT_OVERHEAD_TOKENS = 400        # Template, query and history
+    DEFAULT_CONTEXT_WINDOW = 4096       # Ollama's default num_ctx
+    MODEL_CONTEXT_WINDOWS = {}          # Per-model overrides, e.g. {"llama3.1:8b": 8192}
+    
+    # --- Generation Profiles ---
+    # Per-node output cap and stop sequences. num_ctx comes from NODE_MODELS and only
+    # grows (doubling, up to MAX_NUM_CTX) for a packed prompt that would not fit in it:
+    # Ollama reloads the model whenever num_ctx changes.
+    GENERATION_PROFILES = {
+        "classify": {"num_predict": 24, "stop": ["\n"]},   # 'Category: <category>, Clear: <True/False>'
+        "plan": {"num_predict": 8},                        # 'quick' or 'deep'; no stop, a reply may open with "\n"
+        "quick": {"num_predict": QUICK_MAX_OUTPUT_TOKENS},
+        "gap": {"num_predict": 256 + GAP_SUMMARY_MAX_TOKENS},  # JSON verdict + running summary
+        "synthesize": {"num_predict": SYNTHESIS_MAX_OUTPUT_TOKENS},
+    }
+    MAX_NUM_CTX = 32768
+    NUM_CTX_MARGIN_TOKENS = 64          # Slack for the ~4 chars/token estimate
+    
+    # --- Result Deduplication ---
+    DEDUP_SIMHASH_DISTANCE = 10         # Max differing bits (of 64) for a near-duplicate
+    DEDUP_MIN_WORDS = 8                 # Shorter snippets are only checked for exact matches
+    # Query parameters dropped when comparing URLs, plus every utm_*. Only parameters that are
+    # always trackers: generic ones like "ref" select content (GitHub's ?ref=<branch>)
+    DEDUP_TRACKING_PARAMS = ["fbclid", "gclid", "mc_cid", "mc_eid"]
+    
+    # --- Search Cache ---
+    SEARCH_CACHE_ENABLED = True
+    SEARCH_CACHE_TTL_SECONDS = 24 * 3600
+    SEARCH_CACHE_MAX_ENTRIES = 5000  # LRU-evicted beyond this
+    
+    # --- Semantic Answer Cache ---
+    ANSWER_CACHE_ENABLED = True
+    ANSWER_CACHE_THRESHOLD = 0.95           # Min cosine similarity between queries
+    ANSWER_CACHE_MAX_AGE_SECONDS = 7 * 24 * 3600
+    
+    # --- Streaming ---
+    STREAM_MAX_CHARS = 200_000          # Per-query bound; oldest chunks evicted beyond it
+    STREAM_BUFFER_TTL_SECONDS = 600     # Idle buffers are dropped after this
+    UI_MAX_FPS = 20                     # Streamlit re-render cap while streaming
+    
+    # --- Memory Engine (Qdrant) ---
+    # Set QDRANT_URL to share one Qdrant server between worker processes;
+    # otherwise the store is embedded at QDRANT_PATH (":memory:" for tests),
+    # which allows a single process only.
+    QDRANT_URL = os.getenv("QDRANT_URL")
+    QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+    QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+    QDRANT_POOL_SIZE = 8                # HTTP connections shared by all threads
+    QDRANT_TIMEOUT = 10
+    EMBEDDING_MODEL = "BAAI/bge-small-en"  # FastEmbed; matches collections written by client.add
+    EMBEDDING_SYMMETRIC = True          # bge embeds queries like documents: one cached vector serves both
+    EMBED_CACHE_ENTRIES = 20_000        # float32 LRU (~30 MB at 384 dims)
+    EMBED_MAX_BATCH = 64                # Texts per ONNX call
+    EMBED_BATCH_WAIT_MS = 5             # How long a batch waits for concurrent requests
+    
+    # --- Memory Retention & Index ---
+    MEMORY_RETENTION_DAYS = 180         # None keeps memories forever
+    MEMORY_MAX_ENTRIES = 200_000        # Oldest memories deleted beyond this
+    MEMORY_MERGE_THRESHOLD = 0.97       # Cosine similarity at which a new memory replaces an old one
+    MEMORY_COMPACT_AFTER_DAYS = 14      # Older reports keep a summary + report path only
+    MEMORY_COMPACT_MAX_CHARS = 600
+    MEMORY_MAINTENANCE_EVERY = 200      # Run retention/compaction after this many adds
+    MEMORY_QUANTIZATION = "scalar"      # "scalar" (int8), "binary" or None
+    MEMORY_OVERSAMPLING = 2.0           # Quantized candidates rescored with full vectors
+    MEMORY_VECTORS_ON_DISK = True       # Full vectors on disk; quantized copy stays in RAM
+    MEMORY_HNSW = {"m": 16, "ef_construct": 100}
+    MEMORY_HNSW_EF = 64                 # Search-time beam width
+    MEMORY_HYBRID_PREFETCH = 20         # Dense and BM25 candidates each, before RRF fusion
+    MEMORY_BM25_AVG_LEN = 256           # Typical memory length in terms (BM25 length norm)
+    MEMORY_SEARCH_TARGET_MS = 50        # p95 budget for get_context at 100k+ points (server mode)
+    CONTEXT_SCOPE = "thread"            # "thread": this chat thread's memories and thread-less ones; "all": everything
+    
+    # --- Batch Runner (batch.py) ---
+    BATCH_CONCURRENCY = 4               # Queries in flight; keep at or below OLLAMA_NUM_PARALLEL
+    BATCH_QUERY_TIMEOUT_SECONDS = 900
+    
+    # --- Write-behind Persistence ---
+    PERSIST_QUEUE_SIZE = 256            # Pending writes before submit() blocks
+    PERSIST_BATCH_SIZE = 32             # Writes coalesced into one upsert
+    PERSIST_BATCH_WINDOW = 0.05         # Seconds to wait for a batch to fill
+    PERSIST_ENQUEUE_TIMEOUT = 5.0       # Backpressure wait before writing inline
+    PERSIST_SHUTDOWN_TIMEOUT = 30.0     # Max flush time at interpreter exit
+    
+    # --- Speculative Search ---
+    SPECULATIVE_SEARCH = os.getenv("SPECULATIVE_SEARCH", "false").lower() == "true"  # First deep-mode search starts with the planner
+    SPECULATIVE_TTL_SECONDS = 120       # Unclaimed speculative searches are cancelled after this
+    
+    # --- Tracing ---
+    TRACE_EXPORT = os.getenv("TRACE_EXPORT", "jsonl")  # "jsonl" (OTLP/JSON spans) or "none"
+    TRACE_MAX_TRACES = 200              # Runs whose spans stay in memory for the UI
+    TRACE_LOG_NODES = True              # One DEBUG line per node with its llm/search/memory breakdown
+    
     # --- Path Configuration ---
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    QDRANT_PATH = os.path.join(BASE_DIR, "qdrant_db")
+    QDRANT_PATH = os.getenv("QDRANT_PATH", os.path.join(BASE_DIR, "qdrant_db"))
     OUTPUT_DIR = os.path.join(BASE_DIR, "output")
+    CACHE_DIR = os.path.join(BASE_DIR, "cache")
+    SEARCH_CACHE_PATH = os.path.join(CACHE_DIR, "search_cache.sqlite")
+    EMBEDDING_CACHE_DIR = os.path.join(CACHE_DIR, "fastembed")
+    TRACE_PATH = os.getenv("TRACE_PATH", os.path.join(BASE_DIR, "logs", "traces.jsonl"))
 
     @staticmethod
     def validate():
@@ -35,5 +171,7 @@ class Config:
             print("⚠️ Warning: TAVILY_API_KEY not found. Falling back to DuckDuckGo.")
             
 # Create directories if they don't exist
-os.makedirs(Config.QDRANT_PATH, exist_ok=True)
-os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
\ No newline at end of file
+if not Config.QDRANT_URL and Config.QDRANT_PATH != ":memory:":
+    os.makedirs(Config.QDRANT_PATH, exist_ok=True)
+os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
+os.makedirs(Config.CACHE_DIR, exist_ok=True)
\ No newline at end of file
@@ -1,84 +1,103 @@
-from langchain_ollama import ChatOllama
-from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import SystemMessage, HumanMessage
 from state import AgentState
 from config import Config
-import os
-from prompts.research_prompts import GAP_ANALYSIS_PROMPT, RESEARCH_SYNTHESIS_PROMPT
+from prompts.research_prompts import (
+    GAP_ANALYSIS_PROMPT,
+    GAP_ANALYSIS_REPAIR_PROMPT,
+    GAP_ANALYSIS_SCHEMA,
+    RESEARCH_SYNTHESIS_PROMPT
+)
 from utils.streaming import get_streaming_buffer
+from utils.structured_output import parse_gap_analysis
+from utils import metrics
+from utils.dedup import DedupIndex
+from utils.evidence import pack_evidence, evidence_budget
+from utils.resources import get_llm, llm_profile
+from utils.budget import BudgetTracker, usage_from
+from utils.generation import for_prompt, prompt_tokens, stream_until, astream_until
+from tools.search_tools import fan_out_search, afan_out_search
+from tools import speculative
 
-llm = ChatOllama(model=Config.MODEL_NAME)
+PLANNER_PROMPT = ChatPromptTemplate.from_template(
+    "Analyze the query complexity. "
+    "If it requires simple fact checking or code snippet, choose 'quick'. "
+    "If it requires extensive research, comparison, or architectural design, choose 'deep'. "
+    "Return ONLY the mode: 'quick' or 'deep'.\n\n"
+    "{history_context}"
+    "Current Query: {query}"
+)
 
-# Custom DDG Tool to bypass langchain-community import issues
-from duckduckgo_search import DDGS
+def _planner_inputs(state: AgentState) -> dict:
+    # Build conversation history context (last 4 messages, fewer as the budget drains)
+    window = BudgetTracker(state).history_messages(4)
+    history = state.get("history", [])[-window:] if window else []
+    history_text = ""
+    if history:
+        history_text = "\n\nPrevious conversation:\n" + "\n".join([
+            f"{msg['role'].capitalize()}: {msg['content']}" for msg in history
+        ]) + "\n"
+    return {"query": state["query"], "history_context": history_text}
+
+def _planner_messages(state: AgentState) -> list:
+    return PLANNER_PROMPT.format_messages(**_planner_inputs(state))
 
-class CustomDuckDuckGoSearch:
-    def invoke(self, query):
-        try:
-            with DDGS() as ddgs:
-                results = list(ddgs.text(query, max_results=3))
-                return str(results)
-        except Exception as e:
-            return f"Search error: {e}"
+def _parse_mode(text: str):
+    # Complete as soon as either word is out
+    text = text.lower()
+    if "deep" in text:
+        return "deep"
+    if "quick" in text:
+        return "quick"
+    return None
 
-# Initialize Search Tools
-tavily_api_key = os.getenv("TAVILY_API_KEY")
-if tavily_api_key:
-    search_tool = TavilySearchResults(max_results=3)
-else:
-    search_tool = CustomDuckDuckGoSearch()
+def _planner_result(state: AgentState, mode, tokens_used: int) -> dict:
+    # The budget check happens in join_preprocessing, once the classifier's tokens are counted too
+    return {"mode": mode or "quick", "token_usage": tokens_used}
 
 def planner_router(state: AgentState):
     """
     Planner and router.
     Decides between 'quick' and 'deep' mode.
     """
-    # Build conversation history context
-    history = state.get("history", [])
-    history_text = ""
-    if history:
-        history_text = "\n\nPrevious conversation:\n" + "\n".join([
-            f"{msg['role'].capitalize()}: {msg['content']}" for msg in history[-4:]  # Last 4 messages
-        ]) + "\n"
-    
-    prompt = ChatPromptTemplate.from_template(
-        "Analyze the query complexity. "
-        "If it requires simple fact checking or code snippet, choose 'quick'. "
-        "If it requires extensive research, comparison, or architectural design, choose 'deep'. "
-        "Return ONLY the mode: 'quick' or 'deep'.\\n\\n"
-        "{history_context}"
-        "Current Query: {query}"
-    )
-    chain = prompt | llm
-    response = chain.invoke({"query": state["query"], "history_context": history_text})
-    mode = response.content.strip().lower()
-    
-    # Track tokens
-    tokens_used = 0
-    if hasattr(response, 'usage_metadata') and response.usage_metadata:
-        tokens_used = response.usage_metadata.get('total_tokens', 0)
-    
-    if "deep" in mode:
-        return {"mode": "deep", "token_usage": state.get("token_usage", 0) + tokens_used}
-    return {"mode": "quick", "token_usage": state.get("token_usage", 0) + tokens_used}
+    # Deep mode's first search is known before the mode is: start it now (SPECULATIVE_SEARCH)
+    speculative.start(state.get("query_id"), [_search_query(state)], fan_out_search)
+    messages = _planner_messages(state)
+    mode, _, tokens_used = stream_until(for_prompt(get_llm("plan"), "plan", messages), messages, _parse_mode)
+    return _planner_result(state, mode, tokens_used)
 
-def quick_mode_executor(state: AgentState):
+async def aplanner_router(state: AgentState):
+    """Async planner_router."""
+    speculative.astart(state.get("query_id"), [_search_query(state)], afan_out_search)
+    messages = _planner_messages(state)
+    mode, _, tokens_used = await astream_until(for_prompt(get_llm("plan"), "plan", messages), messages, _parse_mode)
+    return _planner_result(state, mode, tokens_used)
+
+def join_preprocessing(state: AgentState):
     """
-    Quick mode executor with token-by-token streaming.
+    Join of the parallel context / classify / planner branches.
+    Not enough budget left for even one research round: answer directly.
     """
-    query_id = state.get("query_id", "")
-    buffer = get_streaming_buffer(query_id) if query_id else None
-    
-    full_response = ""
-    tokens_used = 0
-    
+    update = {}
+    if state.get("mode") == "deep" and not BudgetTracker(state).allows_research_round():
+        print("DEBUG: Budget too low for deep research, switching to quick mode")
+        update = {"mode": "quick"}
+    if not state.get("is_clarified") or update.get("mode", state.get("mode")) != "deep":
+        speculative.cancel(state.get("query_id"))
+    return update
+
+async def ajoin_preprocessing(state: AgentState):
+    """Async join_preprocessing (no I/O, kept for a fully async graph)."""
+    return join_preprocessing(state)
+
+def _quick_messages(state: AgentState) -> list:
     # Build conversation history for context
-    history = state.get("history", [])
+    window = BudgetTracker(state).history_messages(6)
+    history = state.get("history", [])[-window:] if window else []
     messages = []
     
     # Add conversation history
-    for msg in history[-6:]:  # Last 6 messages for context
+    for msg in history:  # Last 6 messages for context
         if msg['role'] == 'user':
             messages.append(HumanMessage(content=msg['content']))
         else:
@@ -86,11 +105,36 @@ def quick_mode_executor(state: AgentState):
     
     # Add current query
     messages.append(HumanMessage(content=state["query"]))
+    return messages
+
+def _quick_llm(state: AgentState, messages: list):
+    max_tokens = BudgetTracker(state).max_output_tokens(Config.QUICK_MAX_OUTPUT_TOKENS, prompt_tokens(messages))
+    return for_prompt(get_llm("quick"), "quick", messages, max_tokens)
+
+def _quick_result(state: AgentState, full_response: str, tokens_used: int) -> dict:
+    # Return complete state
+    return {
+        "research_data": [{"content": full_response, "source": "LLM Knowledge"}],
+        "final_report": full_response,
+        "token_usage": tokens_used
+    }
+
+def quick_mode_executor(state: AgentState):
+    """
+    Quick mode executor with token-by-token streaming.
+    """
+    query_id = state.get("query_id", "")
+    buffer = get_streaming_buffer(query_id) if query_id else None
+    
+    full_response = ""
+    tokens_used = 0
     
     # Use streaming with conversation history
-    for chunk in llm.stream(messages):
+    messages = _quick_messages(state)
+    for chunk in _quick_llm(state, messages).stream(messages):
         token = chunk.content
         full_response += token
+        tokens_used += usage_from(chunk)  # Final chunk carries Ollama's counts
         
         # Add to streaming buffer for real-time display
         if buffer:
@@ -100,151 +144,287 @@ def quick_mode_executor(state: AgentState):
     if buffer:
         buffer.mark_complete()
     
-    # Track token metadata (if available)
-    # Note: streaming doesn't provide usage_metadata, estimate based on content
-    tokens_used = len(full_response.split()) * 2  # Rough estimate
+    return _quick_result(state, full_response, tokens_used)
+
+async def aquick_mode_executor(state: AgentState):
+    """Async quick_mode_executor."""
+    query_id = state.get("query_id", "")
+    buffer = get_streaming_buffer(query_id) if query_id else None
     
-    # Return complete state
-    return {
-        "research_data": [{"content": full_response, "source": "LLM Knowledge"}],
-        "final_report": full_response,
-        "token_usage": state.get("token_usage", 0) + tokens_used
-    }
+    full_response = ""
+    tokens_used = 0
+    messages = _quick_messages(state)
+    async for chunk in _quick_llm(state, messages).astream(messages):
+        token = chunk.content
+        full_response += token
+        tokens_used += usage_from(chunk)
+        if buffer:
+            buffer.add_chunk(token)
+    
+    if buffer:
+        buffer.mark_complete()
+    
+    return _quick_result(state, full_response, tokens_used)
 
-def deep_mode_orchestrator(state: AgentState):
-    """
-    Deep mode executor: Orchestrator -> Agent Research
-    Performs search and evidence gathering.
-    """
+def _search_query(state: AgentState) -> str:
+    # Build context-aware query from history
     query = state["query"]
-    iteration = state.get("iterations", 0)
-    gaps = state.get("gaps", [])
     history = state.get("history", [])
-    
-    # Build context-aware query from history
-    search_query = query
     if history:
         # Get last user message for context
         last_messages = [msg['content'] for msg in history[-2:] if msg['role'] == 'user']
         if last_messages:
-            context_hint = " (in context of: " + ", ".join(last_messages) + ")"
-            search_query = query + context_hint
+            return query + " (in context of: " + ", ".join(last_messages) + ")"
+    return query
+
+def _sub_queries(state: AgentState) -> list:
+    query = state["query"]
+    iteration = state.get("iterations", 0)
+    gaps = state.get("gaps", [])
+    search_query = _search_query(state)
     
-    # If we have gaps, refine the search query
-    if gaps:
-        search_query = f"{search_query} focusing on {', '.join(gaps)}"
+    # Each open gap becomes its own sub-query; the base query is searched
+    # on the first pass (or when the analysis reported no gaps)
+    sub_queries = []
+    if iteration == 0 or not gaps:
+        sub_queries.append(search_query)
+    sub_queries += [f"{query} {gap}" for gap in gaps]
+    sub_queries = list(dict.fromkeys(sub_queries))[:Config.MAX_SEARCH_SUBQUERIES]
         
-    print(f"DEBUG: Executing Search for: {search_query} (Iter: {iteration})")
-    
-    try:
-        if isinstance(search_tool, TavilySearchResults):
-            # Tavily returns list of dicts
-            results = search_tool.invoke({"query": search_query})
-            # Format Tavily results to extract content
-            if isinstance(results, list):
-                formatted_content = []
-                for r in results:
-                    if isinstance(r, dict):
-                        title = r.get('title', r.get('url', 'Untitled'))
-                        content_text = r.get('content', r.get('snippet', ''))
-                        url = r.get('url', '')
-                        formatted_content.append(f"**{title}**\n{content_text}\nSource: {url}\n")
-                content = "\n---\n".join(formatted_content) if formatted_content else str(results)
-            else:
-                content = str(results)
-        else:
-            # Custom duckduckgo returns formatted string via custom invoke
-            content = search_tool.invoke(search_query)
+    print(f"DEBUG: Executing {len(sub_queries)} searches (Iter: {iteration}): {sub_queries}")
+    return sub_queries
+
+def _deep_result(state: AgentState, outcomes: list) -> dict:
+    new_data = []
+    errors = []
+    for outcome in outcomes:
+        if outcome["error"]:
+            errors.append(f"{outcome['provider']}: {outcome['error']}")
+            continue
+        for hit in outcome["hits"]:
+            # Title and url are kept as fields; the evidence packer adds them as a header
+            new_data.append({
+                "content": hit["content"],
+                "source": "Web Search",
+                "url": hit["url"],
+                "title": hit["title"],
+                "provider": outcome["provider"],
+                "query": outcome["query"],
+            })
 
-    except Exception as e:
-        content = f"Search failed: {e}"
+    # Drop results already gathered in earlier iterations (same URL, same or near-same text)
+    found = len(new_data)
+    index = DedupIndex.from_state(state.get("dedup_index"))
+    new_data, dedup = index.filter(new_data)
+    dropped = found - len(new_data)
+    if dropped:
+        metrics.increment("dedup.dropped", dropped)
+        metrics.increment("dedup.tokens_saved", dedup["tokens_saved"])
+        print(f"DEBUG: Dedup dropped {dropped} results "
+              f"(url={dedup['url']}, exact={dedup['exact']}, near={dedup['near']}), "
+              f"~{dedup['tokens_saved']} tokens saved")
+
+    if not new_data and not found:
+        new_data.append({"content": f"Search failed: {'; '.join(errors) or 'no results'}", "source": "Web Search"})
 
     return {
-        "research_data": state.get("research_data", []) + [{"content": content, "source": "Web Search"}],
-        "iterations": iteration + 1
+        "research_data": state.get("research_data", []) + new_data,
+        "iterations": state.get("iterations", 0) + 1,
+        "dedup_index": index.to_state(),
+        "dedup_tokens_saved": state.get("dedup_tokens_saved", 0) + dedup["tokens_saved"]
     }
 
-def gap_analysis_node(state: AgentState):
+def deep_mode_orchestrator(state: AgentState):
     """
-    Cross references and Gap analysis.
-    Checks if enough information is gathered.
+    Deep mode executor: Orchestrator -> Agent Research
+    Performs search and evidence gathering.
     """
+    queries = _sub_queries(state)
+    # First round: the planner may already have run this search
+    outcomes = speculative.take(state.get("query_id"), queries)
+    return _deep_result(state, outcomes if outcomes is not None else fan_out_search(queries))
+
+async def adeep_mode_orchestrator(state: AgentState):
+    """Async deep_mode_orchestrator."""
+    queries = _sub_queries(state)
+    outcomes = await speculative.atake(state.get("query_id"), queries)
+    return _deep_result(state, outcomes if outcomes is not None else await afan_out_search(queries))
+
+def _gap_inputs(state: AgentState) -> dict:
     data = state.get("research_data", [])
-    combined_content = "\\n".join([d["content"] for d in data])
     history = state.get("history", [])
     
     # Build history context
+    window = BudgetTracker(state).history_messages(3)
+    history = history[-window:] if window else []
     history_text = ""
     if history:
         history_text = "\nConversation history: " + "; ".join([
-            f"{msg['role']}: {msg['content'][:100]}" for msg in history[-3:]
+            f"{msg['role']}: {msg['content'][:100]}" for msg in history
         ])
+    # Incremental: only evidence gathered since the last analysis is sent,
+    # next to the running summary, so prompt size stays flat across rounds
+    new_data = data[state.get("analyzed_count", 0):]
+    summary = state.get("evidence_summary", "")
+    summary_budget = Config.GAP_SUMMARY_MAX_TOKENS
     
-    prompt = GAP_ANALYSIS_PROMPT
-    
-    chain = prompt | llm
-    response = chain.invoke({
+    # Most relevant new evidence for the query and open gaps, within the node's token budget
+    evidence = pack_evidence(
+        new_data,
+        query=state["query"],
+        gaps=state.get("gaps", []),
+        token_budget=evidence_budget("gap_analysis", output_tokens=Config.GENERATION_PROFILES["gap"]["num_predict"],
+                                     num_ctx=llm_profile("gap")["num_ctx"])
+    )
+    return {
         "query": state["query"] + history_text, 
-        "research_data": combined_content[:5000]  # Context limit
-    })
-    
-    # Track tokens
-    tokens_used = 0
-    if hasattr(response, 'usage_metadata') and response.usage_metadata:
-        tokens_used = response.usage_metadata.get('total_tokens', 0)
+        "summary": summary[:summary_budget * 4] or "None yet.",
+        "covered": ", ".join(state.get("covered", [])) or "None yet.",
+        "research_data": evidence or "No new findings."
+    }
+
+def _gap_messages(state: AgentState) -> list:
+    return GAP_ANALYSIS_PROMPT.format_messages(**_gap_inputs(state))
+
+def _gap_repair_messages(response) -> list:
+    return GAP_ANALYSIS_REPAIR_PROMPT.format_messages(
+        output=response.content[:2000],
+        error="does not match the required schema"
+    )
+
+def _gap_llm(messages: list):
+    # Schema-constrained decoding: Ollama only emits tokens that fit the schema
+    return for_prompt(get_llm("gap"), "gap", messages).bind(format=GAP_ANALYSIS_SCHEMA)
+
+def _gap_result(state: AgentState, analysis, status: str, tokens_used: int) -> dict:
+    metrics.increment(f"gap_analysis.parse.{status}")
     
-    # Simple parsing
-    try:
-        # Looking for "Confidence: 0.X"
-        import re
-        score_match = re.search(r"Confidence:\\s*([0-9.]+)", response.content)
-        score = float(score_match.group(1)) if score_match else 0.5
-        
-        gaps = []
-        if "Gaps:" in response.content:
-            gaps_str = response.content.split("Gaps:")[1].strip()
-            gaps = [g.strip() for g in gaps_str.split(",")]
-            
-    except:
-        score = 0.5
-        gaps = ["Could not parse analysis"]
+    if analysis is None:
+        # Unparseable: keep researching (bounded by MAX_ITERATIONS_DEEP_MODE).
+        # The new evidence stays unanalyzed and is offered again next round.
+        print(f"DEBUG: Gap analysis unparseable (failure rate: {gap_parse_failure_rate():.0%})")
+        return {
+            "confidence_score": 0.0,
+            "gaps": [],
+            "token_usage": tokens_used
+        }
 
     return {
-        "confidence_score": score, 
-        "gaps": gaps,
-        "token_usage": state.get("token_usage", 0) + tokens_used
+        "confidence_score": analysis["confidence_score"], 
+        "gaps": analysis["gaps"],
+        "evidence_summary": analysis["summary"] or state.get("evidence_summary", ""),
+        "covered": list(dict.fromkeys(state.get("covered", []) + analysis["covered"])),
+        "analyzed_count": len(state.get("research_data", [])),
+        "token_usage": tokens_used
     }
 
-def structured_synthesis_node(state: AgentState):
+def gap_analysis_node(state: AgentState):
     """
-    Structure reasoning and synthesis with streaming.
+    Cross references and Gap analysis.
+    Checks if enough information is gathered.
     """
-    query_id = state.get("query_id", "")
-    buffer = get_streaming_buffer(query_id) if query_id else None
+    messages = _gap_messages(state)
+    response = _gap_llm(messages).invoke(messages)
+    tokens_used = usage_from(response)
+    
+    analysis, status = parse_gap_analysis(response.content)
     
+    if analysis is None:
+        # Repair path: ask the model once to fix its own output
+        repair = _gap_repair_messages(response)
+        repaired = _gap_llm(repair).invoke(repair)
+        tokens_used += usage_from(repaired)
+        analysis, status = parse_gap_analysis(repaired.content)
+        if analysis is not None:
+            status = "llm_repaired"
+    
+    return _gap_result(state, analysis, status, tokens_used)
+
+async def agap_analysis_node(state: AgentState):
+    """Async gap_analysis_node."""
+    messages = _gap_messages(state)
+    response = await _gap_llm(messages).ainvoke(messages)
+    tokens_used = usage_from(response)
+    
+    analysis, status = parse_gap_analysis(response.content)
+    
+    if analysis is None:
+        repair = _gap_repair_messages(response)
+        repaired = await _gap_llm(repair).ainvoke(repair)
+        tokens_used += usage_from(repaired)
+        analysis, status = parse_gap_analysis(repaired.content)
+        if analysis is not None:
+            status = "llm_repaired"
+    
+    return _gap_result(state, analysis, status, tokens_used)
+
+def gap_parse_failure_rate() -> float:
+    """Share of gap analyses whose output could not be parsed, even after repair."""
+    return metrics.ratio(
+        "gap_analysis.parse.failed",
+        "gap_analysis.parse.ok",
+        "gap_analysis.parse.repaired",
+        "gap_analysis.parse.llm_repaired",
+        "gap_analysis.parse.failed",
+    )
+
+def _synthesis_inputs(state: AgentState) -> tuple:
     data = state.get("research_data", [])
-    combined_content = "\\n".join([d["content"] for d in data])
     history = state.get("history", [])
     
     # Build conversation context
+    window = BudgetTracker(state).history_messages(4)
+    history = history[-window:] if window else []
     history_context = ""
     if history:
-        history_context = "\\n\\nConversation context:\\n" + "\\n".join([
-            f"{msg['role'].capitalize()}: {msg['content']}" for msg in history[-4:]
-        ]) + "\\n"
+        history_context = "\n\nConversation context:\n" + "\n".join([
+            f"{msg['role'].capitalize()}: {msg['content']}" for msg in history
+        ]) + "\n"
+    
+    query_with_context = state["query"] + history_context
+    # Evidence and report length are sized from what the budget has left after the prompt itself
+    overhead = prompt_tokens(RESEARCH_SYNTHESIS_PROMPT.format_messages(query=query_with_context, context=""))
+    evidence_tokens, output_tokens = BudgetTracker(state).synthesis_allowance(overhead)
+    evidence = pack_evidence(
+        data,
+        query=state["query"],
+        token_budget=min(evidence_tokens, evidence_budget("synthesis", output_tokens=output_tokens,
+                                                          num_ctx=llm_profile("synthesize")["num_ctx"]))
+    )
+    return {"query": query_with_context, "context": evidence}, output_tokens
+
+def _synthesis_messages(state: AgentState):
+    inputs, max_tokens = _synthesis_inputs(state)
+    return RESEARCH_SYNTHESIS_PROMPT.format_messages(**inputs), max_tokens
+
+def _synthesis_llm(messages: list, max_tokens: int):
+    return for_prompt(get_llm("synthesize"), "synthesize", messages, max_tokens)
+
+def _synthesis_result(state: AgentState, full_response: str, tokens_used: int) -> dict:
+    cleaned_report = full_response.replace("```markdown", "").replace("```", "").strip()
     
-    prompt = RESEARCH_SYNTHESIS_PROMPT
+    return {
+        "final_report": cleaned_report,
+        "token_usage": tokens_used
+    }
+
+def structured_synthesis_node(state: AgentState):
+    """
+    Structure reasoning and synthesis with streaming.
+    """
+    query_id = state.get("query_id", "")
+    buffer = get_streaming_buffer(query_id) if query_id else None
     
     full_response = ""
     tokens_used = 0
     
     # Stream the synthesis with conversation context
-    chain = prompt | llm
-    query_with_context = state["query"] + history_context
+    messages, max_tokens = _synthesis_messages(state)
     
-    for chunk in chain.stream({"query": query_with_context, "context": combined_content[:8000]}):
+    for chunk in _synthesis_llm(messages, max_tokens).stream(messages):
         token = chunk.content
         full_response += token
+        tokens_used += usage_from(chunk)  # Final chunk carries Ollama's counts
         
         # Add to streaming buffer
         if buffer:
@@ -254,10 +434,25 @@ def structured_synthesis_node(state: AgentState):
     if buffer:
         buffer.mark_complete()
     
-    cleaned_report = full_response.replace("```markdown", "").replace("```", "").strip()
-    tokens_used = len(cleaned_report.split()) * 2  # Estimate
+    return _synthesis_result(state, full_response, tokens_used)
+
+async def astructured_synthesis_node(state: AgentState):
+    """Async structured_synthesis_node."""
+    query_id = state.get("query_id", "")
+    buffer = get_streaming_buffer(query_id) if query_id else None
     
-    return {
-        "final_report": cleaned_report,
-        "token_usage": state.get("token_usage", 0) + tokens_used
-    }
\ No newline at end of file
+    full_response = ""
+    tokens_used = 0
+    messages, max_tokens = _synthesis_messages(state)
+    
+    async for chunk in _synthesis_llm(messages, max_tokens).astream(messages):
+        token = chunk.content
+        full_response += token
+        tokens_used += usage_from(chunk)
+        if buffer:
+            buffer.add_chunk(token)
+    
+    if buffer:
+        buffer.mark_complete()
+    
+    return _synthesis_result(state, full_response, tokens_used)
@@ -1,14 +1,12 @@
 from state import AgentState
-from memory import memory
 import os
+import asyncio
 from datetime import datetime
 from config import Config
 from prompts.report_templates import OUTPUT_WRAPPER
+from utils.persistence import get_persistence_worker
 
-def format_output(state: AgentState):
-    """
-    Formatting final output.
-    """
+def _format_report(state: AgentState) -> str:
     report = state.get("final_report", "No report generated.")
     sources = [d.get("source") for d in state.get("research_data", [])]
     
@@ -19,21 +17,86 @@ def format_output(state: AgentState):
         mode=state.get("mode", "unknown"),
         token_usage=state.get("token_usage", 0)
     )
-   
-    # Save interaction to memory
-    memory.add_memory(
-        text=f"Query: {state['query']}\nResponse: {report}",
-        metadata={"confidence": state.get("confidence_score", 0.0)}
-    )
+    return formatted
+
+def _report_path() -> str:
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return os.path.join(Config.OUTPUT_DIR, f"research_report_{timestamp}.md")
+
+def _cacheable(state: AgentState) -> bool:
+    # Answers to follow-ups depend on the conversation, which the cache key does not hold
+    if state.get("history"):
+        return False
+    # A deep run that hit MAX_ITERATIONS_DEEP_MODE below the confidence threshold
+    # would be served to near-duplicate queries for days; let them research again
+    if state.get("mode") == "deep":
+        return state.get("confidence_score", 0.0) >= Config.CONFIDENCE_THRESHOLD
+    return True
+
+def _persist(state: AgentState, report: str, formatted: str, filepath: str) -> list:
+    """
+    Queue the memory upsert, answer-cache entry and report file on the
+    write-behind worker. Returns tickets the caller can wait on.
+    """
+    worker = get_persistence_worker()
+    tickets = [worker.submit("memory", {
+        "text": f"Query: {state['query']}\nResponse: {report}",
+        # report_path lets compaction shorten the stored text but keep a pointer
+        "metadata": {
+            "confidence": state.get("confidence_score", 0.0),
+            "report_path": filepath,
+            "thread_id": state.get("thread_id"),
+            "intent": state.get("intent"),
+        },
+    })]
+    
+    # Save to the semantic answer cache
+    if Config.ANSWER_CACHE_ENABLED and state.get("final_report") and _cacheable(state):
+        tickets.append(worker.submit("answer", {
+            "query": state["query"],
+            "report": report,
+            "intent": state.get("intent", "Research"),
+            "confidence": state.get("confidence_score", 0.0),
+        }))
+    
+    tickets.append(worker.submit("file", {"path": filepath, "content": formatted}))
+    return tickets
+
+def _wait_durable(tickets: list):
+    for ticket in tickets:
+        ticket.wait()
+
+def format_output(state: AgentState):
+    """
+    Formatting final output. Persistence is write-behind unless the caller
+    sets wait_for_persistence.
+    """
+    report = state.get("final_report", "No report generated.")
+    formatted = _format_report(state)
+    
+    # Cached answers were already persisted when first generated
+    if state.get("cache_hit"):
+        return {"final_report": formatted}
+    
+    filepath = _report_path()
+    tickets = _persist(state, report, formatted, filepath)
+    if state.get("wait_for_persistence"):
+        _wait_durable(tickets)
+
+    return {"final_report": formatted, "report_path": filepath}
+
+async def aformat_output(state: AgentState):
+    """Async format_output."""
+    report = state.get("final_report", "No report generated.")
+    formatted = _format_report(state)
     
-    # Save to Markdown file
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"research_report_{timestamp}.md"
-    filepath = os.path.join(Config.OUTPUT_DIR, filename)
+    if state.get("cache_hit"):
+        return {"final_report": formatted}
     
-    with open(filepath, "w") as f:
-        f.write(formatted)
-        
-    print(f"✅ Report saved to: {filepath}")
+    # submit() may block under backpressure, so keep it off the event loop
+    filepath = _report_path()
+    tickets = await asyncio.to_thread(_persist, state, report, formatted, filepath)
+    if state.get("wait_for_persistence"):
+        await asyncio.to_thread(_wait_durable, tickets)
 
-    return {"final_report": formatted}
\ No newline at end of file
+    return {"final_report": formatted, "report_path": filepath}
@@ -1,28 +1,99 @@
-from langchain_ollama import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
 from state import AgentState
 from config import Config
 from memory import memory
+from utils import metrics
+from utils.resources import get_llm
+from utils.generation import for_prompt, stream_until, astream_until
+import re
 import uuid
 
-llm = ChatOllama(model=Config.MODEL_NAME)
-
 def guard_layer(state: AgentState):
     """
     Guard Budget and Token and telemetry.
     Initializes the state if needed.
     """
     return {
-        "token_usage": 0, 
-        "budget_limit": 5000, 
+        "budget_limit": Config.MAX_TOKENS_PER_QUERY, 
         "research_data": [], 
         "gaps": [], 
         "iterations": 0,
+        "evidence_summary": "",
+        "covered": [],
+        "analyzed_count": 0,
+        "dedup_index": {},
+        "dedup_tokens_saved": 0,
         "history": state.get("history", [])
 ,
-        "query_id": str(uuid.uuid4())  # Generate unique ID for streaming
+        # Unique ID for streaming (callers may pre-assign one to attach a reader early)
+        "query_id": state.get("query_id") or str(uuid.uuid4())
+    }
+
+async def aguard_layer(state: AgentState):
+    """Async guard_layer (no I/O, kept for a fully async graph)."""
+    return guard_layer(state)
+
+def _answer_cache_result(hit) -> dict:
+    if not hit:
+        metrics.increment("answer_cache.miss")
+        return {"cache_hit": False}
+    
+    metrics.increment("answer_cache.hit")
+    print(f"DEBUG: Answer cache hit (score {hit['score']:.3f})")
+    return {
+        "cache_hit": True,
+        "final_report": hit["report"],
+        "intent": hit.get("intent", "Research"),
+        "confidence_score": hit.get("confidence", 0.0),
+        "mode": "cached",
+        "research_data": [{"content": hit["report"], "source": "Answer Cache"}]
     }
 
+def _answer_cache_applies(state: AgentState) -> bool:
+    # Cached answers are keyed on the query alone: a follow-up in a conversation
+    # ("and in Go?") means something else in every thread
+    return Config.ANSWER_CACHE_ENABLED and not state.get("history")
+
+def answer_cache_lookup(state: AgentState):
+    """
+    Semantic answer cache.
+    Returns a stored report for a near-duplicate query before any LLM call.
+    """
+    if not _answer_cache_applies(state):
+        return {"cache_hit": False}
+    
+    try:
+        # Intent is only known up front when the caller supplies it
+        hit = memory.lookup_answer(state["query"], intent=state.get("intent"))
+    except Exception as e:
+        print(f"DEBUG: Answer cache lookup failed: {e}")
+        hit = None
+    
+    return _answer_cache_result(hit)
+
+async def aanswer_cache_lookup(state: AgentState):
+    """Async answer_cache_lookup."""
+    if not _answer_cache_applies(state):
+        return {"cache_hit": False}
+    
+    try:
+        hit = await memory.alookup_answer(state["query"], intent=state.get("intent"))
+    except Exception as e:
+        print(f"DEBUG: Answer cache lookup failed: {e}")
+        hit = None
+    
+    return _answer_cache_result(hit)
+
+def _context_filters(state: AgentState) -> dict:
+    """Scope retrieval to the caller's chat thread unless CONTEXT_SCOPE is "all"."""
+    if Config.CONTEXT_SCOPE == "thread" and state.get("thread_id"):
+        return {"thread_id": state["thread_id"]}
+    return {}
+
+def _context_result(context_docs) -> dict:
+    formatted_context = "\n".join(context_docs) if context_docs else "No prior context found."
+    return {"context": [formatted_context]}
+
 def context_retrieval(state: AgentState):
     """
     Memory and context retrieval vector DB.
@@ -30,47 +101,60 @@ def context_retrieval(state: AgentState):
     query = state["query"]
     print(f"DEBUG: Retrieving context for: {query}")
     
-    context_docs = memory.get_context(query)
-    formatted_context = "\n".join(context_docs) if context_docs else "No prior context found."
+    return _context_result(memory.get_context(query, **_context_filters(state)))
+
+async def acontext_retrieval(state: AgentState):
+    """Async context_retrieval."""
+    query = state["query"]
+    print(f"DEBUG: Retrieving context for: {query}")
     
-    return {"context": [formatted_context]}
+    return _context_result(await memory.aget_context(query, **_context_filters(state)))
+
+INTENT_CLASSIFIER_PROMPT = ChatPromptTemplate.from_template(
+    "Classify the following query into one of these categories: "
+    "Research, Bug Fix, Architecture, General Question. "
+    "Also determine if the query is clear (True/False). "
+    "Return the output as 'Category: <category>, Clear: <True/False>'.\n\n"
+    "Query: {query}"
+)
+_CLEAR_RE = re.compile(r"Clear:\s*(True|False)", re.IGNORECASE)
+
+_INTENTS = ("Bug Fix", "Architecture", "General Question", "Research")
+
+def _intent_fields(text: str):
+    """(intent, is_clarified) found in the output so far; None for a field not there yet."""
+    match = _CLEAR_RE.search(text)
+    intent = next((name for name in _INTENTS if name in text), None)
+    return intent, (match.group(1).lower() == "true") if match else None
+
+def _parse_intent(text: str):
+    # Complete once both fields are out
+    fields = _intent_fields(text)
+    return None if None in fields else fields
+
+def _intent_result(state: AgentState, text: str, tokens_used: int) -> dict:
+    # A reply missing a field falls back to a clear Research query
+    intent, is_clarified = _intent_fields(text)
+    return {
+        "intent": intent or "Research", 
+        "is_clarified": is_clarified is not False,
+        "token_usage": tokens_used
+    }
+
+def _intent_messages(state: AgentState) -> list:
+    return INTENT_CLASSIFIER_PROMPT.format_messages(query=state["query"])
 
 def intent_classifier(state: AgentState):
     """
     Intent classifier clarification Orchestrator.
     Determines if the query is clear and what the intent is.
     """
-    prompt = ChatPromptTemplate.from_template(
-        "Classify the following query into one of these categories: "
-        "Research, Bug Fix, Architecture, General Question. "
-        "Also determine if the query is clear (True/False). "
-        "Return the output as 'Category: <category>, Clear: <True/False>'.\n\n"
-        "Query: {query}"
-    )
-    chain = prompt | llm
-    response = chain.invoke({"query": state["query"]})
-    
-    # Track tokens
-    tokens_used = 0
-    if hasattr(response, 'usage_metadata') and response.usage_metadata:
-        tokens_used = response.usage_metadata.get('total_tokens', 0)
-    
-    content = response.content.strip()
-    
-    # Simple parsing (can be made more robust with structured output)
-    intent = "Research"
-    is_clarified = True
-    
-    if "Clear: False" in content:
-        is_clarified = False
-    
-    # Extract intent crudely for now
-    if "Bug Fix" in content: intent = "Bug Fix"
-    elif "Architecture" in content: intent = "Architecture"
-    elif "General Question" in content: intent = "General Question"
-    
-    return {
-        "intent": intent, 
-        "is_clarified": is_clarified,
-        "token_usage": state.get("token_usage", 0) + tokens_used
-    }
\ No newline at end of file
+    messages = _intent_messages(state)
+    _, text, tokens_used = stream_until(for_prompt(get_llm("classify"), "classify", messages), messages, _parse_intent)
+    return _intent_result(state, text, tokens_used)
+
+async def aintent_classifier(state: AgentState):
+    """Async intent_classifier."""
+    messages = _intent_messages(state)
+    _, text, tokens_used = await astream_until(for_prompt(get_llm("classify"), "classify", messages), messages, _parse_intent)
+    return _intent_result(state, text, tokens_used)
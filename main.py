@@ -1,59 +1,91 @@
 # main.py
 import sys
-from langgraph.graph import StateGraph, END
+import threading
 from state import AgentState
+from config import Config
+from utils.budget import BudgetTracker
+from utils.tracing import trace_node, node_duration
+from utils.backends import session_node
+from utils.resources import start_warm_up
 
 # Import node functions
-from graph.nodes_pre import guard_layer, context_retrieval, intent_classifier
-from graph.nodes_exec import (
-    planner_router, 
-    quick_mode_executor, 
-    deep_mode_orchestrator,
-    gap_analysis_node,
-    structured_synthesis_node
-)
-from graph.nodes_post import format_output
+from graph import nodes_pre, nodes_exec, nodes_post
+
+# Graph node name -> (sync implementation, async implementation)
+NODES = {
+    # --- Phase 1: Pre-Processing ---
+    "guard": (nodes_pre.guard_layer, nodes_pre.aguard_layer),
+    "cache": (nodes_pre.answer_cache_lookup, nodes_pre.aanswer_cache_lookup),
+    "context": (nodes_pre.context_retrieval, nodes_pre.acontext_retrieval),
+    "classify": (nodes_pre.intent_classifier, nodes_pre.aintent_classifier),
+    # --- Phase 2: Planning ---
+    "planner": (nodes_exec.planner_router, nodes_exec.aplanner_router),
+    "join": (nodes_exec.join_preprocessing, nodes_exec.ajoin_preprocessing),
+    # --- Phase 3: Execution (Dual Mode) ---
+    "quick_mode": (nodes_exec.quick_mode_executor, nodes_exec.aquick_mode_executor),
+    "deep_research": (nodes_exec.deep_mode_orchestrator, nodes_exec.adeep_mode_orchestrator),
+    "gap_analysis": (nodes_exec.gap_analysis_node, nodes_exec.agap_analysis_node),
+    "synthesize": (nodes_exec.structured_synthesis_node, nodes_exec.astructured_synthesis_node),
+    # --- Phase 4: Output ---
+    "formatter": (nodes_post.format_output, nodes_post.aformat_output),
+}
+
+_agents = {}
+_agents_lock = threading.Lock()
+
+def get_agent(use_async: bool = False):
+    """
+    Compiled graph, built once per process and shared by every session
+    (it holds no per-run state).
+    """
+    with _agents_lock:
+        if use_async not in _agents:
+            _agents[use_async] = _build_workflow(use_async)
+        return _agents[use_async]
 
 def build_agent():
     """Compiles the Phase 1-4 logic into a LangGraph workflow."""
-    workflow = StateGraph(AgentState)
+    return _build_workflow(use_async=False)
 
-    # --- Phase 1: Pre-Processing ---
-    workflow.add_node("guard", guard_layer)
-    workflow.add_node("context", context_retrieval)
-    workflow.add_node("classify", intent_classifier)
+def build_async_agent():
+    """
+    Same graph wired with the async nodes.
+    Drive it with `ainvoke`/`astream` from a single event loop.
+    """
+    return _build_workflow(use_async=True)
 
-    # --- Phase 2: Planning ---
-    workflow.add_node("planner", planner_router)
+def _build_workflow(use_async: bool):
+    # langgraph is imported here so `import main` stays cheap
+    from langgraph.graph import StateGraph, END
 
-    # --- Phase 3: Execution (Dual Mode) ---
-    workflow.add_node("quick_mode", quick_mode_executor)
-    workflow.add_node("deep_research", deep_mode_orchestrator)
-    workflow.add_node("gap_analysis", gap_analysis_node)
-    workflow.add_node("synthesize", structured_synthesis_node)
+    workflow = StateGraph(AgentState)
 
-    # --- Phase 4: Output ---
-    workflow.add_node("formatter", format_output)
+    # Every node runs in a span of the query's trace (see utils/tracing.py), and its
+    # LLM calls stay on the thread's Ollama backend (see utils/backends.py)
+    for name, (sync_node, async_node) in NODES.items():
+        workflow.add_node(name, trace_node(name, session_node(async_node if use_async else sync_node)))
 
     # --- Define Logic Flow (Edges) ---
     workflow.set_entry_point("guard")
-    workflow.add_edge("guard", "context")
-    workflow.add_edge("context", "classify")
+    workflow.add_edge("guard", "cache")
 
-    # Intent Router: If intent is unclear, we end (or ask user). 
-    # If clear, proceed to the Planner.
-    def intent_route(state):
-        if state.get("is_clarified"):
-            return "planner"
-        return END
+    # Answer Cache: a near-duplicate query skips straight to the Formatter.
+    # Otherwise context retrieval, intent classification and planning are
+    # independent, so they run as parallel branches and join before execution.
+    def cache_route(state):
+        return "formatter" if state.get("cache_hit") else ["context", "classify", "planner"]
 
-    workflow.add_conditional_edges("classify", intent_route)
+    workflow.add_conditional_edges("cache", cache_route, ["formatter", "context", "classify", "planner"])
+    workflow.add_edge(["context", "classify", "planner"], "join")
 
-    # Planner Router: Choose between Quick Mode and Deep Mode
+    # Intent Router: If intent is unclear, we end (or ask user).
+    # If clear, take the mode the Planner chose: Quick Mode or Deep Mode.
     def mode_route(state):
+        if not state.get("is_clarified"):
+            return END
         return "quick_mode" if state.get("mode") == "quick" else "deep_research"
 
-    workflow.add_conditional_edges("planner", mode_route)
+    workflow.add_conditional_edges("join", mode_route, ["quick_mode", "deep_research", END])
 
     # Deep Mode Loop: Research -> Analyze -> (Loop or Synthesize)
     workflow.add_edge("deep_research", "gap_analysis")
@@ -61,7 +93,9 @@ def build_agent():
     def gap_route(state):
         confidence = state.get("confidence_score", 0.0)
         iterations = state.get("iterations", 0)
-        if confidence < 0.8 and iterations < 3:
+        if (confidence < Config.CONFIDENCE_THRESHOLD
+                and iterations < Config.MAX_ITERATIONS_DEEP_MODE
+                and BudgetTracker(state).allows_research_round()):
             return "deep_research"
         return "synthesize"
 
@@ -76,9 +110,10 @@ def build_agent():
 
 def main():
     """Main execution loop for the agent."""
-    app = build_agent()
+    # Compile the graph and load the models while the user types the first query
+    threading.Thread(target=get_agent, daemon=True).start()
+    start_warm_up()
     
-    from config import Config
     print(f"\n🚀 Developer Research Agent ({Config.MODEL_NAME}) Initialized.")
     print("Type 'exit' to quit.\n")
     
@@ -99,11 +134,14 @@ def main():
 
             print("\nProcessing...")
             final_report = ""
+            query_id = None
             
             # Stream updates
-            for output in app.stream(initial_state):
+            for output in get_agent().stream(initial_state):
                 for key, value in output.items():
-                    print(f"✅ Completed Node: [{key}]")
+                    query_id = query_id or (value or {}).get("query_id")
+                    duration = node_duration(query_id, key)
+                    print(f"✅ Completed Node: [{key}]" + (f" ({duration:.0f} ms)" if duration is not None else ""))
                     if key == "formatter":
                         final_report = value.get("final_report", "")
 
@@ -1,49 +1,486 @@
-import os
+import asyncio
+import threading
+import time
 import uuid
+from contextlib import nullcontext
 from datetime import datetime
 from config import Config
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
+from utils.resources import get_qdrant_client, get_embedding_service
+from utils import tracing
+from utils.sparse import bm25_document_vector, bm25_query_vector
+
+def compact_text(document: str, max_chars: int, report_path: str = None) -> str:
+    """Cut a stored "Query/Response" blob to max_chars at a sentence boundary, plus a report pointer."""
+    if len(document) > max_chars:
+        cut = document[:max_chars]
+        end = max(cut.rfind(". "), cut.rfind(".\n"))
+        document = (cut[:end + 1] if end > max_chars // 2 else cut.rstrip()) + " ..."
+    if report_path:
+        document += f"\n[Full report: {report_path}]"
+    return document
+
+def _parse_created(timestamp) -> float:
+    """"created" for a memory that only has the older ISO "timestamp" string (unparseable: 0, i.e. oldest)."""
+    try:
+        return datetime.fromisoformat(str(timestamp)).timestamp()
+    except ValueError:
+        return 0.0
 
 class MemoryManager:
-    def __init__(self):
-        # Initialize Qdrant client with local storage
-        self.client = QdrantClient(path=Config.QDRANT_PATH)
+    """
+    The one memory engine: a shared Qdrant client (embedded or server, see
+    get_qdrant_client) and a single FastEmbed model for every collection.
+    Points keep the layout QdrantClient.add used (named vector
+    "fast-<model>", text in payload["document"]), so existing stores load as-is.
+    research_memory also holds a BM25 sparse vector for hybrid search.
+    """
+
+    # Payload fields indexed (server mode) so filtered searches stay fast
+    MEMORY_INDEXES = {"created": "float", "thread_id": "keyword", "intent": "keyword"}
+    ANSWER_INDEXES = {"created": "float", "model": "keyword", "intent": "keyword"}
+
+    def __init__(self, client=None, embedder=None, local: bool = None):
+        self._client = client
+        self._embedder = embedder
+        self._embeddings = None
+        # The embedded store is not thread-safe; the server client is
+        self._local = not Config.QDRANT_URL if local is None else local
+        self._lock = threading.RLock()
         self.collection_name = "research_memory"
-        
-        
+        self.answer_collection = "answer_cache"
+        self.vector_name = "fast-" + Config.EMBEDDING_MODEL.split("/")[-1].lower()
+        self.sparse_name = "bm25"
+        self._collections = {}  # name -> has the sparse vector (hybrid search)
+        self._answers_purged = False
+        self._adds_since_maintenance = 0
+
+    @property
+    def client(self):
+        # Opened on first use (and shared process-wide) so importing memory is cheap
+        return self._client or get_qdrant_client()
+
+    @property
+    def embeddings(self):
+        """Cached, micro-batched embedding service (process-wide unless an embedder was injected)."""
+        if self._embedder is None:
+            return get_embedding_service()
+        if self._embeddings is None:
+            from utils.embeddings import EmbeddingService
+            self._embeddings = EmbeddingService(self._embedder)
+        return self._embeddings
+
+    def _store(self):
+        """Serializes calls into the embedded store; a no-op in server mode."""
+        return self._lock if self._local else nullcontext()
+
+    def _collection_settings(self) -> dict:
+        """HNSW and quantization settings from Config (MEMORY_HNSW, MEMORY_QUANTIZATION)."""
+        from qdrant_client.http import models
+        quantization = None
+        if Config.MEMORY_QUANTIZATION == "scalar":
+            quantization = models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True))
+        elif Config.MEMORY_QUANTIZATION == "binary":
+            quantization = models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+        return {"hnsw_config": models.HnswConfigDiff(**Config.MEMORY_HNSW), "quantization_config": quantization}
+
+    def _search_params(self):
+        if self._local:
+            return None  # The embedded store always searches exactly
+        from qdrant_client.http import models
+        quantization = None
+        if Config.MEMORY_QUANTIZATION:
+            # Search the in-RAM quantized vectors, then rescore the best with full vectors
+            quantization = models.QuantizationSearchParams(rescore=True, oversampling=Config.MEMORY_OVERSAMPLING)
+        return models.SearchParams(hnsw_ef=Config.MEMORY_HNSW_EF, quantization=quantization)
+
+    def _ensure_collection(self, name: str, dim: int) -> bool:
+        """Create the collection if needed; returns whether it supports hybrid search."""
+        if name in self._collections:
+            return self._collections[name]
+        from qdrant_client.http import models
+        if not self.client.collection_exists(name):
+            sparse = None
+            if name == self.collection_name:
+                # Qdrant applies IDF itself; points only carry BM25 term weights
+                sparse = {self.sparse_name: models.SparseVectorParams(modifier=models.Modifier.IDF)}
+            try:
+                self.client.create_collection(
+                    collection_name=name,
+                    vectors_config={self.vector_name: models.VectorParams(
+                        size=dim, distance=models.Distance.COSINE, on_disk=Config.MEMORY_VECTORS_ON_DISK)},
+                    sparse_vectors_config=sparse,
+                    on_disk_payload=True,
+                    **self._collection_settings()
+                )
+                self._create_indexes(name)
+            except Exception:
+                # Another worker may have created it first
+                if not self.client.collection_exists(name):
+                    raise
+        # Collections created before hybrid search have no sparse vector
+        sparse_vectors = self.client.get_collection(name).config.params.sparse_vectors or {}
+        self._collections[name] = self.sparse_name in sparse_vectors
+        return self._collections[name]
+
+    def _create_indexes(self, name: str):
+        if self._local:
+            return  # Payload indexes only exist on a Qdrant server
+        from qdrant_client.http import models
+        indexes = self.MEMORY_INDEXES if name == self.collection_name else self.ANSWER_INDEXES
+        for field, schema in indexes.items():
+            self.client.create_payload_index(name, field, models.PayloadSchemaType(schema))
+
+    def _merge_targets(self, collection: str, vectors: list, payloads: list, threshold: float) -> list:
+        """
+        For each vector, the (id, payload) of an existing near-duplicate point
+        in the same thread, or None.
+        """
+        from qdrant_client.http import models
+        results = self.client.query_batch_points(collection_name=collection, requests=[
+            models.QueryRequest(
+                query=v, using=self.vector_name, limit=1, score_threshold=threshold, with_payload=["merged"],
+                filter=self._memory_filter(thread_id=payload.get("thread_id"))
+            )
+            for v, payload in zip(vectors, payloads)
+        ])
+        return [(r.points[0].id, r.points[0].payload or {}) if r.points else None for r in results]
+
+    def _upsert(self, collection: str, documents: list, payloads: list, merge_threshold: float = None) -> int:
+        """
+        Embed and store documents. With merge_threshold, a document whose
+        nearest stored neighbour is at least that similar overwrites it
+        instead of adding a point. Returns the number merged.
+        """
+        from qdrant_client.http import models
+        vectors = self.embeddings.embed(documents).tolist()
+        with self._store():
+            hybrid = self._ensure_collection(collection, len(vectors[0]))
+            targets = [None] * len(vectors)
+            if merge_threshold:
+                targets = self._merge_targets(collection, vectors, payloads, merge_threshold)
+            points = []
+            for doc, vector, payload, target in zip(documents, vectors, payloads, targets):
+                payload = {"document": doc, **payload}
+                point_id = str(uuid.uuid4())
+                if target:
+                    point_id = target[0]
+                    payload["merged"] = target[1].get("merged", 0) + 1
+                named = {self.vector_name: vector}
+                if hybrid:
+                    indices, values = bm25_document_vector(doc)
+                    named[self.sparse_name] = models.SparseVector(indices=indices, values=values)
+                points.append(models.PointStruct(id=point_id, vector=named, payload=payload))
+            self.client.upsert(collection_name=collection, points=points)
+        return sum(1 for t in targets if t)
+
+    def _search(self, collection: str, query: str, limit: int, query_filter=None, hybrid: bool = False) -> list:
+        """
+        Dense search, or with hybrid=True (and a collection that has the
+        sparse vector) dense + BM25 candidates fused by reciprocal rank.
+        Hybrid scores are RRF ranks, not cosine similarities.
+        """
+        from qdrant_client.http import models
+        vector = self.embeddings.embed_query(query).tolist()
+        with self._store():
+            if not self.client.collection_exists(collection):
+                return []
+            indices, values = bm25_query_vector(query)
+            if hybrid and indices and self._ensure_collection(collection, len(vector)):
+                candidates = max(limit, Config.MEMORY_HYBRID_PREFETCH)
+                return self.client.query_points(
+                    collection_name=collection,
+                    prefetch=[
+                        models.Prefetch(query=vector, using=self.vector_name, filter=query_filter,
+                                        limit=candidates, params=self._search_params()),
+                        models.Prefetch(query=models.SparseVector(indices=indices, values=values),
+                                        using=self.sparse_name, filter=query_filter, limit=candidates),
+                    ],
+                    query=models.FusionQuery(fusion=models.Fusion.RRF),
+                    limit=limit,
+                    with_payload=True
+                ).points
+            return self.client.query_points(
+                collection_name=collection,
+                query=vector,
+                using=self.vector_name,
+                query_filter=query_filter,
+                limit=limit,
+                search_params=self._search_params(),
+                with_payload=True
+            ).points
 
     def add_memory(self, text: str, metadata: dict = None):
         """
         Save a text blob (e.g., report, interaction) to memory.
         """
-        if metadata is None:
-            metadata = {}
-        
-        metadata["timestamp"] = str(datetime.now())
+        self.add_memories([text], [metadata])
+
+    @tracing.traced("memory.add_memories", kind="memory")
+    def add_memories(self, texts: list, metadatas: list = None, merge: bool = True):
+        """
+        Save several text blobs in one call (one embedding pass, one upsert).
+        thread_id and intent in the metadata make them filterable.
+        """
+        metadatas = [dict(m or {}) for m in (metadatas or [None] * len(texts))]
+        now = str(datetime.now())
+        for metadata in metadatas:
+            metadata.setdefault("timestamp", now)
+            metadata.setdefault("created", time.time())
         
-        # Add document (FastEmbed will handle embedding automatically)
-        self.client.add(
-            collection_name=self.collection_name,
-            documents=[text],
-            metadata=[metadata],
-            ids=[str(uuid.uuid4())]
-        )
-        print(f"DEBUG: Saved to memory: {text[:50]}...")
+        threshold = Config.MEMORY_MERGE_THRESHOLD if merge else None
+        merged = self._upsert(self.collection_name, texts, metadatas, merge_threshold=threshold)
+        print(f"DEBUG: Saved {len(texts)} item(s) to memory ({merged} merged): {texts[0][:50]}...")
+        tracing.annotate(points=len(texts), merged=merged, payload_chars=sum(len(t) for t in texts))
+
+        self._adds_since_maintenance += len(texts)
+        if Config.MEMORY_MAINTENANCE_EVERY and self._adds_since_maintenance >= Config.MEMORY_MAINTENANCE_EVERY:
+            self._adds_since_maintenance = 0
+            self.maintain()
+
+    def _memory_filter(self, thread_id: str = None, intent: str = None, since: float = None):
+        from qdrant_client.http import models
+        must = []
+        if thread_id:
+            # Memories saved without a thread (before threads existed, CLI, batch) belong to every thread
+            must.append(models.Filter(should=[
+                models.FieldCondition(key="thread_id", match=models.MatchValue(value=thread_id)),
+                models.IsEmptyCondition(is_empty=models.PayloadField(key="thread_id")),
+            ]))
+        if intent:
+            must.append(models.FieldCondition(key="intent", match=models.MatchValue(value=intent)))
+        if since:
+            must.append(models.FieldCondition(key="created", range=models.Range(gte=since)))
+        return models.Filter(must=must) if must else None
 
-    def get_context(self, query: str, n_results: int = 2):
+    @tracing.traced("memory.get_context", kind="memory")
+    def get_context(self, query: str, n_results: int = 2, thread_id: str = None, intent: str = None, since: float = None):
         """
-        Retrieve relevant context for a query.
+        Retrieve relevant context for a query (hybrid dense + BM25 search),
+        optionally restricted to a thread, an intent and a minimum timestamp.
         """
-        results = self.client.query(
-            collection_name=self.collection_name,
-            query_text=query,
-            limit=n_results
+        results = self._search(
+            self.collection_name, query, n_results,
+            query_filter=self._memory_filter(thread_id, intent, since), hybrid=True
         )
         
         # Extract document content from results
-        documents = [hit.document for hit in results]
+        documents = [hit.payload["document"] for hit in results]
+        tracing.annotate(results=len(documents), payload_chars=sum(len(d) for d in documents))
         return documents
 
+    def _answer_filter(self, intent: str = None, max_age: float = None):
+        """Only answers from the current model, recent enough, and (optionally) same intent."""
+        from qdrant_client.http import models
+        max_age = Config.ANSWER_CACHE_MAX_AGE_SECONDS if max_age is None else max_age
+        must = [
+            models.FieldCondition(key="model", match=models.MatchValue(value=Config.MODEL_NAME)),
+            models.FieldCondition(key="created", range=models.Range(gte=time.time() - max_age)),
+        ]
+        if intent:
+            must.append(models.FieldCondition(key="intent", match=models.MatchValue(value=intent)))
+        return models.Filter(must=must)
+
+    def add_answer(self, query: str, report: str, intent: str, confidence: float = 0.0):
+        """
+        Store a final answer in the semantic answer cache.
+        Only the query is embedded, so lookups compare query to query.
+        """
+        self.add_answers([{"query": query, "report": report, "intent": intent, "confidence": confidence}])
+
+    @tracing.traced("memory.add_answers", kind="memory")
+    def add_answers(self, answers: list):
+        """Batch form of add_answer; each item has query, report, intent, confidence."""
+        tracing.annotate(points=len(answers), payload_chars=sum(len(a["report"]) for a in answers))
+        now = time.time()
+        self._upsert(
+            self.answer_collection,
+            [a["query"] for a in answers],
+            [{
+                "report": a["report"],
+                "intent": a["intent"],
+                "confidence": a.get("confidence", 0.0),
+                "model": Config.MODEL_NAME,
+                "created": now,
+            } for a in answers]
+        )
+
+    @tracing.traced("memory.lookup_answer", kind="memory")
+    def lookup_answer(self, query: str, intent: str = None, threshold: float = None):
+        """
+        Return the stored answer payload for a near-duplicate query, or None.
+        A hit needs cosine similarity >= threshold, the current model name and
+        an age below ANSWER_CACHE_MAX_AGE_SECONDS.
+        """
+        threshold = Config.ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        if not self._answers_purged:
+            self.purge_stale_answers()
+            self._answers_purged = True
+
+        results = self._search(self.answer_collection, query, 1, self._answer_filter(intent))
+        hit = bool(results) and results[0].score >= threshold
+        tracing.annotate(cache_hit=hit, score=results[0].score if results else 0.0)
+        if not hit:
+            return None
+        hit = dict(results[0].payload)
+        hit.pop("document", None)
+        hit["score"] = results[0].score
+        return hit
+
+    def purge_stale_answers(self, max_age: float = None):
+        """Invalidate cached answers that are too old or came from another model."""
+        from qdrant_client.http import models
+        max_age = Config.ANSWER_CACHE_MAX_AGE_SECONDS if max_age is None else max_age
+        with self._store():
+            if not self.client.collection_exists(self.answer_collection):
+                return
+            self.client.delete(
+                collection_name=self.answer_collection,
+                points_selector=models.FilterSelector(filter=models.Filter(should=[
+                    models.Filter(must_not=[
+                        models.FieldCondition(key="model", match=models.MatchValue(value=Config.MODEL_NAME))
+                    ]),
+                    models.FieldCondition(key="created", range=models.Range(lt=time.time() - max_age)),
+                ]))
+            )
+
+    # --- Retention & Compaction ---
+
+    def backfill_created(self) -> int:
+        """
+        Give memories written before the numeric "created" field one, parsed
+        from their "timestamp" string. Retention, compaction and the entry cap
+        filter and order on "created", and Qdrant skips points without the
+        key. Returns the number of points updated.
+        """
+        from qdrant_client.http import models
+        missing = models.Filter(must=[models.IsEmptyCondition(is_empty=models.PayloadField(key="created"))])
+        updated = 0
+        with self._store():
+            if not self.client.collection_exists(self.collection_name):
+                return 0
+            while True:
+                # Updated points stop matching, so every scroll starts from the top
+                points, _ = self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=missing,
+                    limit=256,
+                    with_payload=["timestamp"]
+                )
+                if not points:
+                    break
+                # One request per page, not per point
+                self.client.batch_update_points(
+                    collection_name=self.collection_name,
+                    update_operations=[models.SetPayloadOperation(set_payload=models.SetPayload(
+                        payload={"created": _parse_created(point.payload.get("timestamp"))}, points=[point.id]
+                    )) for point in points]
+                )
+                updated += len(points)
+        return updated
+
+    def enforce_retention(self, max_age_days: float = None, max_entries: int = None) -> int:
+        """
+        Delete memories older than max_age_days, then the oldest ones beyond
+        max_entries. Defaults come from Config; returns the number deleted.
+        """
+        from qdrant_client.http import models
+        max_age_days = Config.MEMORY_RETENTION_DAYS if max_age_days is None else max_age_days
+        max_entries = Config.MEMORY_MAX_ENTRIES if max_entries is None else max_entries
+        with self._store():
+            if not self.client.collection_exists(self.collection_name):
+                return 0
+            before = self.client.count(self.collection_name, exact=True).count
+            if max_age_days:
+                cutoff = time.time() - max_age_days * 86400
+                self.client.delete(
+                    collection_name=self.collection_name,
+                    points_selector=models.FilterSelector(filter=models.Filter(must=[
+                        models.FieldCondition(key="created", range=models.Range(lt=cutoff))
+                    ]))
+                )
+            excess = self.client.count(self.collection_name, exact=True).count - max_entries if max_entries else 0
+            while excess > 0:
+                oldest, _ = self.client.scroll(
+                    collection_name=self.collection_name,
+                    limit=min(excess, 1000),
+                    order_by=models.OrderBy(key="created", direction=models.Direction.ASC),
+                    with_payload=False
+                )
+                if not oldest:
+                    break
+                self.client.delete(self.collection_name, points_selector=models.PointIdsList(points=[p.id for p in oldest]))
+                excess -= len(oldest)
+            return before - self.client.count(self.collection_name, exact=True).count
+
+    def compact_memories(self, older_than_days: float = None, max_chars: int = None) -> int:
+        """
+        Replace the stored text of old, long memories with a short summary and
+        a pointer to the report file. The vector, embedded from the full text,
+        is kept, so retrieval quality is unchanged. Returns the number compacted.
+        """
+        from qdrant_client.http import models
+        older_than_days = Config.MEMORY_COMPACT_AFTER_DAYS if older_than_days is None else older_than_days
+        max_chars = Config.MEMORY_COMPACT_MAX_CHARS if max_chars is None else max_chars
+        candidates = models.Filter(
+            must=[models.FieldCondition(key="created", range=models.Range(lt=time.time() - older_than_days * 86400))],
+            must_not=[models.FieldCondition(key="compacted", match=models.MatchValue(value=True))]
+        )
+        compacted = 0
+        with self._store():
+            if not self.client.collection_exists(self.collection_name):
+                return 0
+            offset = None
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=candidates,
+                    limit=256,
+                    offset=offset,
+                    with_payload=["document", "report_path"]
+                )
+                updates = [models.SetPayloadOperation(set_payload=models.SetPayload(
+                    payload={"document": compact_text(point.payload["document"], max_chars, point.payload.get("report_path")),
+                             "compacted": True},
+                    points=[point.id]
+                )) for point in points if len(point.payload.get("document", "")) > max_chars]
+                if updates:
+                    self.client.batch_update_points(collection_name=self.collection_name, update_operations=updates)
+                    compacted += len(updates)
+                if offset is None:
+                    break
+        return compacted
+
+    def maintain(self) -> dict:
+        """Apply collection settings, the "created" backfill, retention and compaction to research_memory."""
+        with self._store():
+            if not self.client.collection_exists(self.collection_name):
+                return {"deleted": 0, "compacted": 0}
+            # Existing collections pick up changed HNSW/quantization settings
+            self.client.update_collection(self.collection_name, **self._collection_settings())
+            self._create_indexes(self.collection_name)
+        stats = {"backfilled": self.backfill_created()}
+        stats.update(deleted=self.enforce_retention(), compacted=self.compact_memories())
+        print(f"DEBUG: Memory maintenance: {stats}")
+        return stats
+
+    # --- Async API ---
+    # The embedded store is synchronous and holds an exclusive lock on
+    # QDRANT_PATH, so a second AsyncQdrantClient cannot open it. These run the
+    # sync calls (pooled in server mode) on worker threads instead of
+    # blocking the loop.
+
+    async def aadd_memory(self, text: str, metadata: dict = None):
+        return await asyncio.to_thread(self.add_memory, text, metadata)
+
+    async def aget_context(self, query: str, n_results: int = 2, thread_id: str = None, intent: str = None, since: float = None):
+        return await asyncio.to_thread(self.get_context, query, n_results, thread_id, intent, since)
+
+    async def aadd_answer(self, query: str, report: str, intent: str, confidence: float = 0.0):
+        return await asyncio.to_thread(self.add_answer, query, report, intent, confidence)
+
+    async def alookup_answer(self, query: str, intent: str = None, threshold: float = None):
+        return await asyncio.to_thread(self.lookup_answer, query, intent, threshold)
+
 # Singleton instance
 memory = MemoryManager()
@@ -2,17 +2,51 @@
 from langchain_core.prompts import ChatPromptTemplate
 
 # Step 1: Gap Analysis (Deep Mode Loop)
+# Incremental: each round sees the running summary plus only the new evidence
 GAP_ANALYSIS_PROMPT = ChatPromptTemplate.from_template("""
-You are a technical analyst evaluating research progress.
-Current Research Findings:
+You are a technical analyst evaluating research progress on the query: "{query}"
+
+Summary of findings so far:
+{summary}
+
+Aspects already covered: {covered}
+
+New Research Findings (not yet analyzed):
 {research_data}
 
 Task:
-1. Identify missing technical details required to answer the query: "{query}"
-2. Detect any contradictions between different data sources.
-3. Assign a Confidence Score (0.0 to 1.0) based on source agreement and detail depth.
+1. Update the summary so it also reflects the new findings (at most 150 words, keep concrete facts and numbers).
+2. List the aspects of the query that are now covered.
+3. Identify missing technical details required to answer the query.
+4. Detect any contradictions between different data sources.
+5. Assign a Confidence Score (0.0 to 1.0) over ALL findings (summary and new) based on source agreement and detail depth.
+
+Respond with ONLY a JSON object with keys: "summary" (string), "covered" (list of strings), "gaps" (list of short search phrases), "contradictions" (list of strings), "confidence_score" (float between 0.0 and 1.0).
+""")
+
+# JSON schema passed to Ollama's `format` option so decoding is constrained
+GAP_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "covered": {"type": "array", "items": {"type": "string"}},
+        "gaps": {"type": "array", "items": {"type": "string"}},
+        "contradictions": {"type": "array", "items": {"type": "string"}},
+        "confidence_score": {"type": "number", "minimum": 0, "maximum": 1},
+    },
+    "required": ["summary", "covered", "gaps", "contradictions", "confidence_score"],
+}
+
+# Repair pass for gap analysis output that failed validation
+GAP_ANALYSIS_REPAIR_PROMPT = ChatPromptTemplate.from_template("""
+The following text was supposed to be a JSON object with keys "summary" (string), "covered" (list of strings), "gaps" (list of strings), "contradictions" (list of strings) and "confidence_score" (float between 0.0 and 1.0), but it is invalid.
+
+Text:
+{output}
+
+Error: {error}
 
-Format your response as a JSON object with keys: "gaps" (list), "contradictions" (list), "confidence_score" (float).
+Return ONLY the corrected JSON object.
 """)
 
 # Step 2: Synthesis (The "Writer")
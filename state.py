@@ -1,5 +1,6 @@
 # state.py
-from typing import TypedDict, List
+import operator
+from typing import Annotated, TypedDict, List, get_type_hints
 
 class AgentState(TypedDict):
     query: str
@@ -11,9 +12,32 @@ class AgentState(TypedDict):
     confidence_score: float
     research_data: list
     final_report: str
-    token_usage: int
+    token_usage: Annotated[int, operator.add]  # Nodes return the tokens they used; parallel branches add up
     budget_limit: int
     gaps: list
     iterations: int
+    evidence_summary: str  # Running summary maintained by gap analysis
+    covered: list  # Aspects of the query the evidence already answers
+    analyzed_count: int  # research_data entries already folded into the summary
+    dedup_index: dict  # Seen URLs / content hashes / SimHashes across iterations
+    dedup_tokens_saved: int  # Estimated prompt tokens avoided by dropping duplicates
     streaming_chunk: str  # For real-time token streaming
-    query_id: str  # Unique ID for streaming buffer
\ No newline at end of file
+    query_id: str  # Unique ID for streaming buffer
+    thread_id: str  # Chat thread; scopes memory retrieval
+    cache_hit: bool  # Answered from the semantic answer cache.
+    report_path: str  # Markdown report location (written behind the response)
+    wait_for_persistence: bool  # Block formatter until memory and report are durable
+
+
+# Keys whose updates are merged (not overwritten), by their Annotated reducer
+REDUCERS = {
+    key: hint.__metadata__[0]
+    for key, hint in get_type_hints(AgentState, include_extras=True).items()
+    if hasattr(hint, "__metadata__")
+}
+
+def apply_update(state: dict, update: dict) -> dict:
+    """Fold one streamed node update into an accumulated state, as the graph does."""
+    for key, value in (update or {}).items():
+        state[key] = REDUCERS[key](state[key], value) if key in REDUCERS and key in state else value
+    return state
@@ -0,0 +1,82 @@
+import asyncio
+import tempfile
+import threading
+import uuid
+
+from benchmarks.agent_benchmark import install_fakes
+from benchmarks.fakes import FakeSearch, FakeStreamingChatModel
+from tools import search_tools
+from utils.persistence import flush_persistence
+from utils.search_cache import SearchCache
+
+
+def _ainvoke(queries):
+    import main
+    model = FakeStreamingChatModel(first_token_latency=0, tokens_per_second=5000, answer_tokens=30)
+    with tempfile.TemporaryDirectory() as output_dir:
+        restore = install_fakes(model, FakeSearch(latency=0.01), output_dir)
+        try:
+            agent = main.build_async_agent()
+
+            async def run_all():
+                return await asyncio.gather(*(
+                    agent.ainvoke({"query": q, "history": [], "query_id": str(uuid.uuid4())}) for q in queries
+                ))
+            results = asyncio.run(run_all())
+            flush_persistence()  # Write-behind writes must land before the fakes go
+            return results
+        finally:
+            restore()
+
+
+def test_async_graph_runs_quick_and_deep_concurrently():
+    quick, deep = _ainvoke(["How do I reverse a list in Python?", "Compare Kafka vs RabbitMQ for event sourcing"])
+
+    assert quick["mode"] == "quick" and "# Final Response" in quick["final_report"]
+    assert deep["mode"] == "deep" and deep["iterations"] == 2  # Fake gap analysis is confident on round two
+    assert deep["confidence_score"] >= 0.8 and "Web Search" in deep["final_report"]
+    assert quick["token_usage"] > 0 and deep["token_usage"] > quick["token_usage"]
+
+
+class Provider:
+    name = "stub"
+
+    async def asearch(self, query, max_results=3):
+        return [{"title": query, "url": f"https://example.com/{query}", "content": query}]
+
+
+class ThreadRecordingCache(SearchCache):
+    def __init__(self, path):
+        super().__init__(path, ttl=60, max_entries=10)
+        self.threads = []
+
+    def get(self, *args):
+        self.threads.append(threading.get_ident())
+        return super().get(*args)
+
+    def put(self, *args):
+        self.threads.append(threading.get_ident())
+        return super().put(*args)
+
+
+def test_search_cache_stays_off_the_event_loop(monkeypatch, tmp_path):
+    cache = ThreadRecordingCache(str(tmp_path / "search_cache.db"))
+    monkeypatch.setattr(search_tools, "get_search_cache", lambda: cache)
+
+    async def search_twice():
+        first = await search_tools.afan_out_search(["kafka"], providers=[Provider()])
+        second = await search_tools.afan_out_search(["kafka"], providers=[Provider()])
+        return first, second, threading.get_ident()
+
+    first, second, loop_thread = asyncio.run(search_twice())
+    assert first[0]["hits"] == second[0]["hits"] and cache.hits == 1
+    assert len(cache.threads) == 3 and loop_thread not in cache.threads  # get, put, get
+
+
+if __name__ == "__main__":
+    import pytest
+    test_async_graph_runs_quick_and_deep_concurrently()
+    with pytest.MonkeyPatch.context() as mp, tempfile.TemporaryDirectory() as tmp:
+        import pathlib
+        test_search_cache_stays_off_the_event_loop(mp, pathlib.Path(tmp))
+    print("✅ SUCCESS: The async graph answers quick and deep queries without blocking its loop.")
@@ -0,0 +1,130 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from config import Config
+from utils import metrics
+from utils.backends import BackendPool, get_pool, session_node
+from utils.resources import get_llm, warm_up_models
+
+
+def stub_ollama(installed, loaded):
+    """Ollama stand-in on a free port: /api/tags, /api/ps and a one-line /api/chat reply naming its port."""
+    chats, generates = [], []
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            names = installed if self.path == "/api/tags" else loaded
+            self._reply({"models": [{"name": name, "model": name} for name in names]})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            (generates if self.path == "/api/generate" else chats).append(body["model"])
+            self._reply({
+                "model": body["model"], "created_at": "2026-01-01T00:00:00Z", "done": True, "done_reason": "stop",
+                "message": {"role": "assistant", "content": str(self.server.server_port)},
+                "prompt_eval_count": 3, "eval_count": 1,
+            })
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.chats, server.generates = chats, generates
+    return server
+
+
+def _closed_port() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    servers = [stub_ollama(["tiny:0.5b", "big:8b"], []), stub_ollama(["tiny:0.5b", "big:8b"], ["big:8b"])]
+    monkeypatch.setattr(Config, "NODE_MODELS", {"plan": {"model": "tiny:0.5b"}, "synthesize": {"model": "big:8b"}})
+    monkeypatch.setattr(BackendPool, "start_health_checks", lambda self: None)  # probes are run by hand here
+
+    def use(urls):
+        monkeypatch.setattr(Config, "OLLAMA_BACKENDS", urls)
+        get_llm.reset()
+        return get_pool()
+
+    yield servers, use
+    get_llm.reset()
+    for server in servers:
+        server.shutdown()
+
+
+def _url(server) -> str:
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def test_routes_to_the_loaded_model_and_sticks_per_thread(backends):
+    (cold, warm), use = backends
+    pool = use([_url(cold), _url(warm)])
+    pool.probe_all()
+
+    # big:8b is only loaded on `warm`: synthesis goes there
+    assert get_llm("synthesize").invoke("report").content == str(warm.server_port)
+    assert pool.snapshot()[1]["in_flight"] == 0  # slot released once the response was read
+
+    # A thread stays on the backend it started on, whatever the load
+    plan = session_node(lambda state: get_llm("plan").invoke("mode?").content)
+    first = plan({"thread_id": "t1"})
+    pool.backends[[_url(cold), _url(warm)].index(f"http://127.0.0.1:{first}")].in_flight += 10
+    assert [plan({"thread_id": "t1"}) for _ in range(3)] == [first] * 3
+
+
+def test_loaded_backend_until_busy_then_least_loaded(monkeypatch):
+    monkeypatch.setattr(Config, "BACKEND_BUSY_IN_FLIGHT", 2)
+    pool = BackendPool(["http://a:11434", "http://b:11434"])
+    # The first call loads the model on a; a keeps it until it is busy, then the idlest backend wins
+    picks = [pool.choose("tiny:0.5b").url for _ in range(5)]
+    assert picks == ["http://a:11434", "http://a:11434", "http://b:11434", "http://b:11434", "http://a:11434"]
+    pool.release(pool.backends[1])
+    assert pool.choose("tiny:0.5b").url == "http://b:11434"
+
+
+def test_fails_over_on_connection_errors(backends):
+    (cold, warm), use = backends
+    dead = _closed_port()
+    pool = use([dead, _url(cold)])
+    metrics.reset("backends.")
+
+    assert get_llm("plan").invoke("mode?").content == str(cold.server_port)
+    assert metrics.get_count("backends.failover") == 1
+    assert pool.snapshot()[0]["healthy"] is False
+    assert get_llm("plan").invoke("again").content == str(cold.server_port)
+    assert metrics.get_count("backends.failover") == 1  # downed backend is skipped, not retried
+    assert cold.chats == ["tiny:0.5b", "tiny:0.5b"]
+
+
+def test_warm_up_loads_every_model_on_every_backend(backends):
+    (cold, warm), use = backends
+    pool = use([_url(cold), _url(warm)])
+
+    warm_up_models()
+
+    assert cold.generates == warm.generates == ["tiny:0.5b", "big:8b"]
+    assert all(snap["loaded"] == ["big:8b", "tiny:0.5b"] for snap in pool.snapshot())
+    assert cold.chats == warm.chats == []
+
+
+if __name__ == "__main__":
+    # The fixture needs pytest's runner
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ SUCCESS: LLM calls are balanced across backends, stick per thread and fail over.")
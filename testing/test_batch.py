@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+from batch import run_batch, completed_ids
+
+
+class FakeAgent:
+    """astream() stand-in that tracks how many runs overlap."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.active = self.peak = 0
+        self.queries = []
+
+    async def astream(self, state):
+        self.queries.append(state["query"])
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if state["query"] in self.fail:
+                raise RuntimeError("model unavailable")
+            yield {"planner": {"mode": "quick", "token_usage": 42}}
+            yield {"formatter": {"final_report": f"Report for {state['query']}"}}
+        finally:
+            self.active -= 1
+
+
+def test_bounded_concurrency_and_records(tmp_path):
+    items = [{"id": str(i), "query": f"q{i}"} for i in range(10)]
+    agent = FakeAgent(fail={"q3"})
+    output = tmp_path / "out.jsonl"
+
+    records = asyncio.run(run_batch(items, str(output), agent=agent, concurrency=3))
+
+    assert agent.peak == 3
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert len(lines) == len(records) == 10
+    ok = {r["id"]: r for r in lines if r["status"] == "ok"}
+    assert ok["1"]["report"] == "Report for q1" and ok["1"]["tokens"] == 42 and ok["1"]["mode"] == "quick"
+    assert [r["error"] for r in lines if r["status"] == "error"] == ["RuntimeError: model unavailable"]
+
+
+def test_resume_skips_completed(tmp_path):
+    items = [{"id": str(i), "query": f"q{i}"} for i in range(4)]
+    output = tmp_path / "out.jsonl"
+    asyncio.run(run_batch(items, str(output), agent=FakeAgent(fail={"q2"}), concurrency=2))
+    with open(output, "a") as f:
+        f.write('{"id": "3", "status": "ok", "rep')  # torn line from a crash
+
+    agent = FakeAgent()
+    asyncio.run(run_batch(items, str(output), agent=agent, concurrency=2))
+    assert agent.queries == ["q2"]  # only the failed query reruns
+    assert completed_ids(str(output)) == {"0", "1", "2", "3"}
+
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_bounded_concurrency_and_records(pathlib.Path(tempfile.mkdtemp()))
+    test_resume_skips_completed(pathlib.Path(tempfile.mkdtemp()))
+    print("✅ SUCCESS: Batch runner bounds concurrency and resumes.")
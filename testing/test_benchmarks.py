@@ -0,0 +1,32 @@
+from benchmarks import agent_benchmark
+
+
+def test_agent_benchmark_reports_both_modes(tmp_path):
+    out = tmp_path / "bench.json"
+    reports = agent_benchmark.main([
+        "--runs", "2", "--concurrency", "2", "--tokens-per-second", "5000",
+        "--first-token-ms", "1", "--search-ms", "1", "--json", str(out),
+    ])
+
+    quick, deep = reports
+    assert quick["observed_modes"] == ["quick"] and "quick_mode" in quick["nodes"]
+    assert deep["observed_modes"] == ["deep"] and deep["nodes"]["gap_analysis"]["calls"] == 4  # two rounds each
+    for report in reports:
+        assert report["end_to_end"]["p50"] > 0 and report["ttft"]["p50"] is not None
+        assert report["throughput_qps"] > 0 and report["peak_memory_mb"] > 0
+    assert out.exists()
+
+
+def test_fakes_are_restored():
+    from graph import nodes_exec
+    original = nodes_exec.get_llm
+    agent_benchmark.main(["--runs", "1", "--mode", "quick", "--tokens-per-second", "5000",
+                          "--first-token-ms", "1", "--search-ms", "1", "--no-tracemalloc"])
+    assert nodes_exec.get_llm is original
+
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_agent_benchmark_reports_both_modes(pathlib.Path(tempfile.mkdtemp()))
+    test_fakes_are_restored()
+    print("✅ SUCCESS: Offline benchmark runs both modes.")
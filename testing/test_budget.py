@@ -0,0 +1,89 @@
+import tempfile
+import uuid
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from benchmarks.agent_benchmark import install_fakes
+from benchmarks.fakes import FakeSearch, FakeStreamingChatModel
+from config import Config
+from utils.persistence import flush_persistence
+from utils.budget import BudgetTracker, usage_from
+
+
+def test_usage_from_ollama_counts():
+    message = AIMessage(content="x", usage_metadata={"input_tokens": 120, "output_tokens": 30, "total_tokens": 150})
+    assert usage_from(message) == 150
+    # Older chunks may lack the total
+    chunk = AIMessageChunk(content="", usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 0})
+    assert usage_from(chunk) == 15
+    assert usage_from(AIMessageChunk(content="token")) == 0
+
+
+def test_output_cap_follows_the_remaining_budget(monkeypatch):
+    monkeypatch.setattr(Config, "BUDGET_MIN_OUTPUT_TOKENS", 128)
+    assert BudgetTracker({"budget_limit": 5000, "token_usage": 1000}).max_output_tokens(1024) == 1024
+    assert BudgetTracker({"budget_limit": 5000, "token_usage": 4500}).max_output_tokens(1024) == 500
+    assert BudgetTracker({"budget_limit": 5000, "token_usage": 4000}).max_output_tokens(1024, 600) == 400
+    assert BudgetTracker({"budget_limit": 5000, "token_usage": 4950}).max_output_tokens(1024) == 128  # floor
+    # Even an exhausted budget leaves room for a usable answer
+    assert BudgetTracker({"budget_limit": 5000, "token_usage": 6200}).max_output_tokens(1024) == 128
+
+
+def test_synthesis_shrinks_with_the_remaining_budget(monkeypatch):
+    monkeypatch.setattr(Config, "EVIDENCE_TOKEN_BUDGET", {"gap_analysis": 1200, "synthesis": 2000})
+    monkeypatch.setattr(Config, "SYNTHESIS_MAX_OUTPUT_TOKENS", 1500)
+    monkeypatch.setattr(Config, "BUDGET_MIN_OUTPUT_TOKENS", 128)
+    assert BudgetTracker({"budget_limit": 5000, "token_usage": 1000}).synthesis_allowance(300) == (2000, 1500)
+    # 1750 left after the prompt: half of each
+    assert BudgetTracker({"budget_limit": 5000, "token_usage": 2950}).synthesis_allowance(300) == (1000, 750)
+    assert BudgetTracker({"budget_limit": 5000, "token_usage": 4800}).synthesis_allowance(300) == (0, 128)
+
+
+def test_research_rounds_and_history(monkeypatch):
+    monkeypatch.setattr(Config, "DEEP_ROUND_TOKEN_ESTIMATE", 1500)
+    monkeypatch.setattr(Config, "PROMPT_OVERHEAD_TOKENS", 400)
+    monkeypatch.setattr(Config, "EVIDENCE_TOKEN_BUDGET", {"gap_analysis": 1200, "synthesis": 2000})
+    monkeypatch.setattr(Config, "BUDGET_MIN_OUTPUT_TOKENS", 128)
+    # A round, then the synthesis prompt with its evidence and a minimal report
+    assert BudgetTracker({"budget_limit": 5000, "token_usage": 972}).allows_research_round()  # 4028 left
+    assert not BudgetTracker({"budget_limit": 5000, "token_usage": 973}).allows_research_round()
+
+    monkeypatch.setattr(Config, "BUDGET_SHRINK_HISTORY_AT", 0.5)
+    monkeypatch.setattr(Config, "BUDGET_DROP_HISTORY_AT", 0.8)
+    assert BudgetTracker({"budget_limit": 5000, "token_usage": 2499}).history_messages(6) == 6
+    assert BudgetTracker({"budget_limit": 5000, "token_usage": 2500}).history_messages(6) == 3
+    assert BudgetTracker({"budget_limit": 5000, "token_usage": 4000}).history_messages(6) == 0
+    # No budget_limit in the state: the configured default applies
+    tracker = BudgetTracker({"token_usage": 100})
+    assert tracker.limit == Config.MAX_TOKENS_PER_QUERY and tracker.remaining == Config.MAX_TOKENS_PER_QUERY - 100
+
+
+
+def test_deep_query_stays_within_the_budget():
+    # Search snippets of ~400 words and a model that would talk far past every cap
+    model = FakeStreamingChatModel(first_token_latency=0, tokens_per_second=100000, answer_tokens=3000)
+    with tempfile.TemporaryDirectory() as output_dir:
+        restore = install_fakes(model, FakeSearch(latency=0, snippet_words=400), output_dir)
+        try:
+            import main
+            result = main.build_agent().invoke({
+                "query": "Compare Kafka vs RabbitMQ for event sourcing", "history": [], "query_id": str(uuid.uuid4()),
+            })
+            flush_persistence()  # Write-behind writes must land before the fakes go
+        finally:
+            restore()
+
+    assert result["mode"] == "deep" and result["iterations"] >= 1
+    assert "Web Search" in result["final_report"]
+    assert 0 < result["token_usage"] <= Config.MAX_TOKENS_PER_QUERY
+
+
+if __name__ == "__main__":
+    import pytest
+    test_usage_from_ollama_counts()
+    with pytest.MonkeyPatch.context() as mp:
+        test_output_cap_follows_the_remaining_budget(mp)
+        test_synthesis_shrinks_with_the_remaining_budget(mp)
+        test_research_rounds_and_history(mp)
+    test_deep_query_stays_within_the_budget()
+    print("✅ SUCCESS: Token budget accounting and limits behave as expected.")
@@ -0,0 +1,37 @@
+from utils.dedup import DedupIndex, normalize_url
+
+KAFKA = ("Apache Kafka is a distributed event streaming platform used by thousands of companies "
+         "for high-performance data pipelines, streaming analytics and data integration.")
+
+
+def test_normalize_url():
+    assert normalize_url("http://www.Example.com/docs/?utm_source=x&b=2&a=1#intro") == "https://example.com/docs?a=1&b=2"
+    assert normalize_url("https://example.com/post?fbclid=abc&gclid=def") == "https://example.com/post"
+    # Content-selecting parameters are kept: two branches are two pages
+    assert normalize_url("https://github.com/org/repo/blob/x.md?ref=main") != \
+        normalize_url("https://github.com/org/repo/blob/x.md?ref=dev")
+
+
+def test_cross_iteration_duplicates():
+    index = DedupIndex()
+    first, _ = index.filter([{"url": "https://kafka.apache.org/", "content": KAFKA}])
+    assert len(first) == 1
+
+    # Index survives a round trip through the graph state
+    index = DedupIndex.from_state(index.to_state())
+    kept, stats = index.filter([
+        {"url": "http://www.kafka.apache.org", "content": "Different text, same page."},
+        {"url": "https://mirror.example/kafka", "content": KAFKA},
+        {"url": "https://blog.example/kafka", "content": KAFKA.replace("thousands", "many")},
+        {"url": "https://rabbitmq.com", "content": "RabbitMQ is a mature message broker with flexible routing."},
+    ])
+
+    assert [k["url"] for k in kept] == ["https://rabbitmq.com"]
+    assert (stats["url"], stats["exact"], stats["near"]) == (1, 1, 1)
+    assert stats["tokens_saved"] > 0
+
+
+if __name__ == "__main__":
+    test_normalize_url()
+    test_cross_iteration_duplicates()
+    print("✅ SUCCESS: Deduplication behaves as expected.")
@@ -0,0 +1,68 @@
+import threading
+
+import numpy as np
+
+from utils.embeddings import EmbeddingCache, EmbeddingService
+
+
+class CountingEmbedder:
+    """Records every model call; vector = [len(text), first char code]."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts):
+        texts = list(texts)
+        self.calls.append(texts)
+        return [np.array([len(t), ord(t[0])], dtype=np.float32) for t in texts]
+
+    query_embed = embed
+
+
+def test_cache_is_lru_and_compact():
+    cache = EmbeddingCache(max_entries=2)
+    a, b, c = (EmbeddingCache.key(t) for t in "abc")
+    cache.put(a, np.ones(4))
+    cache.put(b, np.zeros(4))
+    cache.get(a)  # a is now most recent
+    cache.put(c, np.full(4, 2.0))
+
+    assert cache.get(b) is None
+    assert cache.get(a).tolist() == [1, 1, 1, 1]
+    assert len(cache) == 2 and cache.nbytes == 2 * 4 * 4  # float32 matrix
+
+
+def test_repeated_text_is_embedded_once():
+    model = CountingEmbedder()
+    service = EmbeddingService(model, batch_wait=0)
+
+    first = service.embed(["kafka vs rabbitmq", "kafka vs rabbitmq"])
+    query = service.embed_query("kafka vs rabbitmq")  # symmetric model: same cached vector
+    assert model.calls == [["kafka vs rabbitmq"]]
+    assert np.array_equal(first[0], query)
+
+
+def test_concurrent_requests_share_a_batch():
+    model = CountingEmbedder()
+    service = EmbeddingService(model, batch_wait=0.2)
+    results = {}
+
+    def worker(i):
+        results[i] = service.embed([f"query {i}"])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    assert sum(len(c) for c in model.calls) == 8
+    assert len(model.calls) < 8
+    assert all(results[i][0][0] == len(f"query {i}") for i in range(8))
+
+
+if __name__ == "__main__":
+    test_cache_is_lru_and_compact()
+    test_repeated_text_is_embedded_once()
+    test_concurrent_requests_share_a_batch()
+    print("✅ SUCCESS: Embeddings are cached and micro-batched.")
@@ -0,0 +1,35 @@
+from utils.evidence import pack_evidence, chunk_evidence, estimate_tokens
+
+
+RESEARCH_DATA = [
+    {"content": "Bananas are yellow and rich in potassium. " * 20, "title": "Fruit facts", "url": "https://a.example"},
+    {"content": "Kafka keeps an append-only log, so consumers replay messages in order.", "title": "Kafka log", "url": "https://b.example"},
+    {"content": "RabbitMQ acknowledges and deletes messages once consumed.", "title": "RabbitMQ", "url": "https://c.example"},
+    {"content": "Kafka keeps an append-only log, so consumers replay messages in order.", "title": "Mirror", "url": "https://d.example"},
+]
+
+
+def test_exact_duplicates_dropped():
+    chunks = chunk_evidence(RESEARCH_DATA)
+    assert sum("append-only" in c["text"] for c in chunks) == 1
+
+
+def test_relevant_evidence_fits_budget():
+    packed = pack_evidence(RESEARCH_DATA, query="Kafka vs RabbitMQ message replay", token_budget=60)
+
+    assert estimate_tokens(packed) <= 60
+    assert "[1] Kafka log (https://b.example)" in packed
+    assert "RabbitMQ acknowledges" in packed
+    assert "Bananas" not in packed
+
+
+def test_gaps_steer_selection():
+    packed = pack_evidence(RESEARCH_DATA, query="message brokers", gaps=["potassium"], token_budget=60)
+    assert "potassium" in packed
+
+
+if __name__ == "__main__":
+    test_exact_duplicates_dropped()
+    test_relevant_evidence_fits_budget()
+    test_gaps_steer_selection()
+    print("✅ SUCCESS: Evidence packing behaves as expected.")
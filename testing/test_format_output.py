@@ -0,0 +1,53 @@
+from qdrant_client import QdrantClient
+
+from benchmarks.fakes import HashingEmbedder
+from config import Config
+from graph import nodes_post, nodes_pre
+from memory import MemoryManager
+
+
+class RecordingWorker:
+    def __init__(self):
+        self.kinds = []
+
+    def submit(self, kind, payload):
+        self.kinds.append(kind)
+
+
+def _persisted_kinds(monkeypatch, **state):
+    worker = RecordingWorker()
+    monkeypatch.setattr(nodes_post, "get_persistence_worker", lambda: worker)
+    monkeypatch.setattr(Config, "ANSWER_CACHE_ENABLED", True)
+    nodes_post._persist({"query": "Kafka vs RabbitMQ", "final_report": "report", **state}, "report", "# report", "r.md")
+    return worker.kinds
+
+
+def test_low_confidence_deep_answers_are_not_cached(monkeypatch):
+    assert _persisted_kinds(monkeypatch, mode="deep", confidence_score=0.5) == ["memory", "file"]
+    assert _persisted_kinds(monkeypatch, mode="deep", confidence_score=Config.CONFIDENCE_THRESHOLD) == [
+        "memory", "answer", "file"]
+    assert _persisted_kinds(monkeypatch, mode="quick") == ["memory", "answer", "file"]
+
+
+
+def test_follow_ups_bypass_the_answer_cache(monkeypatch):
+    history = [{"role": "user", "content": "How do I retry failed HTTP calls in Python?"},
+               {"role": "assistant", "content": "Use tenacity with exponential backoff."}]
+    # Context-dependent answers are not stored...
+    assert _persisted_kinds(monkeypatch, mode="quick", history=history) == ["memory", "file"]
+
+    # ...nor served: the same text reads differently in another conversation
+    engine = MemoryManager(client=QdrantClient(location=":memory:"), embedder=HashingEmbedder())
+    engine.add_answer("and how do I do that in Go?", "Go report", "Implementation")
+    monkeypatch.setattr(nodes_pre, "memory", engine)
+    state = {"query": "and how do I do that in Go?"}
+    assert nodes_pre.answer_cache_lookup({**state, "history": []})["cache_hit"] is True
+    assert nodes_pre.answer_cache_lookup({**state, "history": history})["cache_hit"] is False
+
+
+if __name__ == "__main__":
+    import pytest
+    with pytest.MonkeyPatch.context() as mp:
+        test_low_confidence_deep_answers_are_not_cached(mp)
+        test_follow_ups_bypass_the_answer_cache(mp)
+    print("✅ SUCCESS: Only confident, conversation-independent reports use the answer cache.")
@@ -0,0 +1,78 @@
+import asyncio
+
+from benchmarks.fakes import FakeStreamingChatModel
+from config import Config
+from graph import nodes_exec, nodes_pre
+from utils import metrics
+from utils.generation import fit_num_ctx, for_prompt
+
+
+class RecordingModel(FakeStreamingChatModel):
+    """Fake that remembers how many tokens it streamed before the caller stopped it."""
+
+    streamed: list = []
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for chunk in super()._stream(messages, stop, run_manager, **kwargs):
+            self.streamed.append(chunk.message.content)
+            yield chunk
+
+
+def test_routing_calls_stop_once_the_field_is_out(monkeypatch):
+    # The scripted reply keeps talking after the fields the parsers need
+    script = {
+        "Classify the following query": "Category: Bug Fix, Clear: False because the stack trace is missing",
+        "Analyze the query complexity": "deep since it compares two brokers in depth",
+    }
+    model = RecordingModel(first_token_latency=0, tokens_per_second=1000, script=script, streamed=[])
+    monkeypatch.setattr(nodes_pre, "get_llm", lambda node=None: model)
+    monkeypatch.setattr(nodes_exec, "get_llm", lambda node=None: model)
+    metrics.reset("generation.")
+    state = {"query": "Why does my consumer crash?", "history": []}
+
+    intent = nodes_pre.intent_classifier(state)
+    assert intent["intent"] == "Bug Fix" and intent["is_clarified"] is False
+    assert "".join(model.streamed).strip() == "Category: Bug Fix, Clear: False"
+    assert intent["token_usage"] > 0  # Estimated: the final counts never arrive
+
+    model.streamed.clear()
+    assert nodes_exec.planner_router(state)["mode"] == "deep"
+    assert model.streamed == ["deep "]
+    assert asyncio.run(nodes_exec.aplanner_router(state))["mode"] == "deep"
+    assert metrics.get_count("generation.stopped_early") == 3
+
+
+def test_mode_after_a_leading_newline(monkeypatch):
+    # Models often open with a newline or a label before the answer
+    script = {"Analyze the query complexity": "\nMode:\ndeep"}
+    model = FakeStreamingChatModel(first_token_latency=0, tokens_per_second=1000, script=script)
+    monkeypatch.setattr(nodes_exec, "get_llm", lambda node=None: model)
+    state = {"query": "Compare Kafka and RabbitMQ", "history": []}
+    assert nodes_exec.planner_router(state)["mode"] == "deep"
+    assert asyncio.run(nodes_exec.aplanner_router(state))["mode"] == "deep"
+
+
+def test_profiles_cap_output_and_fit_num_ctx():
+    from langchain_core.messages import HumanMessage
+    model = FakeStreamingChatModel(num_ctx=4096)
+
+    plan = for_prompt(model, "plan", [HumanMessage(content="Which mode?")])
+    assert plan.num_predict == Config.GENERATION_PROFILES["plan"]["num_predict"] and plan.stop is None
+    assert plan.num_ctx == 4096  # Fits: keep the loaded context size
+
+    long_prompt = [HumanMessage(content="word " * 20000)]  # ~25k tokens
+    synthesis = for_prompt(model, "synthesize", long_prompt, max_tokens=200)
+    assert synthesis.num_predict == 200 and synthesis.stop is None
+    assert synthesis.num_ctx == 32768
+
+    assert fit_num_ctx(10 ** 6, 4096) == Config.MAX_NUM_CTX
+    assert fit_num_ctx(100, 8192) == 8192
+
+
+if __name__ == "__main__":
+    import pytest
+    with pytest.MonkeyPatch.context() as mp:
+        test_routing_calls_stop_once_the_field_is_out(mp)
+        test_mode_after_a_leading_newline(mp)
+    test_profiles_cap_output_and_fit_num_ctx()
+    print("✅ SUCCESS: Node generation profiles cap output, stop routing calls early and size num_ctx.")
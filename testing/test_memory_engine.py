@@ -0,0 +1,121 @@
+import time
+
+from qdrant_client import QdrantClient
+
+from benchmarks.fakes import HashingEmbedder
+from memory import MemoryManager
+from utils.sparse import bm25_document_vector, bm25_query_vector
+
+
+def _engine():
+    return MemoryManager(client=QdrantClient(location=":memory:"), embedder=HashingEmbedder())
+
+
+def test_memories_round_trip():
+    engine = _engine()
+    assert engine.get_context("anything") == []  # no collection yet
+
+    engine.add_memories(
+        ["Kafka keeps an append-only log", "Bananas are rich in potassium"],
+        [{"source": "a"}, {"source": "b"}],
+    )
+    assert engine.get_context("kafka log", n_results=1) == ["Kafka keeps an append-only log"]
+
+
+def test_answer_cache_lookup():
+    engine = _engine()
+    engine.add_answer("compare kafka and rabbitmq", "REPORT", intent="Research", confidence=0.9)
+
+    hit = engine.lookup_answer("compare kafka and rabbitmq", threshold=0.99)
+    assert hit["report"] == "REPORT" and "document" not in hit
+    assert engine.lookup_answer("compare kafka and rabbitmq", intent="Coding") is None
+    assert engine.lookup_answer("banana bread recipe", threshold=0.5) is None
+
+
+def test_near_duplicates_merge():
+    engine = _engine()
+    engine.add_memory("Query: kafka retention\nResponse: Kafka keeps logs for seven days")
+    engine.add_memory("Query: kafka retention\nResponse: Kafka keeps logs for seven days")
+    assert engine.client.count(engine.collection_name).count == 1
+
+
+def test_retention_by_age_and_count():
+    engine = _engine()
+    now = time.time()
+    engine.add_memories(
+        [f"memory number {i} about topic {i}" for i in range(6)],
+        [{"created": now - 400 * 86400}] + [{"created": now - i} for i in range(5)],
+    )
+    deleted = engine.enforce_retention(max_age_days=365, max_entries=3)
+    assert deleted == 3
+    assert sorted(engine.get_context("memory number topic", n_results=10)) == [
+        "memory number 1 about topic 1", "memory number 2 about topic 2", "memory number 3 about topic 3"]
+
+
+def test_compaction_keeps_pointer():
+    engine = _engine()
+    report = "Query: compare brokers\nResponse: " + "Kafka is a log. " * 100
+    engine.add_memory(report, {"created": time.time() - 30 * 86400, "report_path": "output/r.md"})
+
+    assert engine.compact_memories(older_than_days=14, max_chars=200) == 1
+    [doc] = engine.get_context("compare brokers")
+    assert len(doc) < 300 and doc.endswith("[Full report: output/r.md]")
+    assert engine.compact_memories(older_than_days=14, max_chars=200) == 0
+    assert engine.maintain() == {"backfilled": 0, "deleted": 0, "compacted": 0}
+
+
+def test_old_memories_without_created_age_out():
+    # Memories written before the "created" field only have the timestamp string
+    engine = _engine()
+    engine.add_memories(
+        ["legacy memory about brokers", "legacy memory about garbage", "fresh memory about kafka"],
+        [{"timestamp": "2023-01-05 10:00:00.000001"}, {"timestamp": "not a date"}, {}],
+    )
+    legacy = [p.id for p in engine.client.scroll(engine.collection_name, limit=10, with_payload=True)[0]
+              if p.payload["document"].startswith("legacy")]
+    engine.client.delete_payload(engine.collection_name, keys=["created"], points=legacy)
+
+    batches = []
+    batch_update_points = engine.client.batch_update_points
+    engine.client.batch_update_points = lambda *args, **kwargs: batches.append(1) or batch_update_points(*args, **kwargs)
+    stats = engine.maintain()
+    assert stats["backfilled"] == 2 and stats["deleted"] == 2  # Both now older than MEMORY_RETENTION_DAYS
+    assert len(batches) == 1  # One request for the whole page, not one per point
+    assert engine.get_context("memory", n_results=10) == ["fresh memory about kafka"]
+
+
+def test_bm25_vectors():
+    indices, values = bm25_document_vector("kafka kafka kafka rabbitmq")
+    weights = dict(zip(indices, values))
+    q_indices, _ = bm25_query_vector("kafka")
+    assert weights[q_indices[0]] == max(values)  # saturating, but more occurrences weigh more
+    assert bm25_query_vector("the and for") == ([], [])
+
+
+def test_hybrid_search_filters_by_thread():
+    engine = _engine()
+    engine.add_memories(
+        ["Kafka partitions give ordering per key", "Kafka partitions rebalance on consumer join", "Postgres vacuum reclaims space",
+         "Kafka partitions predate threads", "Kafka partitions saved by the CLI"],
+        [{"thread_id": "t1", "intent": "Research"}, {"thread_id": "t2", "intent": "Research"}, {"thread_id": "t1", "intent": "Bug Fix"},
+         {}, {"thread_id": None}],
+    )
+    in_thread = engine.get_context("kafka partitions", n_results=5, thread_id="t1")
+    assert "Kafka partitions give ordering per key" in in_thread
+    assert "Kafka partitions rebalance on consumer join" not in in_thread
+    # Memories without a thread (older ones, CLI runs) stay visible in every thread
+    assert {"Kafka partitions predate threads", "Kafka partitions saved by the CLI"} <= set(in_thread)
+    assert engine.get_context("kafka partitions", n_results=5, intent="Bug Fix") == ["Postgres vacuum reclaims space"]
+    assert len(engine.get_context("kafka partitions", n_results=5)) == 5
+
+
+if __name__ == "__main__":
+    test_memories_round_trip()
+    test_answer_cache_lookup()
+    test_near_duplicates_merge()
+    test_retention_by_age_and_count()
+    test_compaction_keeps_pointer()
+    test_old_memories_without_created_age_out()
+    test_bm25_vectors()
+    test_hybrid_search_filters_by_thread()
+    print("✅ SUCCESS: Memory engine stores and retrieves through one client and embedder.")
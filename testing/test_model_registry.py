@@ -0,0 +1,67 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from config import Config
+from utils.resources import get_llm, llm_profile, warm_up_models
+
+
+class StubOllama(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+        StubOllama.requests.append((self.path, body))
+        payload = json.dumps({"model": body.get("model"), "response": "", "done": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    StubOllama.requests = []
+    monkeypatch.setattr(Config, "OLLAMA_BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(Config, "NODE_MODELS", {
+        "classify": {"model": "tiny:0.5b", "num_ctx": 1024, "keep_alive": "1h"},
+        "plan": {"model": "tiny:0.5b", "num_ctx": 1024, "keep_alive": "1h"},
+        "synthesize": {"model": "big:8b"},
+    })
+    get_llm.reset()
+    yield
+    get_llm.reset()
+    server.shutdown()
+
+
+def test_nodes_get_their_model_and_share_the_http_client(registry):
+    classify, synthesize = get_llm("classify"), get_llm("synthesize")
+
+    assert (classify.model, classify.num_ctx, classify.keep_alive) == ("tiny:0.5b", 1024, "1h")
+    assert (synthesize.model, synthesize.keep_alive) == ("big:8b", Config.LLM_KEEP_ALIVE)
+    assert synthesize.num_ctx == llm_profile("synthesize")["num_ctx"] == Config.DEFAULT_CONTEXT_WINDOW
+    assert classify._client is synthesize._client and classify._async_client is synthesize._async_client
+    assert get_llm("classify") is classify
+    assert classify.base_url == Config.OLLAMA_BASE_URL
+
+
+def test_warm_up_loads_each_model_once(registry):
+    warm_up_models()
+
+    loaded = [(body["model"], body["keep_alive"], body["options"]["num_ctx"]) for path, body in StubOllama.requests]
+    assert all(path == "/api/generate" for path, _ in StubOllama.requests)
+    assert loaded == [("tiny:0.5b", "1h", 1024), ("big:8b", Config.LLM_KEEP_ALIVE, Config.DEFAULT_CONTEXT_WINDOW)]
+
+
+if __name__ == "__main__":
+    # The fixture needs pytest's runner
+    if pytest.main([__file__, "-q"]) == 0:
+        print("✅ SUCCESS: Node models share one client per backend and warm up once.")
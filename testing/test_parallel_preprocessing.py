@@ -0,0 +1,71 @@
+import asyncio
+import tempfile
+import uuid
+
+from benchmarks.agent_benchmark import install_fakes
+from benchmarks.fakes import FakeSearch, FakeStreamingChatModel
+from config import Config
+from state import apply_update
+from utils import tracing
+from utils.persistence import flush_persistence
+
+
+def _run(query: str, model):
+    import main
+    with tempfile.TemporaryDirectory() as output_dir:
+        restore = install_fakes(model, FakeSearch(latency=0.01), output_dir)
+        try:
+            agent = main._build_workflow(use_async=True)
+            query_id = str(uuid.uuid4())
+            final_state, order = {}, []
+
+            async def consume():
+                async for output in agent.astream({"query": query, "history": [], "query_id": query_id}):
+                    for key, value in output.items():
+                        order.append(key)
+                        apply_update(final_state, value)
+            asyncio.run(consume())
+            flush_persistence()  # Write-behind memory/report writes must land before the fakes go
+            return final_state, order, {s.name: s for s in tracing.get_spans(query_id) if s.kind == "node"}
+        finally:
+            restore()
+
+
+def test_branches_overlap_and_tokens_add_up():
+    model = FakeStreamingChatModel(first_token_latency=0.2, tokens_per_second=5000, answer_tokens=20,
+                                   callbacks=[tracing.LLMTracer()])
+    final_state, order, spans = _run("How do I reverse a list in Python?", model)
+
+    assert set(order[2:5]) == {"context", "classify", "planner"} and order[5] == "join"
+    classify, planner = spans["classify"], spans["planner"]
+    assert classify.start_ns < planner.end_ns and planner.start_ns < classify.end_ns  # ran concurrently
+    # Classifier, planner and quick answer each report their own tokens; the reducer sums them
+    llm_spans = [s for s in tracing.get_spans(final_state["query_id"]) if s.kind == "llm"]
+    assert len(llm_spans) == 3
+    assert final_state["token_usage"] == sum(s.attributes["tokens"] for s in llm_spans)
+    assert final_state["mode"] == "quick" and final_state["final_report"]
+
+
+def test_join_downgrades_deep_mode_without_budget(monkeypatch):
+    monkeypatch.setattr(Config, "MAX_TOKENS_PER_QUERY", 200)
+    model = FakeStreamingChatModel(first_token_latency=0, tokens_per_second=5000, answer_tokens=20)
+    final_state, order, _ = _run("Compare Kafka vs RabbitMQ", model)
+
+    assert "deep_research" not in order
+    assert final_state["mode"] == "quick"
+
+
+def test_apply_update_uses_reducers():
+    state = {}
+    for update in ({"token_usage": 10, "mode": "deep"}, {"token_usage": 5}, {"mode": "quick"}, None):
+        apply_update(state, update)
+    assert state == {"token_usage": 15, "mode": "quick"}
+
+
+if __name__ == "__main__":
+    import pytest
+    test_branches_overlap_and_tokens_add_up()
+    with pytest.MonkeyPatch.context() as mp:
+        test_join_downgrades_deep_mode_without_budget(mp)
+    test_apply_update_uses_reducers()
+    print("✅ SUCCESS: Pre-processing branches run in parallel and join.")
@@ -0,0 +1,82 @@
+import threading
+
+from utils.persistence import PersistenceWorker
+
+
+def test_writes_are_batched_and_flushed():
+    batches = []
+    worker = PersistenceWorker({"memory": batches.append}, batch_size=10, batch_window=0.2)
+
+    tickets = [worker.submit("memory", {"text": f"item {i}"}) for i in range(5)]
+    assert worker.flush(timeout=5)
+    assert all(t.wait(0) for t in tickets)
+    assert sum(len(b) for b in batches) == 5
+    assert len(batches) < 5  # coalesced into fewer calls
+    worker.shutdown(timeout=5)
+
+
+def test_backpressure_writes_inline_when_full():
+    release = threading.Event()
+    written = []
+
+    def slow(batch):
+        release.wait(5)
+        written.extend(batch)
+
+    worker = PersistenceWorker({"file": slow}, maxsize=1, batch_size=1, batch_window=0)
+    worker.submit("file", {"n": 1})  # picked up by the worker, which then blocks
+    worker.submit("file", {"n": 2})  # fills the queue
+    inline = threading.Thread(target=lambda: worker.submit("file", {"n": 3}, timeout=0.01))
+    inline.start()  # queue still full: written inline (blocks on the slow handler)
+    inline.join(0.2)
+    assert inline.is_alive()
+    release.set()
+    inline.join(5)
+    assert worker.flush(timeout=5)
+    assert sorted(p["n"] for p in written) == [1, 2, 3]
+    worker.shutdown(timeout=5)
+
+
+def test_failures_reach_the_ticket():
+    def broken(batch):
+        raise IOError("disk full")
+
+    worker = PersistenceWorker({"file": broken}, batch_window=0)
+    ticket = worker.submit("file", {"path": "x"})
+    assert worker.flush(timeout=5)
+    assert not ticket.wait(0)
+    assert isinstance(ticket.error, IOError)
+    worker.shutdown(timeout=5)
+
+
+def test_one_bad_item_fails_only_its_ticket(tmp_path):
+    from utils.persistence import _write_files
+
+    upserts = []
+
+    def upsert(batch):
+        if any(p["text"] == "bad" for p in batch):
+            raise ValueError("bad payload")
+        upserts.extend(p["text"] for p in batch)
+
+    worker = PersistenceWorker({"memory": upsert, "file": _write_files}, batch_size=10, batch_window=0.2)
+    memories = [worker.submit("memory", {"text": text}) for text in ("a", "bad", "b")]
+    files = [worker.submit("file", {"path": str(path), "content": "report"})
+             for path in (tmp_path / "one.md", tmp_path / "missing" / "two.md", tmp_path / "three.md")]
+    assert worker.flush(timeout=5)
+
+    # The failed upsert batch was retried item by item
+    assert [t.wait(0) for t in memories] == [True, False, True] and sorted(upserts) == ["a", "b"]
+    assert [t.wait(0) for t in files] == [True, False, True]
+    assert isinstance(files[1].error, OSError) and (tmp_path / "three.md").read_text() == "report"
+    worker.shutdown(timeout=5)
+
+
+if __name__ == "__main__":
+    test_writes_are_batched_and_flushed()
+    test_backpressure_writes_inline_when_full()
+    test_failures_reach_the_ticket()
+    import pathlib, tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        test_one_bad_item_fails_only_its_ticket(pathlib.Path(tmp))
+    print("✅ SUCCESS: Write-behind persistence behaves as expected.")
@@ -0,0 +1,67 @@
+import time
+from utils.search_cache import SearchCache, normalize_query
+
+
+def test_normalized_hits():
+    cache = SearchCache(":memory:", ttl=60, max_entries=10)
+    cache.put("duckduckgo", "Kafka vs RabbitMQ?", 3, [{"title": "t", "url": "u", "content": "c"}])
+
+    assert normalize_query("  kafka VS rabbitmq ") == "kafka vs rabbitmq"
+    assert cache.get("duckduckgo", "kafka vs   rabbitmq", 3) == [{"title": "t", "url": "u", "content": "c"}]
+    # Provider and max_results are part of the key
+    assert cache.get("tavily", "kafka vs rabbitmq", 3) is None
+    assert cache.get("duckduckgo", "kafka vs rabbitmq", 5) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_ttl_expiry():
+    cache = SearchCache(":memory:", ttl=0.05, max_entries=10)
+    cache.put("duckduckgo", "q", 3, "result")
+    time.sleep(0.1)
+    assert cache.get("duckduckgo", "q", 3) is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction():
+    cache = SearchCache(":memory:", ttl=60, max_entries=2)
+    cache.put("p", "a", 3, "A")
+    time.sleep(0.01)
+    cache.put("p", "b", 3, "B")
+    time.sleep(0.01)
+    cache.get("p", "a", 3)  # "a" is now more recent than "b"
+    time.sleep(0.01)
+    cache.put("p", "c", 3, "C")
+
+    assert len(cache) == 2
+    assert cache.get("p", "b", 3) is None
+    assert cache.get("p", "a", 3) == "A"
+
+
+def test_fan_out_fills_an_empty_cache(monkeypatch, tmp_path):
+    from tools import search_tools
+
+    class Provider:
+        name = "stub"
+        calls = 0
+
+        def search(self, query, max_results=3):
+            Provider.calls += 1
+            return [{"title": query, "url": "u", "content": query}]
+
+    # An empty cache is falsy (__len__); it must still be read and written
+    cache = SearchCache(str(tmp_path / "search_cache.db"), ttl=60, max_entries=10)
+    monkeypatch.setattr(search_tools, "get_search_cache", lambda: cache)
+    for _ in range(2):
+        search_tools.fan_out_search(["kafka"], providers=[Provider()])
+    assert Provider.calls == 1 and cache.hits == 1
+
+
+if __name__ == "__main__":
+    test_normalized_hits()
+    test_ttl_expiry()
+    test_lru_eviction()
+    import pathlib, tempfile
+    import pytest
+    with pytest.MonkeyPatch.context() as mp, tempfile.TemporaryDirectory() as tmp:
+        test_fan_out_fills_an_empty_cache(mp, pathlib.Path(tmp))
+    print("✅ SUCCESS: Search cache behaves as expected.")
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+from config import Config
+from tools import speculative
+from utils import metrics
+
+
+class CountingSearch:
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.calls = []
+
+    async def __call__(self, queries):
+        self.calls.append(list(queries))
+        await asyncio.sleep(self.latency)
+        return [{"query": q, "provider": "stub", "hits": [], "error": None} for q in queries]
+
+
+def test_matching_take_reuses_the_inflight_search(monkeypatch):
+    monkeypatch.setattr(Config, "SPECULATIVE_SEARCH", True)
+    metrics.reset("speculative.")
+    search = CountingSearch()
+
+    async def run():
+        speculative.astart("q1", ["kafka vs rabbitmq"], search)
+        await asyncio.sleep(0.01)  # planner thinking
+        return await speculative.atake("q1", ["kafka vs rabbitmq"])
+
+    outcomes = asyncio.run(run())
+    assert [o["query"] for o in outcomes] == ["kafka vs rabbitmq"]
+    assert search.calls == [["kafka vs rabbitmq"]]
+    assert metrics.get_count("speculative.hit") == 1 and speculative.pending_count() == 0
+
+
+def test_quick_route_and_mismatch_are_wasted(monkeypatch):
+    monkeypatch.setattr(Config, "SPECULATIVE_SEARCH", True)
+    metrics.reset("speculative.")
+
+    async def run():
+        speculative.astart("q2", ["a"], CountingSearch())
+        speculative.cancel("q2")  # quick mode
+        speculative.astart("q3", ["a"], CountingSearch())
+        return await speculative.atake("q3", ["a (in context of: b)"])
+
+    assert asyncio.run(run()) is None
+    assert metrics.get_count("speculative.wasted") == 2 and speculative.hit_rate() == 0.0
+    assert speculative.pending_count() == 0
+
+
+def test_off_unless_enabled(monkeypatch):
+    monkeypatch.setattr(Config, "SPECULATIVE_SEARCH", False)
+    search = CountingSearch()
+    speculative.start("q4", ["a"], search)
+    assert speculative.pending_count() == 0 and search.calls == []
+
+
+def test_tasks_are_cancelled_on_their_own_loop(monkeypatch):
+    monkeypatch.setattr(Config, "SPECULATIVE_SEARCH", True)
+    loop = asyncio.new_event_loop()
+    loop.set_debug(True)  # Raises on a cancel() from another thread
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    try:
+        async def begin():
+            speculative.astart("q5", ["a"], CountingSearch(latency=10))
+            return speculative._pending["q5"][1]
+        task = asyncio.run_coroutine_threadsafe(begin(), loop).result()
+
+        speculative.cancel("q5")  # From this thread, not the task's
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0), loop).result()
+        assert task.cancelled()
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+
+    # A task whose loop is already closed is dropped without raising
+    closed = asyncio.new_event_loop()
+    task = closed.create_task(asyncio.sleep(0))
+    closed.run_until_complete(task)
+    closed.close()
+    speculative._register("q6", ["a"], task)
+    speculative.cancel("q6")
+    assert speculative.pending_count() == 0
+
+
+def test_graph_uses_it_on_deep_routes_only():
+    from benchmarks import agent_benchmark
+    quick, deep = agent_benchmark.main([
+        "--runs", "2", "--speculative", "--tokens-per-second", "5000", "--first-token-ms", "1",
+        "--search-ms", "20", "--no-tracemalloc",
+    ])
+    assert quick["speculative"] == {"speculative.started": 2, "speculative.wasted": 2}
+    assert deep["speculative"] == {"speculative.started": 2, "speculative.hit": 2}
+
+
+if __name__ == "__main__":
+    import pytest
+    with pytest.MonkeyPatch.context() as mp:
+        test_matching_take_reuses_the_inflight_search(mp)
+        test_quick_route_and_mismatch_are_wasted(mp)
+        test_off_unless_enabled(mp)
+        test_tasks_are_cancelled_on_their_own_loop(mp)
+    test_graph_uses_it_on_deep_routes_only()
+    print("✅ SUCCESS: Speculative search is reused on deep routes and cancelled otherwise.")
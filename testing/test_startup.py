@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous enough for a loaded CI box; the pre-lazy baseline was ~4s
+IMPORT_BUDGET_SECONDS = 2.0
+HEAVY_MODULES = ("qdrant_client", "fastembed", "langchain_ollama", "langgraph", "langchain_community", "duckduckgo_search")
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {modules}
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def _cold_import(modules: str):
+    """Import `modules` in a fresh interpreter; returns (seconds, heavy modules loaded)."""
+    code = _PROBE.format(modules=modules, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    elapsed, loaded = out.stdout.splitlines()[-2:]
+    return float(elapsed), [m for m in loaded.split(",") if m]
+
+
+def test_cold_import_is_cheap():
+    elapsed, loaded = _cold_import("main, memory, tools.search_tools, tools.memory_tools")
+    print(f"Cold import: {elapsed:.2f}s")
+    assert loaded == [], f"imported eagerly: {loaded}"
+    assert elapsed < IMPORT_BUDGET_SECONDS
+
+
+def test_compiled_graph_is_shared():
+    import main
+    assert main.get_agent() is main.get_agent()
+    assert main.get_agent(use_async=True) is not main.get_agent()
+
+
+if __name__ == "__main__":
+    test_cold_import_is_cheap()
+    test_compiled_graph_is_shared()
+    print("✅ SUCCESS: Startup stays lazy.")
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import time
+from config import Config
+from utils import streaming
+from utils.streaming import StreamingBuffer
+
+
+def test_independent_readers():
+    buffer = StreamingBuffer()
+    first = buffer.reader()
+    buffer.add_chunk("Hello")
+    late = buffer.reader(from_start=False)
+    buffer.add_chunk(" world")
+    buffer.mark_complete()
+
+    assert "".join(first) == "Hello world"
+    assert "".join(late) == " world"
+    assert "".join(buffer.get_chunks()) == "Hello world"
+
+
+def test_memory_bound():
+    buffer = StreamingBuffer(max_chars=10)
+    reader = buffer.reader()
+    for _ in range(100):
+        buffer.add_chunk("abcd")
+    buffer.mark_complete()
+
+    assert len(buffer.get_full_content()) <= 10
+    assert "".join(reader) == "abcd" * 2
+    assert reader.dropped == 98
+
+
+def test_async_reader():
+    buffer = StreamingBuffer()
+
+    def produce():
+        for token in ["a", "b", "c"]:
+            time.sleep(0.01)
+            buffer.add_chunk(token)
+        buffer.mark_complete()
+
+    async def consume():
+        threading.Thread(target=produce).start()
+        return [chunk async for chunk in buffer.reader()]
+
+    assert asyncio.run(consume()) == ["a", "b", "c"]
+
+
+def test_producer_survives_readers_whose_loop_closed():
+    buffer = StreamingBuffer()
+
+    async def cancelled_reader():
+        task = asyncio.ensure_future(buffer.wait_async(0))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(cancelled_reader())
+    assert buffer._async_waiters == []  # The cancelled waiter removed itself
+
+    # A waiter left behind on a loop that has since closed is skipped
+    loop = asyncio.new_event_loop()
+    buffer._async_waiters.append((loop, loop.create_future()))
+    loop.close()
+    buffer.add_chunk("a")
+    buffer.mark_complete()
+    assert buffer.get_full_content() == "a" and buffer._async_waiters == []
+
+
+def test_abandoned_buffers_expire():
+    original_ttl = Config.STREAM_BUFFER_TTL_SECONDS
+    Config.STREAM_BUFFER_TTL_SECONDS = 0.05
+    try:
+        streaming.get_streaming_buffer("abandoned").add_chunk("x")
+        time.sleep(0.1)
+        assert streaming.active_buffer_count() == 0
+    finally:
+        Config.STREAM_BUFFER_TTL_SECONDS = original_ttl
+
+
+if __name__ == "__main__":
+    test_independent_readers()
+    test_memory_bound()
+    test_async_reader()
+    test_producer_survives_readers_whose_loop_closed()
+    test_abandoned_buffers_expire()
+    print("✅ SUCCESS: Streaming buffer behaves as expected.")
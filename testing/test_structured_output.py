@@ -0,0 +1,64 @@
+import json
+
+from utils.structured_output import (
+    parse_gap_analysis,
+    PARSE_OK,
+    PARSE_REPAIRED,
+    PARSE_FAILED,
+)
+
+
+def test_valid_gap_analysis():
+    result, status = parse_gap_analysis(
+        '{"gaps": ["latency numbers"], "contradictions": [], "confidence_score": 0.85}'
+    )
+    assert status == PARSE_OK
+    assert result["gaps"] == ["latency numbers"]
+    assert result["confidence_score"] == 0.85
+    assert result["summary"] is None and result["covered"] == []
+
+    result, status = parse_gap_analysis(
+        '{"summary": "Kafka retains logs.", "covered": ["retention"], "gaps": [], '
+        '"contradictions": [], "confidence_score": 0.9}'
+    )
+    assert status == PARSE_OK
+    assert result["summary"] == "Kafka retains logs."
+    assert result["covered"] == ["retention"]
+
+
+def test_repaired_gap_analysis():
+    # Code fence, trailing comma, legacy key, 0-100 scale and a string list
+    text = '```json\n{"gaps": "throughput, ordering", "contradictions": [], "confidence": 90,}\n```'
+    result, status = parse_gap_analysis(text)
+    assert status == PARSE_REPAIRED
+    assert result["confidence_score"] == 0.9
+    assert result["gaps"] == ["throughput", "ordering"]
+
+
+def test_unparseable_gap_analysis():
+    result, status = parse_gap_analysis("Confidence: 0.7\nGaps: none")
+    assert status == PARSE_FAILED
+    assert result is None
+
+    # Valid JSON but wrong types is rejected rather than guessed
+    result, status = parse_gap_analysis('{"gaps": [], "contradictions": [], "confidence_score": "high"}')
+    assert status == PARSE_FAILED
+
+
+def test_confidence_scales():
+    def score(value):
+        result, _ = parse_gap_analysis(
+            '{"gaps": [], "contradictions": [], "confidence_score": %s}' % json.dumps(value))
+        return result["confidence_score"]
+
+    assert score(85) == 0.85 and score("85%") == 0.85 and score("0.5%") == 0.005
+    assert score(1.5) == 1.0  # Overshoot is clamped, not read as 1.5%
+    assert score(0.7) == 0.7
+
+
+if __name__ == "__main__":
+    test_valid_gap_analysis()
+    test_repaired_gap_analysis()
+    test_unparseable_gap_analysis()
+    test_confidence_scales()
+    print("✅ SUCCESS: Gap analysis parsing behaves as expected.")
@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+from benchmarks.fakes import FakeStreamingChatModel
+from config import Config
+from tools.search_tools import afan_out_search, fan_out_search
+from utils import tracing
+
+
+class StubProvider:
+    name = "stub"
+
+    def search(self, query, max_results=3):
+        return [{"title": query, "url": "https://example.com", "content": "x" * 10}]
+
+    async def asearch(self, query, max_results=3):
+        return self.search(query, max_results)
+
+
+def _no_export(monkeypatch):
+    monkeypatch.setattr(tracing, "get_exporter", lambda: None)
+    monkeypatch.setattr(Config, "SEARCH_CACHE_ENABLED", False)
+
+
+def test_spans_nest_under_the_node(monkeypatch):
+    _no_export(monkeypatch)
+
+    def node(state):
+        fan_out_search(["a", "b"], providers=[StubProvider()])  # runs in pool threads
+        return {"mode": "quick"}
+
+    tracing.trace_node("deep_research", node)({"query_id": "q-sync"})
+    spans = {s.name: s for s in tracing.get_spans("q-sync")}
+    node_span, search = spans["deep_research"], spans["search"]
+
+    assert search.parent_id == node_span.span_id and search.attributes["hits"] == 2
+    assert spans["search.stub"].parent_id == search.span_id
+    assert tracing.node_timings("q-sync") == [("deep_research", node_span.duration_ms)]
+    assert "search 1x" in tracing.summarize_node(node_span)
+
+
+def test_async_node_and_llm_span(monkeypatch):
+    _no_export(monkeypatch)
+    llm = FakeStreamingChatModel(answer_tokens=5, first_token_latency=0, tokens_per_second=1000,
+                                 callbacks=[tracing.LLMTracer()])
+
+    async def node(state):
+        chunks = [c async for c in llm.astream("hello")]
+        await afan_out_search(["a"], providers=[StubProvider()])
+        await asyncio.to_thread(lambda: tracing.annotate(from_thread=True))
+        return {"chunks": len(chunks)}
+
+    asyncio.run(tracing.trace_node("quick_mode", node)({"query_id": "q-async"}))
+    spans = {s.name: s for s in tracing.get_spans("q-async")}
+
+    llm_span = spans["llm"]
+    assert llm_span.parent_id == spans["quick_mode"].span_id
+    assert llm_span.attributes["tokens"] > 5 and "ttft_ms" in llm_span.attributes
+    assert spans["search"].parent_id == spans["quick_mode"].span_id
+    assert spans["quick_mode"].attributes["from_thread"] is True
+
+
+def test_calls_outside_a_run_are_not_recorded(monkeypatch):
+    exported = []
+    monkeypatch.setattr(tracing, "get_exporter", lambda: type("E", (), {"export": staticmethod(exported.append)}))
+
+    with tracing.span("memory.add_memories", kind="memory") as s:
+        tracing.annotate(points=3)
+    assert s.trace_id is None and s.duration_ms is not None and exported == []
+
+
+def test_jsonl_export_is_otlp_shaped(tmp_path, monkeypatch):
+    exporter = tracing.JsonlExporter(str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(tracing, "get_exporter", lambda: exporter)
+
+    try:
+        with tracing.span("formatter", kind="node", trace_id="q-export"):
+            with tracing.span("memory.add_memories", kind="memory", points=1):
+                raise ValueError("disk full")
+    except ValueError:
+        pass
+
+    child, parent = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    assert child["parentSpanId"] == parent["spanId"] and child["traceId"] == parent["traceId"]
+    assert child["status"] == {"code": "STATUS_CODE_ERROR", "message": "ValueError: disk full"}
+    assert {"key": "points", "value": {"intValue": "1"}} in child["attributes"]
+    assert int(parent["endTimeUnixNano"]) >= int(child["endTimeUnixNano"])
+
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    import pytest
+    with pytest.MonkeyPatch.context() as mp:
+        test_spans_nest_under_the_node(mp)
+        test_async_node_and_llm_span(mp)
+        test_calls_outside_a_run_are_not_recorded(mp)
+        test_jsonl_export_is_otlp_shaped(pathlib.Path(tempfile.mkdtemp()), mp)
+    print("✅ SUCCESS: Nodes, LLM, search and memory calls are traced.")
@@ -1,12 +1,20 @@
 # tools/search_tools.py
 import os
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_core.documents import Document
+import asyncio
+import contextvars
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from utils.search_cache import get_search_cache
+from utils import tracing
+
+# Search SDKs are imported on first use; langchain_community alone costs ~1s at startup
 
 # 1. Tavily is the "Gold Standard" for LLM Research Agents
 # Note: Requires TAVILY_API_KEY in your .env
 def get_tavily_search():
+    from langchain_community.tools.tavily_search import TavilySearchResults
     return TavilySearchResults(
         max_results=5,
         search_depth="advanced",
@@ -16,20 +24,199 @@ def get_tavily_search():
 
 # 2. DuckDuckGo as a zero-cost fallback
 def get_ddg_search():
+    from langchain_community.tools import DuckDuckGoSearchRun
     return DuckDuckGoSearchRun()
 
 def web_search_tool(query: str, mode: str = "quick"):
     """
     Orchestrates the search based on the execution mode.
     """
+    provider = "tavily-web" if mode == "deep" and os.getenv("TAVILY_API_KEY") else "duckduckgo-web"
+    max_results = 5 if provider == "tavily-web" else 0  # DuckDuckGoSearchRun has no limit knob
+    cache = get_search_cache()
+    if cache is not None:
+        cached = cache.get(provider, query, max_results)
+        if cached is not None:
+            return cached
     try:
-        if mode == "deep" and os.getenv("TAVILY_API_KEY"):
+        if provider == "tavily-web":
             search = get_tavily_search()
             results = search.invoke({"query": query})
             # Format results into a single string for the LLM
-            return "\n\n".join([f"Source: {r['url']}\nContent: {r['content']}" for r in results])
+            content = "\n\n".join([f"Source: {r['url']}\nContent: {r['content']}" for r in results])
         else:
             search = get_ddg_search()
-            return search.invoke(query)
+            content = search.invoke(query)
     except Exception as e:
-        return f"Search failed: {str(e)}"
\ No newline at end of file
+        return f"Search failed: {str(e)}"
+    if cache is not None:
+        cache.put(provider, query, max_results, content)
+    return content
+
+
+# --- Fan-out search (Deep Mode) ---
+# Providers return normalized hits: {"title", "url", "content"}
+
+class CustomDuckDuckGoSearch:
+    name = "duckduckgo"
+
+    def search(self, query: str, max_results: int = 3):
+        from duckduckgo_search import DDGS
+        with DDGS() as ddgs:
+            return [
+                {"title": r.get("title", ""), "url": r.get("href", ""), "content": r.get("body", "")}
+                for r in ddgs.text(query, max_results=max_results)
+            ]
+
+    async def asearch(self, query: str, max_results: int = 3):
+        # duckduckgo_search's AsyncDDGS runs on an executor as well
+        return await asyncio.to_thread(self.search, query, max_results)
+
+    def invoke(self, query):
+        from duckduckgo_search import DDGS
+        try:
+            with DDGS() as ddgs:
+                results = list(ddgs.text(query, max_results=3))
+                return str(results)
+        except Exception as e:
+            return f"Search error: {e}"
+
+
+class TavilySearch:
+    name = "tavily"
+
+    def search(self, query: str, max_results: int = 3):
+        from langchain_community.tools.tavily_search import TavilySearchResults
+        results = TavilySearchResults(max_results=max_results).invoke({"query": query})
+        return self._normalize(results)
+
+    async def asearch(self, query: str, max_results: int = 3):
+        from langchain_community.tools.tavily_search import TavilySearchResults
+        results = await TavilySearchResults(max_results=max_results).ainvoke({"query": query})
+        return self._normalize(results)
+
+    @staticmethod
+    def _normalize(results):
+        if not isinstance(results, list):
+            # Tavily reports errors as a plain string
+            raise RuntimeError(str(results))
+        return [
+            {
+                "title": r.get("title", r.get("url", "Untitled")),
+                "url": r.get("url", ""),
+                "content": r.get("content", r.get("snippet", "")),
+            }
+            for r in results if isinstance(r, dict)
+        ]
+
+
+def get_search_providers():
+    """Tavily (when a key is configured) plus DuckDuckGo."""
+    providers = []
+    if os.getenv("TAVILY_API_KEY"):
+        providers.append(TavilySearch())
+    providers.append(CustomDuckDuckGoSearch())
+    return providers
+
+
+# Per-provider concurrency limits, shared by every session in the process
+_provider_limits = {}
+_provider_limits_lock = threading.Lock()
+
+def _provider_semaphore(name: str) -> threading.BoundedSemaphore:
+    with _provider_limits_lock:
+        if name not in _provider_limits:
+            limit = Config.SEARCH_CONCURRENCY.get(name, 2)
+            _provider_limits[name] = threading.BoundedSemaphore(limit)
+        return _provider_limits[name]
+
+def _limited_search(provider, query: str, max_results: int):
+    with tracing.span(f"search.{provider.name}", kind="search", query=query) as span:
+        cache = get_search_cache()
+        if cache is not None:
+            cached = cache.get(provider.name, query, max_results)
+            if cached is not None:
+                span.set(cache_hit=True, hits=len(cached))
+                return cached
+        with _provider_semaphore(provider.name):
+            hits = provider.search(query, max_results=max_results)
+        span.set(cache_hit=False, hits=len(hits))
+        if cache is not None:
+            cache.put(provider.name, query, max_results, hits)
+        return hits
+
+def _trace_outcomes(span, outcomes: list):
+    span.set(
+        hits=sum(len(o["hits"]) for o in outcomes),
+        payload_chars=sum(len(h.get("content", "")) for o in outcomes for h in o["hits"]),
+        errors=sum(1 for o in outcomes if o["error"]),
+    )
+
+def fan_out_search(queries, providers=None, max_results: int = None):
+    """
+    Run every (query, provider) pair concurrently.
+    Returns a list of {"query", "provider", "hits", "error"} in submission order.
+    """
+    providers = providers if providers is not None else get_search_providers()
+    max_results = max_results or Config.SEARCH_MAX_RESULTS
+    jobs = [(q, p) for q in queries for p in providers]
+    if not jobs:
+        return []
+
+    with tracing.span("search", kind="search", queries=len(queries), providers=len(providers)) as span, \
+            ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="search") as pool:
+        # Each job runs in a copy of this context so its span nests under this one
+        futures = [pool.submit(contextvars.copy_context().run, _limited_search, p, q, max_results) for q, p in jobs]
+        outcomes = []
+        for (query, provider), future in zip(jobs, futures):
+            try:
+                outcomes.append({"query": query, "provider": provider.name, "hits": future.result(), "error": None})
+            except Exception as e:
+                outcomes.append({"query": query, "provider": provider.name, "hits": [], "error": str(e)})
+        _trace_outcomes(span, outcomes)
+    return outcomes
+
+
+# Async limits are per event loop (asyncio primitives are loop-bound)
+_async_provider_limits = weakref.WeakKeyDictionary()
+
+def _async_provider_semaphore(name: str) -> asyncio.Semaphore:
+    limits = _async_provider_limits.setdefault(asyncio.get_running_loop(), {})
+    if name not in limits:
+        limits[name] = asyncio.Semaphore(Config.SEARCH_CONCURRENCY.get(name, 2))
+    return limits[name]
+
+async def _alimited_search(provider, query: str, max_results: int):
+    with tracing.span(f"search.{provider.name}", kind="search", query=query) as span:
+        # The SQLite cache locks and commits: keep it off the shared event loop
+        cache = get_search_cache()
+        if cache is not None:
+            cached = await asyncio.to_thread(cache.get, provider.name, query, max_results)
+            if cached is not None:
+                span.set(cache_hit=True, hits=len(cached))
+                return cached
+        async with _async_provider_semaphore(provider.name):
+            hits = await provider.asearch(query, max_results=max_results)
+        span.set(cache_hit=False, hits=len(hits))
+        if cache is not None:
+            await asyncio.to_thread(cache.put, provider.name, query, max_results, hits)
+        return hits
+
+async def afan_out_search(queries, providers=None, max_results: int = None):
+    """Async fan_out_search: same contract, runs on the caller's event loop."""
+    providers = providers if providers is not None else get_search_providers()
+    max_results = max_results or Config.SEARCH_MAX_RESULTS
+    jobs = [(q, p) for q in queries for p in providers]
+    with tracing.span("search", kind="search", queries=len(queries), providers=len(providers)) as span:
+        results = await asyncio.gather(
+            *[_alimited_search(p, q, max_results) for q, p in jobs],
+            return_exceptions=True
+        )
+        outcomes = []
+        for (query, provider), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                outcomes.append({"query": query, "provider": provider.name, "hits": [], "error": str(result)})
+            else:
+                outcomes.append({"query": query, "provider": provider.name, "hits": result, "error": None})
+        _trace_outcomes(span, outcomes)
+    return outcomes
@@ -0,0 +1,126 @@
+# tools/speculative.py
+"""
+Speculative first search round.
+
+The planner starts the search deep mode would run first while it is still
+asking the LLM for the mode. A deep route takes the in-flight result
+(take/atake), and any other route cancels it. Hits and wasted searches are
+counted under "speculative.*".
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config import Config
+from utils import metrics
+from tools.search_tools import fan_out_search, afan_out_search
+
+# query_id -> (queries, Future or asyncio.Task, started)
+_pending = {}
+_pending_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative")
+
+
+def _evict_expired(now: float):
+    # Caller holds _pending_lock. Runs that never reached a route decision (errors) leak otherwise.
+    for query_id in [q for q, (_, _, started) in _pending.items() if now - started > Config.SPECULATIVE_TTL_SECONDS]:
+        _discard(_pending.pop(query_id))
+
+
+def _discard(entry):
+    _, job, _ = entry
+    if isinstance(job, asyncio.Future):
+        # Task.cancel() is not thread-safe, and eviction may run on another thread or loop
+        try:
+            job.get_loop().call_soon_threadsafe(job.cancel)
+        except RuntimeError:
+            pass  # Its loop is closed: the task will never run again
+    else:
+        job.cancel()
+    metrics.increment("speculative.wasted")
+
+
+def _register(query_id: str, queries: list, job):
+    with _pending_lock:
+        now = time.monotonic()
+        _evict_expired(now)
+        if query_id in _pending:
+            _discard(_pending.pop(query_id))
+        _pending[query_id] = (list(queries), job, now)
+    metrics.increment("speculative.started")
+    print(f"DEBUG: Speculative search started: {queries}")
+
+
+def start(query_id: str, queries: list, search=fan_out_search):
+    """Run search(queries) in the background (sync graph)."""
+    if not Config.SPECULATIVE_SEARCH or not query_id:
+        return
+    # Copied context: the search spans nest under the caller's span
+    _register(query_id, queries, _executor.submit(contextvars.copy_context().run, search, queries))
+
+
+def astart(query_id: str, queries: list, search=afan_out_search):
+    """Run the async search(queries) as a task on the running loop (async graph)."""
+    if not Config.SPECULATIVE_SEARCH or not query_id:
+        return
+    _register(query_id, queries, asyncio.ensure_future(search(queries)))
+
+
+def _claim(query_id: str, queries: list):
+    """The pending job if it searched exactly `queries`; otherwise it is discarded."""
+    with _pending_lock:
+        entry = _pending.pop(query_id, None)
+    if entry is None:
+        return None
+    if entry[0] != list(queries):
+        _discard(entry)
+        return None
+    return entry[1]
+
+
+def take(query_id: str, queries: list):
+    """Outcomes of a matching speculative search, or None (search normally)."""
+    job = _claim(query_id, queries)
+    if job is None:
+        return None
+    try:
+        outcomes = job.result()
+    except Exception as e:
+        print(f"DEBUG: Speculative search failed: {e}")
+        outcomes = None
+    metrics.increment("speculative.hit" if outcomes is not None else "speculative.wasted")
+    return outcomes
+
+
+async def atake(query_id: str, queries: list):
+    """Async take; also accepts a search started by the sync graph."""
+    job = _claim(query_id, queries)
+    if job is None:
+        return None
+    try:
+        outcomes = await (asyncio.wrap_future(job) if isinstance(job, Future) else job)
+    except Exception as e:
+        print(f"DEBUG: Speculative search failed: {e}")
+        outcomes = None
+    metrics.increment("speculative.hit" if outcomes is not None else "speculative.wasted")
+    return outcomes
+
+
+def cancel(query_id: str):
+    """The route does not need the search (quick mode, unclear query)."""
+    with _pending_lock:
+        entry = _pending.pop(query_id, None)
+    if entry is not None:
+        _discard(entry)
+
+
+def pending_count() -> int:
+    with _pending_lock:
+        return len(_pending)
+
+
+def hit_rate() -> float:
+    """Share of speculative searches that deep mode used."""
+    return metrics.ratio("speculative.hit", "speculative.hit", "speculative.wasted")
@@ -30,9 +30,11 @@ def apply_custom_css():
             margin: 0.25rem;
         }
         .node-guard { background-color: #E3F2FD; color: #1976D2; }
+        .node-cache { background-color: #ECEFF1; color: #455A64; }
         .node-context { background-color: #F3E5F5; color: #7B1FA2; }
         .node-classify { background-color: #E8F5E9; color: #388E3C; }
         .node-planner { background-color: #FFF3E0; color: #F57C00; }
+        .node-join { background-color: #F5F5F5; color: #616161; }
         .node-quick { background-color: #E0F2F1; color: #00796B; }
         .node-quickmode { background-color: #E0F2F1; color: #00796B; }
         .node-deep { background-color: #FCE4EC; color: #C2185B; }
@@ -41,6 +43,7 @@ def apply_custom_css():
         .node-gapanalysis { background-color: #FFF9C4; color: #F57F17; }
         .node-synthesize { background-color: #E1BEE7; color: #6A1B9A; }
         .node-formatter { background-color: #C5CAE9; color: #303F9F; }
+        .node-duration { font-weight: 400; opacity: 0.7; margin-left: 0.3rem; }
     </style>
     """, unsafe_allow_html=True)
 
@@ -49,18 +52,68 @@ def render_header():
     st.markdown('<h1 class="main-header">🔍 Developer Research AI Agent</h1>', unsafe_allow_html=True)
     st.markdown('<p class="subtitle">Ask complex technical questions and get detailed, research-backed answers</p>', unsafe_allow_html=True)
 
-def render_node_badge(node_name):
-    """Renders a styled badge for a node."""
-    return f'<span class="node-badge node-{node_name.lower().replace("_", "")}">{node_name}</span>'
+def format_duration(ms):
+    """'850 ms' below a second, '2.4 s' above."""
+    return f"{ms:.0f} ms" if ms < 1000 else f"{ms / 1000:.1f} s"
 
-def render_execution_path(nodes):
-    """Renders the execution path of nodes."""
+def render_node_badge(node_name, duration_ms=None):
+    """Renders a styled badge for a node, with its duration when known."""
+    duration = f'<span class="node-duration">{format_duration(duration_ms)}</span>' if duration_ms is not None else ""
+    return f'<span class="node-badge node-{node_name.lower().replace("_", "")}">{node_name}{duration}</span>'
+
+def render_execution_path(nodes, durations=None):
+    """Renders the execution path of nodes (durations: ms per node, same order)."""
     if not nodes:
         return ""
     
-    nodes_html = " → ".join([render_node_badge(node) for node in nodes])
+    durations = durations or [None] * len(nodes)
+    nodes_html = " → ".join([render_node_badge(node, ms) for node, ms in zip(nodes, durations)])
     st.markdown(f"**Execution Path:** {nodes_html}", unsafe_allow_html=True)
 
+class IncrementalMarkdown:
+    """
+    Streams markdown into a placeholder.
+    Completed blocks (up to the last blank line outside a code fence) are
+    rendered once; only the still-growing tail is re-rendered each frame.
+    """
+
+    def __init__(self, placeholder):
+        box = placeholder.container()
+        self._stable = box.container()
+        self._tail = box.empty()
+        self._blocks = []
+        self._pending = ""
+        self._dirty = False
+
+    @property
+    def text(self):
+        return "".join(self._blocks) + self._pending
+
+    def append(self, text):
+        self._pending += text
+        self._dirty = True
+
+    def _split_point(self):
+        # Last paragraph break whose prefix has balanced ``` fences
+        pos = self._pending.rfind("\n\n")
+        while pos > 0:
+            if self._pending[:pos].count("```") % 2 == 0:
+                return pos + 2
+            pos = self._pending.rfind("\n\n", 0, pos)
+        return 0
+
+    def render(self):
+        if not self._dirty:
+            return
+        split = self._split_point()
+        if split:
+            block = self._pending[:split]
+            self._stable.markdown(block)
+            self._blocks.append(block)
+            self._pending = self._pending[split:]
+        self._tail.markdown(self._pending + " ▌")
+        self._dirty = False
+
 def render_message_metadata(mode, confidence, tokens):
     """Renders metadata for a message."""
     col1, col2, col3 = st.columns(3)
@@ -83,7 +136,7 @@ def render_chat_history(messages):
             with st.chat_message("assistant"):
                 # Show node execution path
                 if 'nodes' in message and message['nodes']:
-                    render_execution_path(message['nodes'])
+                    render_execution_path(message['nodes'], message.get('durations'))
                 
                 # Show report content
                 st.markdown(message['content'])
@@ -0,0 +1,322 @@
+"""
+Load balancing across several Ollama hosts (Config.OLLAMA_BACKENDS).
+
+Every backend is probed on GET /api/tags (reachable, models installed) and
+GET /api/ps (models loaded in memory). Each call goes to:
+
+1. the backend its session (chat thread, else query) used last, while that
+   one is healthy and has the model, so Ollama can reuse the cached prompt
+   prefix of the conversation;
+2. otherwise the healthy backend with the model already loaded and the
+   fewest calls in flight (a loaded backend past BACKEND_BUSY_IN_FLIGHT
+   counts as busy, as Ollama would queue the call).
+
+Routing happens in an httpx transport under the ChatOllama clients, so
+graph code is unchanged. A connection error marks the backend down for
+BACKEND_COOLDOWN_SECONDS and retries the call on the next backend; nothing
+has been generated at that point, so the retry is safe.
+"""
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import httpx
+
+from config import Config
+from utils import metrics
+from utils.resources import lazy_resource
+
+_session = contextvars.ContextVar("llm_session", default=None)
+
+# Errors raised before the backend saw the request
+_CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+def _model_key(name: str) -> str:
+    # "gemma3" and "gemma3:latest" are the same model to Ollama
+    return name if ":" in name else f"{name}:latest"
+
+
+class Backend:
+    """One Ollama host and what the last probe saw on it."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True      # Optimistic until the first probe
+        self.down_until = 0.0
+        self.models = set()      # Installed; empty means not probed yet
+        self.loaded = set()      # In memory
+        self.in_flight = 0
+        self.routed = 0
+
+    def usable(self, now: float) -> bool:
+        # A downed backend is tried again once its cooldown ends, even before the next probe
+        return self.healthy or now >= self.down_until
+
+    def serves(self, model: str) -> bool:
+        return not self.models or not model or _model_key(model) in self.models
+
+
+class BackendPool:
+    """Health-checked Ollama backends with sticky, least-loaded routing."""
+
+    def __init__(self, urls: list):
+        self.backends = [Backend(url) for url in urls]
+        self._sessions = OrderedDict()  # session -> Backend
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def probe(self, backend: Backend) -> bool:
+        """Refresh one backend's health and model lists."""
+        try:
+            with httpx.Client(timeout=Config.BACKEND_PROBE_TIMEOUT) as client:
+                tags = client.get(f"{backend.url}/api/tags")
+                tags.raise_for_status()
+                ps = client.get(f"{backend.url}/api/ps")
+                ps.raise_for_status()
+            models = {_model_key(m["name"]) for m in tags.json().get("models", [])}
+            loaded = {_model_key(m["name"]) for m in ps.json().get("models", [])}
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            self.mark_down(backend, e)
+            return False
+        with self._lock:
+            if not backend.healthy:
+                print(f"DEBUG: Ollama backend {backend.url} is back")
+            backend.healthy, backend.down_until = True, 0.0
+            backend.models, backend.loaded = models, loaded
+        return True
+
+    def probe_all(self):
+        for backend in self.backends:
+            self.probe(backend)
+
+    def choose(self, model: str = None, session: str = None, exclude=()):
+        """Pick a backend for a call and count it in flight (release() it after). None if all are excluded."""
+        with self._lock:
+            now = time.monotonic()
+            remaining = [b for b in self.backends if b not in exclude]
+            usable = [b for b in remaining if b.usable(now)]
+            # Model lists may be stale, and trying a downed host beats failing outright
+            candidates = [b for b in usable if b.serves(model)] or usable or remaining
+            if not candidates:
+                return None
+            backend = self._sessions.get(session) if session else None
+            if backend in candidates:
+                self._sessions.move_to_end(session)
+                metrics.increment("backends.sticky")
+            else:
+                key = _model_key(model) if model else None
+                backend = min(candidates, key=lambda b: (
+                    b.in_flight >= Config.BACKEND_BUSY_IN_FLIGHT, key not in b.loaded, b.in_flight, b.routed,
+                ))
+                if session:
+                    self._sessions[session] = backend
+                    while len(self._sessions) > Config.BACKEND_MAX_SESSIONS:
+                        self._sessions.popitem(last=False)
+            if model:
+                backend.loaded.add(_model_key(model))  # Ollama loads it for this call
+            backend.in_flight += 1
+            backend.routed += 1
+            return backend
+
+    def mark_loaded(self, backend: Backend, model: str):
+        """Record a model loaded outside the pool's routing (warm-up)."""
+        with self._lock:
+            backend.loaded.add(_model_key(model))
+
+    def release(self, backend: Backend):
+        with self._lock:
+            backend.in_flight -= 1
+
+    def mark_down(self, backend: Backend, error):
+        """Skip a backend until it passes a probe or its cooldown ends; its sessions move elsewhere."""
+        with self._lock:
+            if backend.healthy:
+                print(f"DEBUG: Ollama backend {backend.url} is down: {error}")
+            backend.healthy = False
+            backend.down_until = time.monotonic() + Config.BACKEND_COOLDOWN_SECONDS
+            for session in [s for s, b in self._sessions.items() if b is backend]:
+                del self._sessions[session]
+
+    def start_health_checks(self):
+        """Probe every backend now and then every BACKEND_PROBE_INTERVAL seconds, on a daemon thread."""
+        def loop():
+            while not self._closed.is_set():
+                self.probe_all()
+                self._closed.wait(Config.BACKEND_PROBE_INTERVAL)
+
+        threading.Thread(target=loop, name="ollama-health", daemon=True).start()
+
+    def close(self):
+        """Stop the health checks."""
+        self._closed.set()
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [{"url": b.url, "healthy": b.healthy, "in_flight": b.in_flight, "routed": b.routed,
+                     "loaded": sorted(b.loaded)} for b in self.backends]
+
+
+@lazy_resource
+def get_pool():
+    """The process-wide pool over Config.OLLAMA_BACKENDS (or OLLAMA_BASE_URL)."""
+    pool = BackendPool(Config.OLLAMA_BACKENDS or [Config.OLLAMA_BASE_URL])
+    if len(pool.backends) > 1:
+        pool.start_health_checks()  # One backend gets every call anyway
+    return pool
+
+
+def session_node(node):
+    """Wrap a graph node (sync or async) so its LLM calls stick to one backend per thread_id (else query_id)."""
+    if asyncio.iscoroutinefunction(node):
+        @wraps(node)
+        async def async_wrapper(state):
+            token = _session.set(state.get("thread_id") or state.get("query_id"))
+            try:
+                return await node(state)
+            finally:
+                _session.reset(token)
+        return async_wrapper
+
+    @wraps(node)
+    def wrapper(state):
+        token = _session.set(state.get("thread_id") or state.get("query_id"))
+        try:
+            return node(state)
+        finally:
+            _session.reset(token)
+    return wrapper
+
+
+def _request_model(request: httpx.Request):
+    try:
+        return json.loads(request.content or b"{}").get("model")
+    except (ValueError, AttributeError, httpx.RequestNotRead):
+        return None
+
+
+def _route(request: httpx.Request, backend: Backend):
+    url = httpx.URL(backend.url)
+    request.url = request.url.copy_with(scheme=url.scheme, host=url.host, port=url.port)
+    request.headers["Host"] = url.netloc.decode("ascii")
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that gives the backend's slot back once the (streamed) response is closed."""
+
+    def __init__(self, stream, release):
+        self._stream, self._release = stream, release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if self._release:
+                self._release()
+                self._release = None
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream, self._release = stream, release
+
+    async def __aiter__(self):
+        async for part in self._stream:
+            yield part
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release:
+                self._release()
+                self._release = None
+
+
+class PoolTransport(httpx.BaseTransport):
+    """httpx transport sending each request to the backend the pool picks (pooled connections per backend)."""
+
+    def __init__(self, pool: BackendPool, limits: httpx.Limits = None):
+        self.pool = pool
+        self._limits = limits or httpx.Limits()
+        self._transports = {}
+
+    def _transport(self, backend: Backend):
+        if backend.url not in self._transports:
+            self._transports[backend.url] = httpx.HTTPTransport(limits=self._limits)
+        return self._transports[backend.url]
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        model, tried, error = _request_model(request), [], None
+        while True:
+            backend = self.pool.choose(model, _session.get(), exclude=tried)
+            if backend is None:
+                raise error
+            _route(request, backend)
+            try:
+                response = self._transport(backend).handle_request(request)
+            except _CONNECT_ERRORS as e:
+                self.pool.release(backend)
+                self.pool.mark_down(backend, e)
+                metrics.increment("backends.failover")
+                tried.append(backend)
+                error = e
+                continue
+            except BaseException:
+                self.pool.release(backend)
+                raise
+            release = lambda backend=backend: self.pool.release(backend)
+            return httpx.Response(response.status_code, headers=response.headers,
+                                  stream=_ReleasingStream(response.stream, release), extensions=response.extensions)
+
+    def close(self):
+        for transport in self._transports.values():
+            transport.close()
+
+
+class AsyncPoolTransport(httpx.AsyncBaseTransport):
+    """Async PoolTransport."""
+
+    def __init__(self, pool: BackendPool, limits: httpx.Limits = None):
+        self.pool = pool
+        self._limits = limits or httpx.Limits()
+        self._transports = {}
+
+    def _transport(self, backend: Backend):
+        if backend.url not in self._transports:
+            self._transports[backend.url] = httpx.AsyncHTTPTransport(limits=self._limits)
+        return self._transports[backend.url]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        model, tried, error = _request_model(request), [], None
+        while True:
+            backend = self.pool.choose(model, _session.get(), exclude=tried)
+            if backend is None:
+                raise error
+            _route(request, backend)
+            try:
+                response = await self._transport(backend).handle_async_request(request)
+            except _CONNECT_ERRORS as e:
+                self.pool.release(backend)
+                self.pool.mark_down(backend, e)
+                metrics.increment("backends.failover")
+                tried.append(backend)
+                error = e
+                continue
+            except BaseException:
+                self.pool.release(backend)
+                raise
+            release = lambda backend=backend: self.pool.release(backend)
+            return httpx.Response(response.status_code, headers=response.headers,
+                                  stream=_AsyncReleasingStream(response.stream, release), extensions=response.extensions)
+
+    async def aclose(self):
+        for transport in self._transports.values():
+            await transport.aclose()
@@ -0,0 +1,74 @@
+"""
+Per-query token accounting and budget enforcement.
+"""
+from config import Config
+
+
+def usage_from(message) -> int:
+    """
+    Exact token count for a response or stream chunk.
+    langchain-ollama fills usage_metadata from Ollama's prompt_eval_count and
+    eval_count; while streaming only the final chunk carries it.
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return 0
+    return usage.get("total_tokens") or (usage.get("input_tokens", 0) + usage.get("output_tokens", 0))
+
+
+class BudgetTracker:
+    """
+    Read-only view of a query's token budget, built from the graph state.
+    Nodes consult it to decide how much history to include, how long an
+    answer may be, and whether another research round is affordable.
+    """
+
+    def __init__(self, state: dict):
+        self.limit = state.get("budget_limit") or Config.MAX_TOKENS_PER_QUERY
+        self.used = state.get("token_usage", 0)
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.limit - self.used)
+
+    @property
+    def fraction_used(self) -> float:
+        return min(1.0, self.used / self.limit) if self.limit else 1.0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.used >= self.limit
+
+    def history_messages(self, default: int) -> int:
+        """How many history messages to include: all of `default` early, fewer as the budget drains."""
+        if self.fraction_used >= Config.BUDGET_DROP_HISTORY_AT:
+            return 0
+        if self.fraction_used >= Config.BUDGET_SHRINK_HISTORY_AT:
+            return default // 2
+        return default
+
+    def max_output_tokens(self, default: int, prompt_tokens: int = 0) -> int:
+        """
+        Generation cap: `default`, or what the budget has left after the prompt
+        if that is smaller. Never below BUDGET_MIN_OUTPUT_TOKENS, so even a
+        drained budget ends with a usable answer rather than a truncated one.
+        """
+        return max(Config.BUDGET_MIN_OUTPUT_TOKENS, min(default, self.remaining - prompt_tokens))
+
+    def synthesis_allowance(self, prompt_tokens: int) -> tuple:
+        """
+        (evidence tokens, output tokens) for the final report, whose prompt
+        without evidence is `prompt_tokens`. Both shrink in proportion when
+        the remaining budget cannot pay for their configured sizes.
+        """
+        evidence, output = Config.EVIDENCE_TOKEN_BUDGET["synthesis"], Config.SYNTHESIS_MAX_OUTPUT_TOKENS
+        available = self.remaining - prompt_tokens
+        share = min(1.0, max(0, available) / (evidence + output))
+        output = max(Config.BUDGET_MIN_OUTPUT_TOKENS, int(output * share))
+        return max(0, min(int(evidence * share), available - output)), output
+
+    def allows_research_round(self) -> bool:
+        """Whether one more search + gap analysis round still leaves room for the synthesis prompt and a report."""
+        synthesis = (Config.PROMPT_OVERHEAD_TOKENS + Config.EVIDENCE_TOKEN_BUDGET["synthesis"]
+                     + Config.BUDGET_MIN_OUTPUT_TOKENS)
+        return self.remaining >= Config.DEEP_ROUND_TOKEN_ESTIMATE + synthesis
@@ -0,0 +1,111 @@
+"""
+Duplicate and near-duplicate elimination for search results.
+
+Three checks, cheapest first: normalized URL, exact content hash, and a
+64-bit SimHash over word shingles (near-duplicate snippets differing by a
+few words). The index is plain lists so it can live in AgentState and
+persist across deep-mode iterations.
+"""
+import hashlib
+import re
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from config import Config
+from utils.evidence import estimate_tokens
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form: https, no www., no fragment/tracking params, sorted query, no trailing slash."""
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    trackers = Config.DEDUP_TRACKING_PARAMS
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in trackers
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash over word shingles."""
+    words = _WORD_RE.findall(text.lower())
+    shingles = [" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class DedupIndex:
+    """Seen URLs, content hashes and SimHashes for one research run."""
+
+    def __init__(self, urls=None, hashes=None, simhashes=None):
+        self.urls = set(urls or [])
+        self.hashes = set(hashes or [])
+        self.simhashes = list(simhashes or [])
+
+    @classmethod
+    def from_state(cls, data: Optional[dict]) -> "DedupIndex":
+        data = data or {}
+        return cls(data.get("urls"), data.get("hashes"), data.get("simhashes"))
+
+    def to_state(self) -> dict:
+        return {"urls": sorted(self.urls), "hashes": sorted(self.hashes), "simhashes": list(self.simhashes)}
+
+    def duplicate_reason(self, item: dict) -> Optional[str]:
+        """'url', 'exact' or 'near' if the item was already seen, else None."""
+        url = normalize_url(item.get("url", ""))
+        if url and url in self.urls:
+            return "url"
+        text = item.get("content", "")
+        if content_hash(text) in self.hashes:
+            return "exact"
+        if len(_WORD_RE.findall(text)) >= Config.DEDUP_MIN_WORDS:
+            fingerprint = simhash(text)
+            if any(hamming(fingerprint, seen) <= Config.DEDUP_SIMHASH_DISTANCE for seen in self.simhashes):
+                return "near"
+        return None
+
+    def add(self, item: dict):
+        url = normalize_url(item.get("url", ""))
+        if url:
+            self.urls.add(url)
+        text = item.get("content", "")
+        self.hashes.add(content_hash(text))
+        if len(_WORD_RE.findall(text)) >= Config.DEDUP_MIN_WORDS:
+            self.simhashes.append(simhash(text))
+
+    def filter(self, items: list) -> Tuple[list, dict]:
+        """
+        Keep only unseen items (adding them to the index).
+        Returns (kept, stats) with per-reason drop counts and the tokens saved.
+        """
+        kept = []
+        stats = {"url": 0, "exact": 0, "near": 0, "tokens_saved": 0}
+        for item in items:
+            reason = self.duplicate_reason(item)
+            if reason:
+                stats[reason] += 1
+                stats["tokens_saved"] += estimate_tokens(item.get("content", ""))
+                continue
+            self.add(item)
+            kept.append(item)
+        return kept, stats
@@ -0,0 +1,148 @@
+"""
+Embedding cache and micro-batching embedding service.
+
+EmbeddingCache keeps vectors in one preallocated float32 matrix, keyed by a
+16-byte content hash and evicted LRU. EmbeddingService answers cache hits
+directly and sends misses to a single worker thread, which folds requests
+arriving within EMBED_BATCH_WAIT_MS (from any session) into one ONNX call.
+"""
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Optional
+
+import numpy as np
+
+from config import Config
+from utils import metrics, tracing
+
+
+class EmbeddingCache:
+    """LRU of embeddings; rows of a float32 matrix allocated on first use."""
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or Config.EMBED_CACHE_ENTRIES
+        self._matrix = None
+        self._rows = OrderedDict()  # key -> row index
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, kind: str = "document") -> bytes:
+        return hashlib.blake2b(f"{kind}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            self._rows.move_to_end(key)
+            return self._matrix[row].copy()
+
+    def put(self, key: bytes, vector: np.ndarray):
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            row = self._rows.pop(key, None)
+            if row is None:
+                if len(self._rows) < self.max_entries:
+                    row = len(self._rows)
+                else:
+                    _, row = self._rows.popitem(last=False)  # Reuse the least recently used row
+            self._matrix[row] = vector
+            self._rows[key] = row
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self._matrix is None else self._matrix.nbytes
+
+
+class EmbeddingService:
+    """
+    Cached, micro-batched front end for a FastEmbed-style model (anything
+    with embed(texts) and query_embed(texts) returning vectors).
+    """
+
+    def __init__(self, embedder=None, cache: EmbeddingCache = None, max_batch: int = None,
+                 batch_wait: float = None, symmetric: bool = None):
+        self._embedder = embedder
+        self.cache = cache or EmbeddingCache()
+        self.max_batch = max_batch or Config.EMBED_MAX_BATCH
+        self.batch_wait = Config.EMBED_BATCH_WAIT_MS / 1000 if batch_wait is None else batch_wait
+        # Symmetric models embed queries like documents, so one cached vector serves both
+        self.symmetric = Config.EMBEDDING_SYMMETRIC if symmetric is None else symmetric
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            from utils.resources import get_embedder
+            self._embedder = get_embedder()
+        return self._embedder
+
+    def embed(self, texts: List[str], kind: str = "document") -> np.ndarray:
+        """(len(texts), dim) float32 embeddings; kind is "document" or "query"."""
+        kind = "document" if self.symmetric else kind
+        keys = [EmbeddingCache.key(t, kind) for t in texts]
+        vectors = [self.cache.get(k) for k in keys]
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        metrics.increment("embeddings.cache_hit", len(texts) - sum(v is None for v in vectors))
+        metrics.increment("embeddings.cache_miss", len(missing))
+        tracing.annotate(embed_cache_hits=len(texts) - sum(v is None for v in vectors), embedded=len(missing))
+        if missing:
+            computed = dict(zip(missing, self._submit(kind, missing).result()))
+            for i, text in enumerate(texts):
+                if vectors[i] is None:
+                    vectors[i] = computed[text]
+                    self.cache.put(keys[i], vectors[i])
+        return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text], kind="query")[0]
+
+    def _submit(self, kind: str, texts: List[str]) -> Future:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((kind, texts, future))
+        return future
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        size = len(batch[0][1])
+        deadline = time.monotonic() + self.batch_wait
+        while size < self.max_batch:
+            try:
+                request = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request[1])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            for kind in {kind for kind, _, _ in batch}:
+                requests = [(texts, future) for k, texts, future in batch if k == kind]
+                unique = list(dict.fromkeys(t for texts, _ in requests for t in texts))
+                try:
+                    embed = self.embedder.query_embed if kind == "query" else self.embedder.embed
+                    by_text = {t: np.asarray(v, dtype=np.float32) for t, v in zip(unique, embed(unique))}
+                except Exception as e:
+                    for _, future in requests:
+                        future.set_exception(e)
+                    continue
+                metrics.increment("embeddings.batches")
+                metrics.increment("embeddings.batched_texts", len(unique))
+                for texts, future in requests:
+                    future.set_result([by_text[t] for t in texts])
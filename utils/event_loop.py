@@ -0,0 +1,27 @@
+"""
+A single process-wide asyncio loop running on a daemon thread.
+Lets synchronous callers (Streamlit, CLI) drive the async graph without
+starting a thread per research session.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Coroutine
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """Start the shared loop on first use and return it."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="agent-event-loop", daemon=True).start()
+        return _loop
+
+
+def submit(coro: Coroutine) -> Future:
+    """Schedule a coroutine on the shared loop; returns a concurrent Future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop())
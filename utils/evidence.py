@@ -0,0 +1,149 @@
+"""
+Token-budget-aware evidence packing for LLM prompts.
+
+research_data entries are split into chunks per source, exact duplicates are
+dropped, chunks are ranked with BM25 against the query and open gaps, and the
+best ones are packed into a per-node token budget. Selected chunks are emitted
+in their original order, grouped under a numbered source header.
+"""
+import hashlib
+import math
+import re
+from collections import Counter
+from typing import List
+
+from config import Config
+
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9+#.-]*")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can", "had", "her",
+    "was", "one", "our", "out", "has", "have", "its", "his", "how", "what", "when",
+    "which", "who", "why", "with", "this", "that", "from", "they", "will", "would",
+    "there", "their", "been", "were", "into", "than", "then", "them", "these", "those",
+    "also", "such", "does", "about", "between", "more", "most", "some", "use", "using",
+}
+
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def terms(text: str) -> List[str]:
+    words = (w.rstrip(".-") for w in _WORD_RE.findall(text.lower()))
+    return [w for w in words if len(w) > 2 and w not in _STOPWORDS]
+
+
+def context_window(model: str = None) -> int:
+    """Context size (tokens) of a model, from Config."""
+    model = model or Config.MODEL_NAME
+    return Config.MODEL_CONTEXT_WINDOWS.get(model, Config.DEFAULT_CONTEXT_WINDOW)
+
+
+def evidence_budget(node: str, model: str = None, output_tokens: int = 0, num_ctx: int = None) -> int:
+    """
+    Evidence tokens a node may spend: its configured share, bounded by what
+    fits in the context (num_ctx, or the model's window) next to the prompt
+    template and the output.
+    """
+    fits = (num_ctx or context_window(model)) - Config.PROMPT_OVERHEAD_TOKENS - output_tokens
+    return max(0, min(Config.EVIDENCE_TOKEN_BUDGET[node], fits))
+
+
+def _split_text(text: str, max_tokens: int) -> List[str]:
+    """Paragraph-aligned pieces of at most ~max_tokens (sentences split if needed)."""
+    pieces, current = [], ""
+    for paragraph in _PARAGRAPH_RE.split(text):
+        units = [paragraph] if estimate_tokens(paragraph) <= max_tokens else _SENTENCE_RE.split(paragraph)
+        for unit in units:
+            unit = unit.strip()
+            if not unit:
+                continue
+            while estimate_tokens(unit) > max_tokens:  # A single huge sentence
+                pieces.append(unit[:max_tokens * 4])
+                unit = unit[max_tokens * 4:]
+            if current and estimate_tokens(current) + estimate_tokens(unit) > max_tokens:
+                pieces.append(current)
+                current = ""
+            current = f"{current}\n{unit}" if current else unit
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_evidence(research_data: list, max_chunk_tokens: int = None) -> List[dict]:
+    """Split every research_data entry into chunks, dropping exact duplicates."""
+    max_chunk_tokens = max_chunk_tokens or Config.EVIDENCE_CHUNK_TOKENS
+    chunks, seen = [], set()
+    for source_index, item in enumerate(research_data):
+        for piece in _split_text(item.get("content", ""), max_chunk_tokens):
+            digest = hashlib.sha1(" ".join(piece.lower().split()).encode("utf-8")).hexdigest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            chunks.append({
+                "source_index": source_index,
+                "order": len(chunks),
+                "text": piece,
+                "tokens": estimate_tokens(piece),
+                "terms": Counter(terms(piece)),
+            })
+    return chunks
+
+
+def rank_chunks(chunks: List[dict], query: str, gaps: list = None) -> List[dict]:
+    """Sort chunks by BM25 relevance to the query (weight 1.0) and open gaps (weight 0.7)."""
+    weighted_terms = Counter({t: 1.0 for t in terms(query)})
+    for gap in gaps or []:
+        for t in terms(gap):
+            weighted_terms[t] = max(weighted_terms[t], 0.7)
+    if not chunks:
+        return []
+
+    n = len(chunks)
+    avg_len = sum(sum(c["terms"].values()) for c in chunks) / n or 1.0
+    doc_freq = Counter(t for c in chunks for t in c["terms"] if t in weighted_terms)
+
+    for chunk in chunks:
+        length = sum(chunk["terms"].values())
+        score = 0.0
+        for term, weight in weighted_terms.items():
+            tf = chunk["terms"].get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            score += weight * idf * tf * (_K1 + 1) / (tf + _K1 * (1 - _B + _B * length / avg_len))
+        chunk["score"] = score
+    # Ties go to newer evidence (later research_data entries)
+    return sorted(chunks, key=lambda c: (c["score"], c["source_index"]), reverse=True)
+
+
+def pack_evidence(research_data: list, query: str, token_budget: int, gaps: list = None) -> str:
+    """Render the most relevant evidence that fits in `token_budget` tokens."""
+    selected, used = [], 0
+    for chunk in rank_chunks(chunk_evidence(research_data), query, gaps):
+        # Leave room for the source header that introduces the chunk
+        cost = chunk["tokens"] + 12
+        if used + cost > token_budget:
+            continue
+        selected.append(chunk)
+        used += cost
+
+    lines, numbers, last_source = [], {}, None
+    for chunk in sorted(selected, key=lambda c: c["order"]):
+        index = chunk["source_index"]
+        if index != last_source:
+            item = research_data[index]
+            number = numbers.setdefault(index, len(numbers) + 1)
+            label = item.get("title") or item.get("source", "Source")
+            url = f" ({item['url']})" if item.get("url") else ""
+            lines.append(f"\n[{number}] {label}{url}")
+            last_source = index
+        lines.append(chunk["text"])
+    return "\n".join(lines).strip()
@@ -0,0 +1,95 @@
+"""
+Per-node generation profiles.
+
+Config.GENERATION_PROFILES gives each node an output cap (num_predict) and
+stop sequences; for_prompt() applies them to the node's model together with
+a num_ctx that fits the packed prompt. stream_until() ends a streamed call as
+soon as a parser has what it needs, which closes the HTTP response and makes
+Ollama stop generating.
+"""
+from config import Config
+from utils import metrics
+from utils.budget import usage_from
+from utils.evidence import estimate_tokens
+
+
+def prompt_tokens(messages) -> int:
+    """Estimated prompt size of a message list (content plus chat-template tokens per message)."""
+    return sum(estimate_tokens(str(m.content)) + 4 for m in messages)
+
+
+def fit_num_ctx(needed_tokens: int, configured: int = None) -> int:
+    """
+    Context size for a call needing `needed_tokens` (prompt + output). The
+    configured size is kept whenever the call fits, because Ollama reloads the
+    model when num_ctx changes; otherwise it doubles until the call fits, up
+    to Config.MAX_NUM_CTX.
+    """
+    configured = configured or Config.DEFAULT_CONTEXT_WINDOW
+    needed_tokens += Config.NUM_CTX_MARGIN_TOKENS
+    size = configured
+    while size < needed_tokens and size < Config.MAX_NUM_CTX:
+        size *= 2
+    if size < needed_tokens:
+        print(f"DEBUG: Prompt needs ~{needed_tokens} tokens, more than MAX_NUM_CTX={Config.MAX_NUM_CTX}")
+    return min(size, max(configured, Config.MAX_NUM_CTX))
+
+
+def for_prompt(llm, node: str, messages: list, max_tokens: int = None):
+    """
+    Copy of a node's chat model (sharing its HTTP client) with the node's
+    profile applied: num_predict (lowered to `max_tokens`, the budget's cap),
+    stop sequences, and a num_ctx that fits `messages` plus the output.
+    """
+    profile = Config.GENERATION_PROFILES.get(node, {})
+    num_predict = profile.get("num_predict")
+    if max_tokens is not None:
+        num_predict = min(num_predict, max_tokens) if num_predict else max_tokens
+    update = {"num_ctx": fit_num_ctx(prompt_tokens(messages) + (num_predict or 0), getattr(llm, "num_ctx", None))}
+    if num_predict:
+        update["num_predict"] = max(1, int(num_predict))
+    if profile.get("stop"):
+        update["stop"] = list(profile["stop"])
+    return llm.model_copy(update=update)
+
+
+def _result(messages, text: str, tokens: int, value, stopped: bool):
+    if stopped:
+        metrics.increment("generation.stopped_early")
+    # Stopped streams never see Ollama's final counts: estimate them
+    return value, text, tokens or prompt_tokens(messages) + estimate_tokens(text)
+
+
+def stream_until(llm, messages: list, parse):
+    """
+    Stream a completion until parse(text so far) returns something other than
+    None. Returns (parsed value or None, text, tokens used).
+    """
+    text, tokens, value = "", 0, None
+    stream = llm.stream(messages)
+    try:
+        for chunk in stream:
+            text += chunk.content
+            tokens += usage_from(chunk)  # Final chunk carries Ollama's counts
+            value = parse(text)
+            if value is not None:
+                break
+    finally:
+        stream.close()
+    return _result(messages, text, tokens, value, stopped=value is not None and not tokens)
+
+
+async def astream_until(llm, messages: list, parse):
+    """Async stream_until."""
+    text, tokens, value = "", 0, None
+    stream = llm.astream(messages)
+    try:
+        async for chunk in stream:
+            text += chunk.content
+            tokens += usage_from(chunk)
+            value = parse(text)
+            if value is not None:
+                break
+    finally:
+        await stream.aclose()
+    return _result(messages, text, tokens, value, stopped=value is not None and not tokens)
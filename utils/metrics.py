@@ -0,0 +1,40 @@
+"""
+Process-wide counters for lightweight run telemetry.
+"""
+import threading
+from typing import Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+
+
+def increment(name: str, amount: int = 1):
+    """Increase a named counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def get_count(name: str) -> int:
+    """Read the current value of a counter (0 if never incremented)."""
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot(prefix: str = "") -> Dict[str, int]:
+    """Copy of all counters, optionally restricted to a name prefix."""
+    with _lock:
+        return {k: v for k, v in _counters.items() if k.startswith(prefix)}
+
+
+def ratio(numerator: str, *denominators: str) -> float:
+    """numerator / sum(denominators), or 0.0 when nothing was counted yet."""
+    with _lock:
+        total = sum(_counters.get(d, 0) for d in denominators)
+        return _counters.get(numerator, 0) / total if total else 0.0
+
+
+def reset(prefix: str = ""):
+    """Drop counters (all of them, or those matching a prefix)."""
+    with _lock:
+        for key in [k for k in _counters if k.startswith(prefix)]:
+            del _counters[key]
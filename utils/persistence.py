@@ -0,0 +1,195 @@
+"""
+Write-behind persistence: memory upserts and report files are queued and
+applied by a background worker, off the request's critical path.
+
+The queue is bounded: when it is full, submit() blocks (backpressure) for up
+to PERSIST_ENQUEUE_TIMEOUT seconds and then performs the write inline, so
+nothing is dropped. Pending work is flushed at interpreter exit.
+"""
+import atexit
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+
+_STOP = object()
+
+
+class PersistenceTicket:
+    """Handle for one queued write; wait() blocks until it is durable."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.error: Optional[Exception] = None
+
+    def _finish(self, error: Exception = None):
+        self.error = error
+        self._done.set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """True once written successfully; False on timeout or failure."""
+        return self._done.wait(timeout) and self.error is None
+
+
+class PersistenceWorker:
+    """
+    Background thread applying queued writes in batches.
+    `handlers` maps a kind (e.g. "memory") to a function taking a list of
+    payloads, so one batch becomes one call (one embedding pass, one upsert).
+    A handler may return one error (or None) per payload; if it raises, the
+    batch is retried one item at a time so one bad item fails only its ticket.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[[List[dict]], None]],
+                 maxsize: int = None, batch_size: int = None, batch_window: float = None):
+        self.handlers = handlers
+        self.batch_size = batch_size or Config.PERSIST_BATCH_SIZE
+        self.batch_window = Config.PERSIST_BATCH_WINDOW if batch_window is None else batch_window
+        self._queue = queue.Queue(maxsize=maxsize or Config.PERSIST_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="persistence-worker", daemon=True)
+                self._thread.start()
+
+    def submit(self, kind: str, payload: dict, timeout: float = None) -> PersistenceTicket:
+        """Queue a write. Blocks while the queue is full (up to `timeout`), then writes inline."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown persistence kind: {kind}")
+        self._ensure_started()
+        ticket = PersistenceTicket()
+        timeout = Config.PERSIST_ENQUEUE_TIMEOUT if timeout is None else timeout
+        try:
+            self._queue.put((kind, payload, ticket), timeout=timeout)
+        except queue.Full:
+            print(f"DEBUG: Persistence queue full, writing {kind} inline")
+            self._apply(kind, [(payload, ticket)])
+        return ticket
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until everything queued so far has been written."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: float = None):
+        """Flush pending writes and stop the worker thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self.flush(timeout)
+        self._queue.put((None, _STOP, None))
+        self._thread.join(timeout)
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size and batch[-1][1] is not _STOP:
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = False
+            by_kind = defaultdict(list)
+            for kind, payload, ticket in batch:
+                if payload is _STOP:
+                    stop = True
+                else:
+                    by_kind[kind].append((payload, ticket))
+            for kind, items in by_kind.items():
+                self._apply(kind, items)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _call(self, kind: str, items: list) -> list:
+        """Per-item errors (None when written) for one handler call; raises if the whole call failed."""
+        errors = self.handlers[kind]([payload for payload, _ in items])
+        return list(errors) if errors is not None else [None] * len(items)
+
+    def _apply(self, kind: str, items: list):
+        try:
+            errors = self._call(kind, items)
+        except Exception as e:
+            print(f"DEBUG: Persisting {len(items)} {kind} item(s) failed: {e}")
+            if len(items) == 1:
+                errors = [e]
+            else:
+                errors = []
+                for item in items:
+                    try:
+                        errors += self._call(kind, [item])
+                    except Exception as item_error:
+                        errors.append(item_error)
+                failed = sum(1 for error in errors if error is not None)
+                print(f"DEBUG: Retried {kind} items one by one, {failed} of {len(items)} failed")
+        for (_, ticket), error in zip(items, errors):
+            ticket._finish(error)
+
+
+# --- Process-wide worker for format_output ---
+
+def _persist_memories(payloads: List[dict]):
+    from memory import memory
+    memory.add_memories([p["text"] for p in payloads], [p["metadata"] for p in payloads])
+
+def _persist_answers(payloads: List[dict]):
+    from memory import memory
+    memory.add_answers(payloads)
+
+def _write_files(payloads: List[dict]) -> list:
+    # One bad path must not keep the other reports from being written
+    errors = []
+    for p in payloads:
+        try:
+            with open(p["path"], "w") as f:
+                f.write(p["content"])
+        except OSError as e:
+            print(f"DEBUG: Writing report {p['path']} failed: {e}")
+            errors.append(e)
+            continue
+        print(f"✅ Report saved to: {p['path']}")
+        errors.append(None)
+    return errors
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_persistence_worker() -> PersistenceWorker:
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = PersistenceWorker({
+                "memory": _persist_memories,
+                "answer": _persist_answers,
+                "file": _write_files,
+            })
+            atexit.register(_worker.shutdown, Config.PERSIST_SHUTDOWN_TIMEOUT)
+        return _worker
+
+def flush_persistence(timeout: float = None) -> bool:
+    """Block until every queued memory upsert and report file is written."""
+    return _worker.flush(timeout) if _worker is not None else True
@@ -0,0 +1,198 @@
+"""
+Process-wide shared clients, created on first use.
+
+Heavy imports (langchain_ollama, qdrant_client) live inside the factories so
+importing the graph modules stays cheap; every session and thread then shares
+one instance.
+"""
+import threading
+from functools import wraps
+
+from config import Config
+
+
+def lazy_resource(factory):
+    """
+    Decorator turning a zero-argument factory into a thread-safe getter that
+    builds the object once. `getter.reset()` drops it (tests, reconfiguration).
+    """
+    lock = threading.Lock()
+    instance = []
+
+    @wraps(factory)
+    def getter():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    getter.reset = instance.clear
+    getter.is_initialized = lambda: bool(instance)
+    return getter
+
+
+def llm_profile(node: str = None) -> dict:
+    """
+    model, num_ctx, keep_alive and base_url for a node: Config.NODE_MODELS over
+    the defaults. base_url None means the balanced backend pool (utils/backends.py).
+    """
+    from utils.evidence import context_window
+    profile = {"model": Config.MODEL_NAME, "keep_alive": Config.LLM_KEEP_ALIVE, "base_url": None}
+    profile.update(Config.NODE_MODELS.get(node, {}))
+    profile.setdefault("num_ctx", context_window(profile["model"]))
+    return profile
+
+
+# One ChatOllama per backend (None: the balanced pool) owns its pooled sync/async
+# HTTP clients; node models are model_copy()s of it, which keep sharing those clients.
+_backend_llms = {}
+_node_llms = {}
+_llms_lock = threading.Lock()
+
+def _backend_llm(base_url: str):
+    # Caller holds _llms_lock
+    if base_url not in _backend_llms:
+        import httpx
+        from langchain_ollama import ChatOllama
+        from utils.tracing import LLMTracer
+        limits = httpx.Limits(max_connections=Config.OLLAMA_MAX_CONNECTIONS,
+                              max_keepalive_connections=Config.OLLAMA_MAX_CONNECTIONS)
+        host, transports = base_url, {}
+        if base_url is None:
+            # Requests are re-addressed per call to the backend the pool picks
+            from utils.backends import get_pool, PoolTransport, AsyncPoolTransport
+            pool = get_pool()
+            host = pool.backends[0].url
+            transports = {"sync_client_kwargs": {"transport": PoolTransport(pool, limits)},
+                          "async_client_kwargs": {"transport": AsyncPoolTransport(pool, limits)}}
+        _backend_llms[base_url] = ChatOllama(
+            model=Config.MODEL_NAME,
+            base_url=host,
+            temperature=Config.TEMPERATURE,
+            callbacks=[LLMTracer()],
+            client_kwargs={"limits": limits, "timeout": Config.OLLAMA_TIMEOUT},
+            **transports,
+        )
+    return _backend_llms[base_url]
+
+
+def get_llm(node: str = None):
+    """
+    Chat model for a graph node ("classify", "plan", "quick", "gap",
+    "synthesize"; None for the default model), configured from
+    Config.NODE_MODELS. Built once per node and shared by every session.
+    """
+    key = node or ""
+    if key not in _node_llms:
+        with _llms_lock:
+            if key not in _node_llms:
+                profile = llm_profile(node)
+                _node_llms[key] = _backend_llm(profile["base_url"]).model_copy(update={
+                    "model": profile["model"],
+                    "num_ctx": profile["num_ctx"],
+                    "keep_alive": profile["keep_alive"],
+                })
+    return _node_llms[key]
+
+
+def _reset_llms():
+    from utils.backends import get_pool
+    with _llms_lock:
+        _node_llms.clear()
+        _backend_llms.clear()
+        if get_pool.is_initialized():
+            get_pool().close()
+        get_pool.reset()
+
+get_llm.reset = _reset_llms
+get_llm.is_initialized = lambda: bool(_node_llms)
+
+
+def warm_up_models():
+    """
+    Load every node model on its backend with the node's num_ctx and
+    keep_alive (an empty generate request), so the first query does not pay
+    for loading. A different num_ctx would make Ollama reload the model.
+    Pooled nodes load on every pool backend, as any of them may serve them.
+    """
+    from utils.backends import get_pool
+    seen = set()
+    for node in Config.NODE_MODELS:
+        profile = llm_profile(node)
+        key = (profile["base_url"], profile["model"], profile["num_ctx"])
+        if key in seen:
+            continue
+        seen.add(key)
+        if profile["base_url"] is None and len(get_pool().backends) > 1:
+            pool = get_pool()
+            for backend in pool.backends:
+                if _warm_up(_warm_up_client(backend.url), profile, backend.url):
+                    pool.mark_loaded(backend, profile["model"])
+        else:
+            _warm_up(get_llm(node)._client, profile, profile["base_url"] or "the backend pool")
+
+
+def _warm_up_client(base_url: str):
+    # Addresses one pool backend directly, bypassing the pool's routing
+    from ollama import Client
+    return Client(host=base_url, timeout=Config.OLLAMA_TIMEOUT)
+
+
+def _warm_up(client, profile: dict, where: str) -> bool:
+    try:
+        client.generate(
+            model=profile["model"], prompt="", keep_alive=profile["keep_alive"],
+            options={"num_ctx": profile["num_ctx"]},
+        )
+    except Exception as e:
+        print(f"DEBUG: Warm-up of {profile['model']} on {where} failed: {e}")
+        return False
+    print(f"DEBUG: Warmed up {profile['model']} on {where}")
+    return True
+
+
+@lazy_resource
+def start_warm_up():
+    """Run warm_up_models() on a daemon thread, once per process (Config.LLM_WARMUP)."""
+    if not Config.LLM_WARMUP:
+        return None
+    thread = threading.Thread(target=warm_up_models, name="llm-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+@lazy_resource
+def get_qdrant_client():
+    """
+    Server mode when QDRANT_URL is set: one pooled, thread-safe client per
+    process, and any number of worker processes can share the server.
+    Otherwise embedded local mode, which locks QDRANT_PATH to this process.
+    """
+    from qdrant_client import QdrantClient
+    if Config.QDRANT_URL:
+        return QdrantClient(
+            url=Config.QDRANT_URL,
+            api_key=Config.QDRANT_API_KEY,
+            prefer_grpc=Config.QDRANT_PREFER_GRPC,
+            pool_size=Config.QDRANT_POOL_SIZE,
+            timeout=Config.QDRANT_TIMEOUT,
+        )
+    if Config.QDRANT_PATH == ":memory:":
+        return QdrantClient(location=":memory:")
+    # Accessed from worker threads; MemoryManager serializes local-mode calls
+    return QdrantClient(path=Config.QDRANT_PATH, force_disable_check_same_thread=True)
+
+
+@lazy_resource
+def get_embedder():
+    """The one embedding model used for every memory collection."""
+    from fastembed import TextEmbedding
+    return TextEmbedding(Config.EMBEDDING_MODEL, cache_dir=Config.EMBEDDING_CACHE_DIR)
+
+
+@lazy_resource
+def get_embedding_service():
+    """Cached, micro-batched front end to get_embedder(), shared by all sessions."""
+    from utils.embeddings import EmbeddingService
+    return EmbeddingService()
@@ -0,0 +1,131 @@
+"""
+Persistent search result cache (SQLite) with TTL expiry and LRU eviction.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Optional
+
+from config import Config
+from utils import metrics
+
+_NON_WORD_RE = re.compile(r"[^\w\s+#.-]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a query."""
+    text = unicodedata.normalize("NFKC", query).lower()
+    text = _NON_WORD_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip(" .-")
+
+
+class SearchCache:
+    """
+    Key: normalized query + provider + max_results.
+    Entries older than `ttl` seconds are misses; once more than `max_entries`
+    are stored, the least recently read ones are evicted.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                " key TEXT PRIMARY KEY, provider TEXT, query TEXT, max_results INTEGER,"
+                " value TEXT, created REAL, accessed REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON search_cache(accessed)")
+
+    @staticmethod
+    def make_key(provider: str, query: str, max_results: int) -> str:
+        raw = f"{provider}|{max_results}|{normalize_query(query)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, provider: str, query: str, max_results: int) -> Optional[Any]:
+        """Cached value, or None on a miss (absent or expired)."""
+        key = self.make_key(provider, query, max_results)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                metrics.increment("search_cache.miss")
+                return None
+            self._conn.execute("UPDATE search_cache SET accessed = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        metrics.increment("search_cache.hit")
+        return json.loads(row[0])
+
+    def put(self, provider: str, query: str, max_results: int, value: Any):
+        """Store a JSON-serializable value and evict down to max_entries."""
+        key = self.make_key(provider, query, max_results)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, normalize_query(query), max_results, json.dumps(value), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM search_cache WHERE key IN ("
+                " SELECT key FROM search_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def purge_expired(self) -> int:
+        """Delete expired entries, returning how many were removed."""
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "DELETE FROM search_cache WHERE created < ?", (time.time() - self.ttl,)
+            )
+            return cur.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_search_cache() -> Optional[SearchCache]:
+    """Process-wide cache, or None when disabled in Config."""
+    global _cache
+    if not Config.SEARCH_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SearchCache(
+                Config.SEARCH_CACHE_PATH,
+                ttl=Config.SEARCH_CACHE_TTL_SECONDS,
+                max_entries=Config.SEARCH_CACHE_MAX_ENTRIES,
+            )
+        return _cache
@@ -0,0 +1,38 @@
+"""
+BM25 sparse vectors for hybrid search in Qdrant.
+
+Documents carry BM25's saturated, length-normalized term frequencies; the
+collection's IDF modifier supplies inverse document frequency at query time,
+so no corpus statistics are kept client-side. Query terms weigh 1 each.
+Terms are the same tokens evidence packing ranks on, hashed to 32-bit ids.
+"""
+import zlib
+from collections import Counter
+from typing import List, Tuple
+
+from config import Config
+from utils.evidence import terms
+
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+
+def term_id(term: str) -> int:
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def bm25_document_vector(text: str, avg_len: float = None) -> Tuple[List[int], List[float]]:
+    """(indices, values) of a document's BM25 term weights."""
+    avg_len = avg_len or Config.MEMORY_BM25_AVG_LEN
+    counts = Counter(term_id(t) for t in terms(text))
+    length = sum(counts.values())
+    norm = _K1 * (1 - _B + _B * length / avg_len)
+    indices = sorted(counts)
+    return indices, [counts[i] * (_K1 + 1) / (counts[i] + norm) for i in indices]
+
+
+def bm25_query_vector(text: str) -> Tuple[List[int], List[float]]:
+    """(indices, values) for a query: each distinct term weighs 1."""
+    indices = sorted({term_id(t) for t in terms(text)})
+    return indices, [1.0] * len(indices)
@@ -1,52 +1,196 @@
 """
 Streaming utilities for real-time LLM token display.
 """
-import queue
+import asyncio
 import threading
-from typing import Iterator, Optional
+import time
+from collections import deque
+from typing import Iterator, List, Optional
+
+from config import Config
 
 
 class StreamingBuffer:
-    """Thread-safe buffer for streaming LLM tokens."""
-    
-    def __init__(self):
-        self.queue = queue.Queue()
+    """
+    Thread-safe, bounded buffer for streaming LLM tokens.
+
+    Chunks are kept in a deque; once more than `max_chars` are retained the
+    oldest chunks are evicted. Every reader has its own cursor (an absolute
+    chunk index), so several consumers can follow the same stream. A reader
+    that falls behind the eviction point skips the dropped chunks.
+    """
+
+    def __init__(self, max_chars: int = None):
+        self.max_chars = max_chars or Config.STREAM_MAX_CHARS
         self.complete = False
-        self.full_content = ""
-    
+        self.last_access = time.monotonic()
+        self._chunks = deque()
+        self._base = 0  # absolute index of self._chunks[0]
+        self._chars = 0
+        self._cond = threading.Condition()
+        self._async_waiters = []
+
+    @property
+    def end(self) -> int:
+        """Absolute index one past the newest chunk."""
+        return self._base + len(self._chunks)
+
     def add_chunk(self, chunk: str):
         """Add a token chunk to the buffer."""
-        self.queue.put(chunk)
-        self.full_content += chunk
-    
+        if not chunk:
+            return
+        with self._cond:
+            self._chunks.append(chunk)
+            self._chars += len(chunk)
+            while self._chars > self.max_chars and len(self._chunks) > 1:
+                self._chars -= len(self._chunks.popleft())
+                self._base += 1
+            self.last_access = time.monotonic()
+            self._notify()
+
     def mark_complete(self):
         """Mark streaming as complete."""
-        self.complete = True
-        self.queue.put(None)  # Sentinel value
-    
+        with self._cond:
+            self.complete = True
+            self.last_access = time.monotonic()
+            self._notify()
+
+    def _notify(self):
+        # Caller holds self._cond
+        self._cond.notify_all()
+        for loop, future in self._async_waiters:
+            # A cancelled reader's loop may be gone; the producer must not fail for it
+            if future.done() or loop.is_closed():
+                continue
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # Closed between the check and the call
+        self._async_waiters.clear()
+
+    def read(self, cursor: int, timeout: Optional[float] = 0) -> tuple:
+        """
+        Return (chunks, new_cursor, dropped) for everything after `cursor`.
+        Waits up to `timeout` seconds for data (None waits indefinitely).
+        """
+        with self._cond:
+            if timeout != 0:
+                self._cond.wait_for(lambda: self.end > cursor or self.complete, timeout)
+            self.last_access = time.monotonic()
+            dropped = max(0, self._base - cursor)
+            start = max(cursor, self._base) - self._base
+            chunks = [self._chunks[i] for i in range(start, len(self._chunks))]
+            return chunks, self.end, dropped
+
+    async def wait_async(self, cursor: int):
+        """Wait on the running event loop until data past `cursor` or completion."""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self.end > cursor or self.complete:
+                return
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._async_waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._cond:
+                if waiter in self._async_waiters:
+                    self._async_waiters.remove(waiter)
+            raise
+
+    def reader(self, from_start: bool = True) -> "StreamReader":
+        """New independent reader (from the oldest retained chunk, or from now)."""
+        with self._cond:
+            return StreamReader(self, self._base if from_start else self.end)
+
     def get_chunks(self) -> Iterator[str]:
         """Get streaming chunks as they arrive."""
-        while True:
-            chunk = self.queue.get()
-            if chunk is None:
-                break
-            yield chunk
-    
+        return iter(self.reader())
+
     def get_full_content(self) -> str:
-        """Get the complete accumulated content."""
-        return self.full_content
+        """Get the retained content (everything, unless the bound was hit)."""
+        with self._cond:
+            return "".join(self._chunks)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
 
 
-# Global streaming buffer (shared across nodes and Streamlit)
+class StreamReader:
+    """A cursor over a StreamingBuffer; usable as a sync or async iterator."""
+
+    def __init__(self, buffer: StreamingBuffer, cursor: int):
+        self.buffer = buffer
+        self.cursor = cursor
+        self.dropped = 0
+        self._pending = deque()
+
+    def drain(self, timeout: Optional[float] = 0) -> List[str]:
+        """All chunks available now (waiting up to `timeout` for the first)."""
+        chunks, self.cursor, dropped = self.buffer.read(self.cursor, timeout)
+        self.dropped += dropped
+        pending = list(self._pending) + chunks
+        self._pending.clear()
+        return pending
+
+    @property
+    def finished(self) -> bool:
+        """True once the stream is complete and this reader has consumed it."""
+        return self.buffer.complete and not self._pending and self.cursor >= self.buffer.end
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        while not self._pending:
+            if self.finished:
+                raise StopIteration
+            self._pending.extend(self.drain(timeout=None))
+        return self._pending.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        while not self._pending:
+            self._pending.extend(self.drain())
+            if self._pending:
+                break
+            if self.finished:
+                raise StopAsyncIteration
+            await self.buffer.wait_async(self.cursor)
+        return self._pending.popleft()
+
+
+# Global streaming buffers (shared across nodes and Streamlit)
 _streaming_buffers = {}
+_buffers_lock = threading.Lock()
+
+def _evict_expired_buffers(now: float):
+    # Caller holds _buffers_lock. Runs that errored before
+    # clear_streaming_buffer() would otherwise leak their buffer.
+    ttl = Config.STREAM_BUFFER_TTL_SECONDS
+    for query_id in [q for q, b in _streaming_buffers.items() if now - b.last_access > ttl]:
+        del _streaming_buffers[query_id]
 
 def get_streaming_buffer(query_id: str) -> StreamingBuffer:
     """Get or create a streaming buffer for a query."""
-    if query_id not in _streaming_buffers:
-        _streaming_buffers[query_id] = StreamingBuffer()
-    return _streaming_buffers[query_id]
+    with _buffers_lock:
+        _evict_expired_buffers(time.monotonic())
+        if query_id not in _streaming_buffers:
+            _streaming_buffers[query_id] = StreamingBuffer()
+        return _streaming_buffers[query_id]
 
 def clear_streaming_buffer(query_id: str):
     """Clear a streaming buffer."""
-    if query_id in _streaming_buffers:
-        del _streaming_buffers[query_id]
+    with _buffers_lock:
+        _streaming_buffers.pop(query_id, None)
+
+def active_buffer_count() -> int:
+    """Number of live buffers (after TTL eviction)."""
+    with _buffers_lock:
+        _evict_expired_buffers(time.monotonic())
+        return len(_streaming_buffers)
@@ -0,0 +1,141 @@
+"""
+Validation and repair of JSON emitted by the LLM.
+"""
+import json
+import re
+from typing import Optional, Tuple
+
+# Outcome labels, also used as metric suffixes.
+PARSE_OK = "ok"
+PARSE_REPAIRED = "repaired"
+PARSE_FAILED = "failed"
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+class OutputValidationError(ValueError):
+    """Raised when LLM output does not match the expected shape."""
+
+
+def validate_gap_analysis(data) -> dict:
+    """
+    Strictly validate a decoded gap analysis object.
+    Returns a normalized copy or raises OutputValidationError.
+    """
+    if not isinstance(data, dict):
+        raise OutputValidationError("gap analysis must be a JSON object")
+
+    for key in ("gaps", "contradictions", "confidence_score"):
+        if key not in data:
+            raise OutputValidationError(f"missing key: {key}")
+
+    score = data["confidence_score"]
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        raise OutputValidationError("confidence_score must be a number")
+    if not 0.0 <= score <= 1.0:
+        raise OutputValidationError("confidence_score must be within [0, 1]")
+
+    # "summary" and "covered" (incremental analysis) are optional
+    for key in ("gaps", "contradictions", "covered"):
+        value = data.get(key, [])
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            raise OutputValidationError(f"{key} must be a list of strings")
+    summary = data.get("summary")
+    if summary is not None and not isinstance(summary, str):
+        raise OutputValidationError("summary must be a string")
+
+    return {
+        "summary": summary.strip() if summary else None,
+        "covered": [c.strip() for c in data.get("covered", []) if c.strip()],
+        "gaps": [g.strip() for g in data["gaps"] if g.strip()],
+        "contradictions": [c.strip() for c in data["contradictions"] if c.strip()],
+        "confidence_score": float(score),
+    }
+
+
+def _extract_object(text: str) -> Optional[str]:
+    """Return the outermost {...} span of text, if any."""
+    text = _FENCE_RE.sub("", text.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    return _TRAILING_COMMA_RE.sub(r"\1", text[start:end + 1])
+
+
+def _coerce_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    if isinstance(value, list):
+        return [v if isinstance(v, str) else json.dumps(v) for v in value]
+    return [str(value)]
+
+
+def _coerce_score(value) -> float:
+    percent = isinstance(value, str) and value.strip().endswith("%")
+    if isinstance(value, str):
+        value = value.strip().rstrip("%")
+    score = float(value)
+    # Models sometimes answer on a 0-100 scale; 2 and above can only be a percentage.
+    # Slight overshoots (1.5) are clamped, not rescaled to near zero.
+    if percent or score >= 2.0:
+        score = score / 100.0
+    return min(max(score, 0.0), 1.0)
+
+
+def repair_gap_analysis(text: str) -> dict:
+    """
+    Best-effort recovery of a gap analysis from malformed output:
+    strips code fences and trailing commas, tolerates the older
+    'confidence' key, string-valued lists and 0-100 scores.
+    """
+    raw = _extract_object(text)
+    if raw is None:
+        raise OutputValidationError("no JSON object found")
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        # Single-quoted pseudo-JSON is the most common remaining failure.
+        try:
+            data = json.loads(raw.replace("'", '"'))
+        except json.JSONDecodeError as e:
+            raise OutputValidationError(f"invalid JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise OutputValidationError("gap analysis must be a JSON object")
+
+    score = data.get("confidence_score", data.get("confidence"))
+    if score is None:
+        raise OutputValidationError("missing key: confidence_score")
+    try:
+        score = _coerce_score(score)
+    except (TypeError, ValueError) as e:
+        raise OutputValidationError(f"bad confidence_score: {score!r}") from e
+
+    repaired = dict(data)
+    repaired.update({
+        "gaps": _coerce_list(data.get("gaps")),
+        "contradictions": _coerce_list(data.get("contradictions")),
+        "covered": _coerce_list(data.get("covered")),
+        "confidence_score": score,
+    })
+    if repaired.get("summary") is not None and not isinstance(repaired["summary"], str):
+        repaired["summary"] = json.dumps(repaired["summary"])
+    return validate_gap_analysis(repaired)
+
+
+def parse_gap_analysis(text: str) -> Tuple[Optional[dict], str]:
+    """
+    Parse gap analysis output.
+    Returns (result, status) where status is PARSE_OK, PARSE_REPAIRED or
+    PARSE_FAILED (result is None in the last case).
+    """
+    try:
+        return validate_gap_analysis(json.loads(text)), PARSE_OK
+    except (json.JSONDecodeError, OutputValidationError):
+        pass
+    try:
+        return repair_gap_analysis(text), PARSE_REPAIRED
+    except OutputValidationError:
+        return None, PARSE_FAILED
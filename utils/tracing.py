@@ -0,0 +1,303 @@
+"""
+Spans for graph nodes and the LLM, search and memory calls they make.
+
+The open span lives in a contextvar, so nested calls find their parent across
+awaits, asyncio tasks and asyncio.to_thread. One trace per run, keyed by the
+query_id. Finished spans are kept in memory for the UI (last TRACE_MAX_TRACES
+runs) and, with TRACE_EXPORT="jsonl", appended to TRACE_PATH one span per
+line in the OTLP/JSON span layout. Calls made outside a run (background
+writes, direct tool use) get detached spans that are never recorded.
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import Config
+from utils.resources import lazy_resource
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+_OTLP_KINDS = {"llm": "SPAN_KIND_CLIENT", "search": "SPAN_KIND_CLIENT", "memory": "SPAN_KIND_CLIENT"}
+
+
+class Span:
+    """One timed operation. `kind` is "node", "llm", "search", "memory" or "internal"."""
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent: "Span" = None, attributes: dict = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._start = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, error: str = None):
+        """End the span and hand it to the store and exporter (idempotent)."""
+        if self.end_ns is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        self.end_ns = self.start_ns + int(self.duration_ms * 1e6)
+        self.error = error or self.error
+        if self.trace_id is not None:
+            _record(self)
+
+    def to_otlp(self) -> dict:
+        """OTLP/JSON span encoding (traceId is derived from the query_id)."""
+        attributes = [{"key": "span.kind", "value": {"stringValue": self.kind}},
+                      {"key": "query_id", "value": {"stringValue": str(self.trace_id)}}]
+        for key, value in self.attributes.items():
+            attributes.append({"key": key, "value": _otlp_value(value)})
+        span = {
+            "traceId": hashlib.md5(str(self.trace_id).encode("utf-8")).hexdigest(),
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": _OTLP_KINDS.get(self.kind, "SPAN_KIND_INTERNAL"),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": attributes,
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_OK"},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class JsonlExporter:
+    """Appends finished spans to a JSONL file, one OTLP/JSON span per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_otlp())
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", buffering=1)  # Line-buffered: each span lands whole
+            self._file.write(line + "\n")
+
+
+@lazy_resource
+def get_exporter():
+    """Exporter selected by Config.TRACE_EXPORT ("jsonl" or "none")."""
+    if Config.TRACE_EXPORT == "jsonl":
+        return JsonlExporter(Config.TRACE_PATH)
+    return None
+
+
+# Finished spans per trace, oldest trace evicted first
+_traces = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+def _record(span: Span):
+    with _traces_lock:
+        _traces.setdefault(span.trace_id, []).append(span)
+        _traces.move_to_end(span.trace_id)
+        while len(_traces) > Config.TRACE_MAX_TRACES:
+            _traces.popitem(last=False)
+    exporter = get_exporter()
+    if exporter:
+        try:
+            exporter.export(span)
+        except OSError as e:
+            print(f"DEBUG: Trace export failed: {e}")
+    if span.kind == "node" and Config.TRACE_LOG_NODES:
+        print(f"DEBUG: [trace] {summarize_node(span)}")
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def annotate(**attributes):
+    """Add attributes to the open span, if any (cheap no-op outside a trace)."""
+    span = _current_span.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+def start_span(name: str, kind: str = "internal", trace_id: str = None, **attributes) -> Span:
+    """
+    Open a child of the current span without making it current; call .finish() on it.
+    Without a trace_id or an open span the span is detached (timed, not recorded).
+    """
+    parent = _current_span.get()
+    trace_id = trace_id or (parent.trace_id if parent else None)
+    return Span(name, kind, trace_id, parent, attributes)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", trace_id: str = None, **attributes):
+    """Time the block as a span; spans opened inside it become its children."""
+    s = start_span(name, kind, trace_id, **attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        s.finish()
+
+
+def traced(name: str, kind: str = "internal"):
+    """Decorator running a (sync) function in a span; annotate() inside it adds attributes."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_node(name: str, node):
+    """Wrap a graph node (sync or async) in a "node" span of the run's trace."""
+    def adopt_query_id(s, state, result):
+        # The guard assigns the query_id when the caller did not
+        if not state.get("query_id") and isinstance(result, dict) and result.get("query_id"):
+            s.trace_id = result["query_id"]
+
+    if asyncio.iscoroutinefunction(node):
+        @wraps(node)
+        async def async_wrapper(state):
+            with span(name, kind="node", trace_id=state.get("query_id") or uuid.uuid4().hex) as s:
+                result = await node(state)
+                adopt_query_id(s, state, result)
+                return result
+        return async_wrapper
+
+    @wraps(node)
+    def wrapper(state):
+        with span(name, kind="node", trace_id=state.get("query_id") or uuid.uuid4().hex) as s:
+            result = node(state)
+            adopt_query_id(s, state, result)
+            return result
+    return wrapper
+
+
+def get_spans(trace_id: str) -> list:
+    """Finished spans of a run, in completion order."""
+    with _traces_lock:
+        return list(_traces.get(trace_id, ()))
+
+
+def node_timings(trace_id: str) -> list:
+    """[(node name, duration ms)] for a run, in start order."""
+    nodes = sorted((s for s in get_spans(trace_id) if s.kind == "node"), key=lambda s: s.start_ns)
+    return [(s.name, s.duration_ms) for s in nodes]
+
+
+def node_duration(trace_id: str, name: str) -> Optional[float]:
+    """Duration of the most recent finished run of a node, in ms."""
+    for s in reversed(get_spans(trace_id)):
+        if s.kind == "node" and s.name == name:
+            return s.duration_ms
+    return None
+
+
+def clear_trace(trace_id: str):
+    with _traces_lock:
+        _traces.pop(trace_id, None)
+
+
+def summarize_node(node: Span) -> str:
+    """'quick_mode 812 ms | llm 1x 790 ms 230 tok | search 0x' style breakdown of direct children."""
+    children = [s for s in get_spans(node.trace_id) if s.parent_id == node.span_id]
+    parts = [f"{node.name} {node.duration_ms:.0f} ms"]
+    for kind in ("llm", "search", "memory"):
+        spans = [s for s in children if s.kind == kind]
+        if spans:
+            part = f"{kind} {len(spans)}x {sum(s.duration_ms for s in spans):.0f} ms"
+            tokens = sum(s.attributes.get("tokens", 0) for s in spans)
+            if tokens:
+                part += f" {tokens} tok"
+            parts.append(part)
+    if node.error:
+        parts.append(f"error {node.error}")
+    return " | ".join(parts)
+
+
+class LLMTracer(BaseCallbackHandler):
+    """LangChain callback recording every chat model call as an "llm" span."""
+
+    run_inline = True  # Called in the caller's context, so the node span is the parent
+
+    def __init__(self):
+        self._spans = {}
+        self._streamed = {}  # run_id -> [estimated prompt tokens, streamed chars]
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        from utils.generation import prompt_tokens
+        params = kwargs.get("invocation_params") or {}
+        self._spans[run_id] = start_span(
+            "llm", kind="llm",
+            model=params.get("model") or params.get("_type", ""),
+            prompt_chars=sum(len(str(m.content)) for batch in messages for m in batch),
+        )
+        self._streamed[run_id] = [sum(prompt_tokens(batch) for batch in messages), 0]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        s = self._spans.get(run_id)
+        if s is None:
+            return
+        if "ttft_ms" not in s.attributes:
+            s.set(ttft_ms=round((time.perf_counter() - s._start) * 1000, 1))
+        self._streamed[run_id][1] += len(token)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        from utils.budget import usage_from
+        s = self._spans.pop(run_id, None)
+        self._streamed.pop(run_id, None)
+        if s is None:
+            return
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        if generation is not None:
+            s.set(tokens=usage_from(getattr(generation, "message", None)), output_chars=len(generation.text))
+        s.finish()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        s = self._spans.pop(run_id, None)
+        prompt_tokens, chars = self._streamed.pop(run_id, (0, 0))
+        if s is None:
+            return
+        if isinstance(error, GeneratorExit):
+            # The caller closed the stream once it had what it needed (utils.generation.stream_until);
+            # Ollama's counts never arrived, so tokens are estimated the same way the caller does
+            s.set(stopped_early=True, tokens=prompt_tokens + (chars + 3) // 4, output_chars=chars)
+            s.finish()
+            return
+        s.finish(error=f"{type(error).__name__}: {error}")